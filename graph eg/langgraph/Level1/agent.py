@@ -1,10 +1,17 @@
 from typing import TypedDict, List
 from langchain_core.messages import BaseMessage, HumanMessage
 from langchain_core.runnables import Runnable
-from langchain_groq import ChatGroq
 from langgraph.graph import StateGraph, END
 import os
+import sys
+from pathlib import Path
 from dotenv import load_dotenv
+
+# Make the shared helpers in ../common importable
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.model_provider import chat_model
+from common.telemetry import instrument_graph
+
 load_dotenv()
 
 # Your Groq API key (keep this secure in production)
@@ -17,9 +24,10 @@ class AgentState(TypedDict):
     messages: List[BaseMessage]
 
 # Initialize the LLM with the Groq API key and model name
-llm = ChatGroq(
+# (LLM_MODE=record/replay swaps in the cassette provider for offline runs)
+llm = chat_model(
+    "llama-3.3-70b-versatile",
     groq_api_key=GROQ_API_KEY,
-    model="llama-3.3-70b-versatile"
 )
 
 def call_model(state: AgentState) -> AgentState:
@@ -36,6 +44,7 @@ builder.add_node("respond", call_model)         # Add a node that calls the mode
 builder.set_entry_point("respond")              # Set the entry point of the graph
 builder.add_edge("respond", END)                # End after the respond node
 graph = builder.compile()                       # Compile the graph
+instrument_graph(graph)
 
 # Prepare the initial input with a human message
 inputs = {"messages": [HumanMessage(content="Hello, how are you?")]}
@@ -1,11 +1,18 @@
 from typing import TypedDict, List
 from langchain_core.messages import BaseMessage, HumanMessage
 from langchain_core.runnables import Runnable
-from langchain_groq import ChatGroq
 from langgraph.graph import StateGraph, END
 
 import os
+import sys
+import uuid
+from pathlib import Path
 
+# Make the shared helpers in ../common importable
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.session_store import SessionStore, trim_history
+from common.model_provider import chat_model
+from common.telemetry import instrument_graph
 
 # Read Groq API key from shell environment variable only
 GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
@@ -17,9 +24,10 @@ class AgentState(TypedDict):
     messages: List[BaseMessage]
 
 # Initialize the LLM with the Groq API key and model name
-llm = ChatGroq(
+# (LLM_MODE=record/replay swaps in the cassette provider for offline runs)
+llm = chat_model(
+    "llama-3.3-70b-versatile",
     groq_api_key=GROQ_API_KEY,
-    model="llama-3.3-70b-versatile"
 )
 
 def call_model(state: AgentState) -> AgentState:
@@ -36,22 +44,31 @@ builder.add_node("respond", call_model)         # Add a node that calls the mode
 builder.set_entry_point("respond")              # Set the entry point of the graph
 builder.add_edge("respond", END)                # End after the respond node
 graph = builder.compile()                       # Compile the graph
+instrument_graph(graph)
 
 
 
 # Interactive loop for user input
-messages = []
+# Message histories live in a bounded session store: idle sessions expire and
+# cold ones are spilled to disk. Each history keeps its last
+# MAX_HISTORY_MESSAGES messages, and each process gets its own session
+sessions = SessionStore(spill_dir="session_spill", max_sessions=100, idle_ttl=60 * 60)
+SESSION_ID = os.environ.get("SESSION_ID") or f"cli-{uuid.uuid4().hex[:8]}"
+MAX_HISTORY_MESSAGES = int(os.environ.get("MAX_HISTORY_MESSAGES", "40"))
 print("Type your question and press Enter. Type 'exit' to quit.")
 while True:
     user_message = input("You: ")
     if user_message.strip().lower() == "exit":
         print("Exiting.")
+        print("Sessions:", sessions.metrics())
         break
-    messages.append(HumanMessage(content=user_message))
-    inputs = {"messages": messages.copy()}
+    human_message = HumanMessage(content=user_message)
+    inputs = {"messages": sessions.get(SESSION_ID, []) + [human_message]}
     print("Agent:")
     response = graph.invoke(inputs)
     # Print only the latest response
     print(response["messages"][-1].content)
-    # Add the agent's response to the message history
-    messages.append(response["messages"][-1])
+    # Add the question and the agent's response to the message history
+    history = sessions.append(SESSION_ID, human_message, response["messages"][-1])
+    if len(history) > MAX_HISTORY_MESSAGES:
+        sessions.put(SESSION_ID, trim_history(history, MAX_HISTORY_MESSAGES))
@@ -1,11 +1,19 @@
 from typing import TypedDict, List
 from langchain_core.messages import BaseMessage, HumanMessage
-from langchain_groq import ChatGroq
-from langgraph.checkpoint.memory import InMemorySaver
 from langgraph.graph import StateGraph, END
 import os
+import sys
+import uuid
+from pathlib import Path
 from dotenv import load_dotenv
 
+# Make the shared helpers in ../common importable
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.session_store import SessionStoreSaver, trim_history
+from common.memory_profile import MemoryProfiler
+from common.model_provider import chat_model
+from common.telemetry import instrument_graph
+
 # Load environment variables from .env file
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
@@ -15,15 +23,21 @@ class AgentState(TypedDict):
     messages: List[BaseMessage]
 
 # Initialize the LLM with the Groq API key and model
-llm = ChatGroq(groq_api_key=GROQ_API_KEY, model="llama-3.3-70b-versatile")
+llm = chat_model("llama-3.3-70b-versatile", groq_api_key=GROQ_API_KEY)
 
 # Node function for the LLM: takes state, appends LLM response to messages
 def llm_node(state: AgentState) -> AgentState:
     response = llm.invoke(state["messages"])
     return {"messages": state["messages"] + [response]}
 
-# Set up in-memory checkpointing
-checkpointer = InMemorySaver()
+# Set up in-memory checkpointing: threads idle for an hour are dropped, and
+# beyond 100 threads or 50 MB the least recently used ones are spilled to disk
+checkpointer = SessionStoreSaver(
+    spill_dir="session_spill",
+    max_threads=100,
+    idle_ttl=60 * 60,
+    max_resident_bytes=50 * 1024 * 1024,
+)
 
 # Build the state graph
 graph = StateGraph(AgentState)
@@ -33,9 +47,18 @@ graph.add_edge("llm_node", END)
 
 # Compile the app with checkpointing
 app = graph.compile(checkpointer=checkpointer)
+instrument_graph(app)
+
+# MEMORY_PROFILE=<report.json> profiles memory per node and per turn
+profile_path = os.getenv("MEMORY_PROFILE")
+profiler = MemoryProfiler() if profile_path else None
+if profiler:
+    app = profiler.instrument(app)
 
-# Unique thread/session ID for checkpointing
-thread_id = "user-session-001"
+# Unique thread/session ID for checkpointing, one per process unless set;
+# each turn's checkpoint keeps the last MAX_HISTORY_MESSAGES messages
+thread_id = os.getenv("SESSION_ID") or f"cli-{uuid.uuid4().hex[:8]}"
+MAX_HISTORY_MESSAGES = int(os.getenv("MAX_HISTORY_MESSAGES", "40"))
 config = {
     "configurable": {
         "thread_id": thread_id
@@ -48,6 +71,10 @@ while True:
     user_input = input("You: ")
     if user_input.lower() in ["exit", "quit"]:
         print("Exiting the chat.")
+        print("Sessions:", checkpointer.sessions.metrics())
+        if profiler:
+            report = profiler.write_json(profile_path)
+            print(f"Memory profile written to {profile_path}; growing nodes: {report['growing_nodes']}")
         break
 
     # Retrieve previous state from checkpointer
@@ -59,7 +86,7 @@ while True:
 
     # Add the new user message to the conversation history
     conversation_history.append(HumanMessage(content=user_input))
-    input_state = {"messages": conversation_history}
+    input_state = {"messages": trim_history(conversation_history, MAX_HISTORY_MESSAGES)}
 
     # Invoke the app and get the AI's response
     result = app.invoke(input_state, config=config)
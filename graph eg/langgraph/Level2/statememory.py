@@ -1,9 +1,18 @@
 from typing import TypedDict, List
 from langchain_core.messages import BaseMessage, HumanMessage
-from langchain_groq import ChatGroq
 from langgraph.graph import StateGraph
 import os
+import sys
+import uuid
+from pathlib import Path
 from dotenv import load_dotenv
+
+# Make the shared helpers in ../common importable
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.session_store import SessionStore, trim_history
+from common.model_provider import chat_model
+from common.telemetry import instrument_graph
+
 load_dotenv()
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
@@ -11,7 +20,7 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 class AgentState(TypedDict):
     messages: List[BaseMessage]
 
-llm = ChatGroq(groq_api_key=GROQ_API_KEY, model="llama-3.3-70b-versatile")
+llm = chat_model("llama-3.3-70b-versatile", groq_api_key=GROQ_API_KEY)
 
 def llm_node(state: AgentState) -> AgentState:
     response = llm.invoke(state["messages"])
@@ -21,23 +30,31 @@ graph = StateGraph(AgentState)
 graph.add_node("llm_node", llm_node)
 graph.set_entry_point("llm_node")
 app = graph.compile()
+instrument_graph(app)
 
 print("You can start chatting with the memory AI bot. Type 'exit' or 'quit' to end the conversation.")
 
-# Initialize conversation history
-conversation_history = []
+# Conversation histories live in a bounded session store: idle sessions
+# expire and cold ones are spilled to disk. Each history keeps its last
+# MAX_HISTORY_MESSAGES messages, and each process gets its own session
+sessions = SessionStore(spill_dir="session_spill", max_sessions=100, idle_ttl=60 * 60)
+SESSION_ID = os.getenv("SESSION_ID") or f"cli-{uuid.uuid4().hex[:8]}"
+MAX_HISTORY_MESSAGES = int(os.getenv("MAX_HISTORY_MESSAGES", "40"))
 
 while True:
     user_input = input("You: ")
     if user_input.lower() in ["exit", "quit"]:
         print("Exiting the chat.")
+        print("Sessions:", sessions.metrics())
         break
 
     # Add user message to history
-    conversation_history.append(HumanMessage(content=user_input))
-    input_state = {"messages": conversation_history}
+    human_message = HumanMessage(content=user_input)
+    input_state = {"messages": sessions.get(SESSION_ID, []) + [human_message]}
     result = app.invoke(input_state)
     ai_message = result["messages"][-1]
     print("AI:", ai_message.content)
-    # Add AI message to history
-    conversation_history.append(ai_message)
+    # Add both messages to history
+    history = sessions.append(SESSION_ID, human_message, ai_message)
+    if len(history) > MAX_HISTORY_MESSAGES:
+        sessions.put(SESSION_ID, trim_history(history, MAX_HISTORY_MESSAGES))
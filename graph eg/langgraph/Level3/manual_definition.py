@@ -1,15 +1,24 @@
 import os
+import sys
+from pathlib import Path
 from typing import Annotated, TypedDict
-from langchain_groq import ChatGroq
 from langchain_core.tools import tool
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import HumanMessage, SystemMessage
 from langgraph.graph.message import add_messages
 from langgraph.prebuilt import ToolNode, tools_condition
 from langgraph.graph import StateGraph, END, START
 
+# Make the shared helpers in ../common importable
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.graph_compile import compile_graph
+from common.prompt_cache import PrefixCachingChatGroq
+from common.budget import RunBudget, run_with_budget
+from common.model_provider import chat_model, provider_mode
+from common.telemetry import instrument_graph
+
 # Read GROQ_API_KEY from environment
 groq_api_key = os.environ.get("GROQ_API_KEY")
-if not groq_api_key:
+if not groq_api_key and provider_mode() != "replay":
     raise ValueError("GROQ_API_KEY environment variable not set.")
 
 # -------------------- Tool Definitions --------------------
@@ -47,8 +56,11 @@ tools = [get_weather, add, subtract]
 # -------------------- LLM Setup --------------------
 
 # Initialize the LLM with Groq API key and model
-llm = ChatGroq(groq_api_key=groq_api_key, model="llama-3.3-70b-versatile")
+# Tool schemas and already-seen messages are serialized once and reused, and the
+# system prompt is a single constant message, so every step sends the same prefix
+llm = chat_model("llama-3.3-70b-versatile", PrefixCachingChatGroq, groq_api_key=groq_api_key)
 llm_with_tools = llm.bind_tools(tools)
+SYSTEM_MESSAGE = SystemMessage(content="You are a helpful assistant. Use the available tools when they help answer the question.")
 
 # -------------------- State Definition --------------------
 
@@ -61,7 +73,7 @@ graph_builder = StateGraph(State)
 # Node: Chatbot LLM invocation
 def chatbot(state: State):
     # Pass conversation messages to the LLM and get the response
-    return {"messages": [llm_with_tools.invoke(state["messages"])]}
+    return {"messages": [llm_with_tools.invoke([SYSTEM_MESSAGE] + state["messages"])]}
 
 graph_builder.add_node("chatbot", chatbot)
 
@@ -73,6 +85,7 @@ graph_builder.add_node("tools", tool_node)
 graph_builder.add_conditional_edges(
     "chatbot",
     tools_condition,
+    {"tools": "tools", END: END},
 )
 
 # After tool execution, return to chatbot
@@ -80,10 +93,18 @@ graph_builder.add_edge("tools", "chatbot")
 # Start the graph at the chatbot node
 graph_builder.add_edge(START, "chatbot")
 
-# Compile the graph
-graph = graph_builder.compile()
+# Compile the graph (validates edges and router targets)
+graph = compile_graph(graph_builder)
+instrument_graph(graph)
+if hasattr(llm, "cache_info"):  # not in record/replay mode
+    graph.telemetry.observe_cache("prompt_prefix", llm.cache_info)
 
 # -------------------- Chat Loop --------------------
+
+# Limits for a single user turn: chatbot <-> tools supersteps, seconds,
+# LLM tokens and tool calls
+TURN_BUDGET = RunBudget(max_steps=12, deadline=60, max_tokens=20000, max_tool_calls=8)
+
 def invoke_chat_loop():
     print("You can chat with the LLM. It will decide when to use tools (weather, add, subtract). Type 'exit' to quit.")
     conversation = []
@@ -95,8 +116,14 @@ def invoke_chat_loop():
         # Add user message to conversation
         conversation.append(HumanMessage(content=user_input))
         state = {"messages": conversation}
-        # Invoke the graph with the current state
-        result = graph.invoke(state)
+        # Invoke the graph with the current state, bounded by the per-turn budget
+        result, report = run_with_budget(graph, state, TURN_BUDGET)
         # Update conversation with new messages
         conversation = result["messages"]
+        if report["status"] == "budget_exceeded":
+            # Drop a trailing tool request that will never get its results
+            if getattr(conversation[-1], "tool_calls", None):
+                conversation = conversation[:-1]
+            print(f"AI: (stopped early: {report['reason']} budget reached)")
+            continue
         print("AI:", conversation[-1].content)
@@ -1,6 +1,7 @@
 import os
+import sys
+from pathlib import Path
 from typing import Annotated, TypedDict
-from langchain_groq import ChatGroq
 from langgraph.prebuilt import create_react_agent
 from langchain_core.tools import tool
 from langchain_core.messages import HumanMessage
@@ -8,9 +9,16 @@ from langgraph.graph.message import add_messages
 from langgraph.prebuilt import ToolNode, tools_condition
 from langgraph.graph import StateGraph, END, START
 
+# Make the shared helpers in ../common importable
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.prompt_cache import PrefixCachingChatGroq
+from common.speculative_tools import create_speculative_react_agent
+from common.model_provider import chat_model, provider_mode
+from common.telemetry import instrument_graph
+
 # Read GROQ_API_KEY from environment
 groq_api_key = os.environ.get("GROQ_API_KEY")
-if not groq_api_key:
+if not groq_api_key and provider_mode() != "replay":
     raise ValueError("GROQ_API_KEY environment variable not set.")
 
 # -------------------- Tool Definitions --------------------
@@ -48,10 +56,22 @@ tools = [get_weather, add, subtract]
 # -------------------- LLM Setup --------------------
 
 # Initialize the LLM with Groq API key and model
-llm = ChatGroq(groq_api_key=groq_api_key, model="openai/gpt-oss-20b")
+# Reuses serialized tool schemas and messages across ReAct steps
+llm = chat_model("openai/gpt-oss-20b", PrefixCachingChatGroq, groq_api_key=groq_api_key)
 
 
 # -------------------- State Definition --------------------
 
-# Create the agent using the built-in create_react_agent
-graph = create_react_agent(llm, tools)
+SYSTEM_PROMPT = "You are a helpful assistant. Use the available tools when they help answer the question."
+
+# Set SPECULATIVE_TOOLS=1 to start tool calls while the model response is
+# still streaming; all tools here are side-effect free, so any of them may run early
+if os.environ.get("SPECULATIVE_TOOLS") == "1":
+    graph = create_speculative_react_agent(llm, tools, prompt=SYSTEM_PROMPT)
+else:
+    # Create the agent using the built-in create_react_agent
+    # The string prompt becomes one constant system message, keeping the prefix stable
+    graph = create_react_agent(llm, tools, prompt=SYSTEM_PROMPT)
+instrument_graph(graph)
+if hasattr(llm, "cache_info"):  # not in record/replay mode
+    graph.telemetry.observe_cache("prompt_prefix", llm.cache_info)
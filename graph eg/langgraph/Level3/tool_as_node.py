@@ -1,13 +1,24 @@
 import os
+import sys
+import uuid
+from pathlib import Path
 from typing import Annotated, TypedDict
 from dotenv import load_dotenv
-from langchain_groq import ChatGroq
 from langchain_core.tools import tool
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import HumanMessage, SystemMessage
 from langgraph.graph.message import add_messages
 from langgraph.prebuilt import ToolNode, tools_condition
 from langgraph.graph import StateGraph, END, START
 
+# Make the shared helpers in ../common importable
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.graph_compile import compile_graph
+from common.prompt_cache import PrefixCachingChatGroq
+from common.budget import RunBudget, run_with_budget
+from common.model_provider import chat_model
+from common.telemetry import instrument_graph
+from common.session_store import SessionStore, trim_history
+
 # Load environment variables from .env file
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
@@ -47,8 +58,11 @@ tools = [get_weather, add, subtract]
 # -------------------- LLM Setup --------------------
 
 # Initialize the LLM with Groq API key and model
-llm = ChatGroq(groq_api_key=GROQ_API_KEY, model="llama-3.3-70b-versatile")
+# Tool schemas and already-seen messages are serialized once and reused, and the
+# system prompt is a single constant message, so every step sends the same prefix
+llm = chat_model("llama-3.3-70b-versatile", PrefixCachingChatGroq, groq_api_key=GROQ_API_KEY)
 llm_with_tools = llm.bind_tools(tools)
+SYSTEM_MESSAGE = SystemMessage(content="You are a helpful assistant. Use the available tools when they help answer the question.")
 
 # -------------------- State Definition --------------------
 
@@ -61,7 +75,7 @@ graph_builder = StateGraph(State)
 # Node: Chatbot LLM invocation
 def chatbot(state: State):
     # Pass conversation messages to the LLM and get the response
-    return {"messages": [llm_with_tools.invoke(state["messages"])]}
+    return {"messages": [llm_with_tools.invoke([SYSTEM_MESSAGE] + state["messages"])]}
 
 graph_builder.add_node("chatbot", chatbot)
 
@@ -73,6 +87,7 @@ graph_builder.add_node("tools", tool_node)
 graph_builder.add_conditional_edges(
     "chatbot",
     tools_condition,
+    {"tools": "tools", END: END},
 )
 
 # After tool execution, return to chatbot
@@ -80,23 +95,45 @@ graph_builder.add_edge("tools", "chatbot")
 # Start the graph at the chatbot node
 graph_builder.add_edge(START, "chatbot")
 
-# Compile the graph
-graph = graph_builder.compile()
+# Compile the graph (validates edges and router targets)
+graph = compile_graph(graph_builder)
+instrument_graph(graph)
+if hasattr(llm, "cache_info"):  # not in record/replay mode
+    graph.telemetry.observe_cache("prompt_prefix", llm.cache_info)
 
 # -------------------- Chat Loop --------------------
 
+# Limits for a single user turn: chatbot <-> tools supersteps, seconds,
+# LLM tokens and tool calls
+TURN_BUDGET = RunBudget(max_steps=12, deadline=60, max_tokens=20000, max_tool_calls=8)
+
+# Conversations live in a bounded session store: idle sessions expire and
+# cold ones are spilled to disk. Each conversation keeps its last
+# MAX_HISTORY_MESSAGES messages, and each process gets its own session
+sessions = SessionStore(spill_dir="session_spill", max_sessions=100, idle_ttl=60 * 60)
+SESSION_ID = os.environ.get("SESSION_ID") or f"cli-{uuid.uuid4().hex[:8]}"
+MAX_HISTORY_MESSAGES = int(os.environ.get("MAX_HISTORY_MESSAGES", "40"))
+
 print("You can chat with the LLM. It will decide when to use tools (weather, add, subtract). Type 'exit' to quit.")
-conversation = []
 while True:
     user_input = input("You: ")
     if user_input.lower() in ["exit", "quit"]:
         print("Exiting chat.")
+        print("Sessions:", sessions.metrics())
         break
     # Add user message to conversation
-    conversation.append(HumanMessage(content=user_input))
+    conversation = sessions.get(SESSION_ID, []) + [HumanMessage(content=user_input)]
     state = {"messages": conversation}
-    # Invoke the graph with the current state
-    result = graph.invoke(state)
+    # Invoke the graph with the current state, bounded by the per-turn budget
+    result, report = run_with_budget(graph, state, TURN_BUDGET)
     # Update conversation with new messages
-    conversation = result["messages"]
+    conversation = trim_history(result["messages"], MAX_HISTORY_MESSAGES)
+    if report["status"] == "budget_exceeded":
+        # Drop a trailing tool request that will never get its results
+        if getattr(conversation[-1], "tool_calls", None):
+            conversation = conversation[:-1]
+        sessions.put(SESSION_ID, conversation)
+        print(f"AI: (stopped early: {report['reason']} budget reached)")
+        continue
+    sessions.put(SESSION_ID, conversation)
     print("AI:", conversation[-1].content)
\ No newline at end of file
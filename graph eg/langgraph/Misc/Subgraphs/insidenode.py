@@ -1,5 +1,12 @@
 from typing_extensions import TypedDict 
 from langgraph.graph.state import StateGraph, START 
+from langgraph.types import CachePolicy
+import sys
+from pathlib import Path
+
+# Make the shared helpers in ../../common importable
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from common.node_cache import MemoryNodeCache, state_key
 class SubgraphState(TypedDict):    
     test: str 
     
@@ -8,9 +15,9 @@ def subgraph_node_1(state: SubgraphState):
     return {"test": "hi! " + state["test"]} 
 
 subgraph_builder = StateGraph(SubgraphState) 
-subgraph_builder.add_node(subgraph_node_1) 
+subgraph_builder.add_node(subgraph_node_1, cache_policy=CachePolicy(key_func=state_key("test"))) 
 subgraph_builder.add_edge(START, "subgraph_node_1") 
-subgraph = subgraph_builder.compile() 
+subgraph = subgraph_builder.compile(cache=MemoryNodeCache(max_entries=256)) 
 
 # Parent graph 
 class State(TypedDict):    
@@ -21,11 +28,15 @@ def call_subgraph(state: State):
     return {"sample": subgraph_output["test"]} 
 
 builder = StateGraph(State) 
-builder.add_node("node_1", call_subgraph) 
+# Caching node_1 on "sample" skips the whole subgraph invocation on repeat input
+builder.add_node("node_1", call_subgraph, cache_policy=CachePolicy(key_func=state_key("sample"))) 
 builder.add_edge(START, "node_1") 
-graph = builder.compile() 
+graph = builder.compile(cache=MemoryNodeCache(max_entries=256)) 
 
 # --- Run the Graph --- 
 if __name__ == "__main__":    
     result = graph.invoke({"sample": "LangGraph"})    
-    print("Final Output:", result)       
\ No newline at end of file
+    print("Final Output:", result)
+    for update in graph.stream({"sample": "LangGraph"}, stream_mode="updates"):
+        print("Cached update:", update)
+    print("Node cache:", graph.cache.stats, "subgraph cache:", subgraph.cache.stats)       
\ No newline at end of file
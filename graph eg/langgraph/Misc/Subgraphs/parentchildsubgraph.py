@@ -1,5 +1,12 @@
 from langgraph.graph import StateGraph, START, END 
+from langgraph.types import CachePolicy
 from typing import TypedDict 
+import sys
+from pathlib import Path
+
+# Make the shared helpers in ../../common importable
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from common.node_cache import MemoryNodeCache, state_key
 
 # --- Subgraph State --- 
 class State(TypedDict):    
@@ -9,21 +16,29 @@ class State(TypedDict):
 def subgraph_node_1(state: State):    
     return {"sample": "hi! " + state["sample"]} 
 
+# The node only depends on "sample", so repeat inputs are served from the cache
+SAMPLE_CACHE = CachePolicy(key_func=state_key("sample"))
+node_cache = MemoryNodeCache(max_entries=256)
+
 # --- Build Subgraph --- 
 subgraph_builder = StateGraph(State) 
-subgraph_builder.add_node("subgraph_node_1", subgraph_node_1) 
+subgraph_builder.add_node("subgraph_node_1", subgraph_node_1, cache_policy=SAMPLE_CACHE) 
 subgraph_builder.add_edge(START,"subgraph_node_1") 
 
 # Optional if only one node 
-subgraph = subgraph_builder.compile() 
+subgraph = subgraph_builder.compile(cache=node_cache) 
 
 # --- Build Parent Graph --- 
 parent_builder = StateGraph(State) 
-parent_builder.add_node("node_1", subgraph_node_1) 
+parent_builder.add_node("node_1", subgraph_node_1, cache_policy=SAMPLE_CACHE) 
 parent_builder.add_edge(START, "node_1") 
-graph = parent_builder.compile() 
+graph = parent_builder.compile(cache=node_cache) 
 
 # --- Run the Parent Graph --- 
 if __name__ == "__main__":    
     result = graph.invoke({"sample": "LangGraph"})    
-    print("Final Output:", result)
\ No newline at end of file
+    print("Final Output:", result)
+    # Same input again: node_1 is skipped and its cached update is replayed
+    for update in graph.stream({"sample": "LangGraph"}, stream_mode="updates"):
+        print("Cached update:", update)
+    print("Node cache:", node_cache.stats)
\ No newline at end of file
@@ -1,23 +1,47 @@
-from langchain_community.tools.tavily_search import TavilySearchResults 
-from langchain_groq import ChatGroq 
-import os 
-from dotenv import load_dotenv 
+from langchain_community.tools.tavily_search import TavilySearchResults
+from langchain_core.messages import HumanMessage
+from langgraph.prebuilt import create_react_agent
+import os
+import sys
+from pathlib import Path
+from dotenv import load_dotenv
 
-# Optional: Load environment variables 
-# from .env load_dotenv() 
-#TAVILY_API_KEY = os.getenv("TAVILY_API_KEY") 
+# Make the shared helpers in ../../common importable
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from common.search_cache import CachedSearch, SearchResultCache, make_search_tools
+from common.model_provider import chat_model
+from common.telemetry import instrument_graph
 
-# # Step 1: Initialize Groq model 
-llm=ChatGroq(groq_api_key="Your API KEY",model="llama-3.3-70b-versatile") 
+# Load environment variables (GROQ_API_KEY, TAVILY_API_KEY) from .env
+load_dotenv()
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
-# Step 2: Initialize Tavily search tool 
-search_tool = TavilySearchResults(k=3) 
+# Step 1: Initialize Groq model
+llm = chat_model("llama-3.3-70b-versatile", groq_api_key=GROQ_API_KEY)
 
-# Step 3: Manual message format 
-from langchain.agents import initialize_agent, AgentType 
-agent = initialize_agent(tools=[search_tool],llm=llm,agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,verbose=True,handle_parsing_errors=True, 
-                         agent_kwargs={"prefix": "You are an assistant that must always use tools to find the correct answer, never guess.",}) 
+# Step 2: Initialize Tavily search behind a persistent result cache
+# News goes stale quickly, so cached results are reused for 30 minutes
+tavily = TavilySearchResults(max_results=3)
+search = CachedSearch(
+    backend=lambda query: tavily.invoke({"query": query}),
+    cache=SearchResultCache("search_cache.sqlite", ttl=30 * 60),
+)
+tools = make_search_tools(search)  # web_search and multi_search
 
-# Step 4: Ask question 
-response = agent.run("What is the latest news about AI regulations in the EU?") 
-print("\nAgent Response:\n", response) 
\ No newline at end of file
+# Step 3: Build the agent <-> tools graph
+agent = create_react_agent(
+    llm,
+    tools,
+    prompt=(
+        "You are an assistant that must always use tools to find the correct answer, never guess. "
+        "When a question needs several searches, pass them all to multi_search in one call."
+    ),
+)
+instrument_graph(agent)
+agent.telemetry.observe_cache("search", lambda: search.cache.stats)
+
+# Step 4: Ask question
+if __name__ == "__main__":
+    result = agent.invoke({"messages": [HumanMessage(content="What is the latest news about AI regulations in the EU?")]})
+    print("\nAgent Response:\n", result["messages"][-1].content)
+    print("Search cache:", search.cache.stats)
@@ -0,0 +1,261 @@
+"""
+Long-running scheduler service for the ebook posting graph.
+
+Instead of a cron entry that starts a fresh process (and pays imports and
+model setup) for every post, this service stays up and pulls posting runs
+from a durable SQLite job queue:
+- `schedule` registers a recurring run for an ebook and page range
+- `enqueue` adds a one-off run
+- `serve` runs the scheduler: due schedules become jobs, jobs run on a
+  worker pool (at most `--workers` at once, one run per ebook at a time),
+  failed runs are retried, and a run interrupted by a crash or restart
+  resumes from its last checkpoint
+- `metrics` prints queue metrics; `serve --http-port` also exposes them as
+  JSON on GET /metrics (and GET /jobs/<id> for one job)
+
+With `--require-approval`, every run pauses after the post is generated:
+the run is checkpointed, its job is parked as "waiting" and the worker moves
+on, so pending approvals cost only rows in the two SQLite files. `pending`
+lists them, and `approve <job>` (optionally with `--content` to edit the
+post) or `reject <job>` queues the run again from any process; a worker
+then resumes it from the checkpoint. `serve --http-port` offers the same as
+GET /approvals and POST /approvals/<job> with {"approved": true|false,
+"content": string|null}; any other body is answered with 400.
+
+Queue and checkpoints live in JOB_QUEUE_PATH (default jobs.sqlite) and
+CHECKPOINT_PATH (default checkpoints.sqlite).
+
+Run from this folder, e.g.:
+    python scheduler.py schedule daily-excellence /path/to/Excellence.pdf 9 268 --every 86400
+    python scheduler.py serve --workers 2 --http-port 8765
+    python scheduler.py approve 42 --content "Edited post #softwareengineering"
+"""
+
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+
+from langgraph.types import Command
+
+import tweetthread
+
+# Make the shared helpers in ../../common importable
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from common.budget import run_with_budget
+from common.job_queue import Job, JobQueue, Scheduler, WaitForResume
+from common.sqlite_saver import SqliteCheckpointSaver
+
+EBOOK_JOB = "ebook_post"
+
+
+class EbookRunner:
+    """Runs ebook posting jobs; compiled graphs are reused per ebook and page range."""
+
+    def __init__(self, checkpointer: SqliteCheckpointSaver):
+        self.checkpointer = checkpointer
+        self._graphs = {}
+        self._lock = threading.Lock()
+
+    def graph_for(self, ebook_path: str, start_page: int, end_page: int, require_approval: bool = False):
+        key = (ebook_path, start_page, end_page, require_approval)
+        with self._lock:
+            if key not in self._graphs:
+                self._graphs[key] = tweetthread.build_ebook_sharing_graph(
+                    ebook_path, start_page, end_page, checkpointer=self.checkpointer, require_approval=require_approval
+                )
+            return self._graphs[key]
+
+    def _wait_for_review(self, job: Job, pending) -> WaitForResume:
+        self.checkpointer.release(job.thread_id)
+        print(f"Job {job.id} is waiting for approval of page {pending.value['page_number']}")
+        return WaitForResume({"interrupt_id": pending.id, **pending.value})
+
+    def __call__(self, job: Job):
+        payload = job.payload
+        graph = self.graph_for(
+            payload["ebook_path"], payload["start_page"], payload["end_page"], payload.get("require_approval", False)
+        )
+        config = {"configurable": {"thread_id": job.thread_id}}
+        snapshot = graph.get_state(config)
+        if not snapshot.next and snapshot.values.get("post", {}).get("status") in ("posted", "rejected"):
+            # The run finished but its job was not recorded (e.g. the worker
+            # died right after posting): complete it without posting again
+            self.checkpointer.release(job.thread_id)
+            return run_result(snapshot.values, resumed=True, steps=0)
+        # A retried or recovered job continues from its last finished superstep
+        resumed = bool(snapshot.next)
+        if snapshot.interrupts:
+            pending = snapshot.interrupts[0]
+            decision = payload.get("resume")
+            # Only a decision made for this exact draft may resume the run
+            if not isinstance(decision, dict) or decision.get("interrupt_id") != pending.id:
+                return self._wait_for_review(job, pending)
+            inputs = Command(resume=decision)
+        elif resumed:
+            inputs = None
+        else:
+            inputs = tweetthread.new_run_state(payload["ebook_path"], payload["start_page"], payload["end_page"])
+        try:
+            # Save each checkpoint before the next step starts, so a crash
+            # never repeats a finished step (e.g. posting twice). A step
+            # past the deadline is waited for, so a retry never runs on this
+            # thread while it may still be posting
+            state, report = run_with_budget(
+                graph, inputs, tweetthread.RUN_BUDGET, config, wait_for_step=True, durability="sync"
+            )
+            if report["status"] == "interrupted":
+                return self._wait_for_review(job, graph.get_state(config).interrupts[0])
+        finally:
+            # The run is done or will be resumed from disk; free its memory
+            self.checkpointer.release(job.thread_id)
+        if report["status"] != "completed":
+            raise RuntimeError(f"run stopped early ({report['reason']})")
+        if state["post"]["status"] not in ("posted", "rejected"):
+            raise RuntimeError(state["error"] or "post was not published")
+        return run_result(state, resumed, report["steps"])
+
+
+def run_result(state: dict, resumed: bool, steps: int) -> dict:
+    """Job result recorded for a finished posting run."""
+    return {
+        "page": state["current_page_info"]["page_number"],
+        "status": state["post"]["status"],
+        "resumed": resumed,
+        "steps": steps,
+    }
+
+
+def review(queue: JobQueue, job_id: int, approved: bool, content: Optional[str] = None) -> bool:
+    """Records a reviewer's decision on a waiting job; False if it is not waiting for one."""
+    job = queue.get(job_id)
+    if job is None or job["status"] != "waiting":
+        return False
+    detail = json.loads(job["result"])
+    return queue.resume(job_id, {"interrupt_id": detail["interrupt_id"], "approved": approved, "content": content})
+
+
+def ebook_payload(ebook_path: str, start_page: int, end_page: int, require_approval: bool = False) -> dict:
+    return {
+        "ebook_path": os.path.abspath(ebook_path),
+        "start_page": start_page,
+        "end_page": end_page,
+        "require_approval": require_approval,
+    }
+
+
+def serve_http(scheduler: Scheduler, port: int) -> ThreadingHTTPServer:
+    """Serves metrics, jobs and approvals as JSON from a background thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                self._reply(200, scheduler.metrics())
+            elif self.path.startswith("/jobs/") and self.path[6:].isdigit():
+                job = scheduler.queue.get(int(self.path[6:]))
+                self._reply(200 if job else 404, job or {"error": "no such job"})
+            elif self.path == "/approvals":
+                self._reply(200, {"pending": scheduler.queue.waiting(EBOOK_JOB)})
+            else:
+                self._reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            if not (self.path.startswith("/approvals/") and self.path[11:].isdigit()):
+                self._reply(404, {"error": "not found"})
+                return
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            except ValueError:
+                self._reply(400, {"error": "body must be JSON"})
+                return
+            if not (
+                isinstance(body, dict)
+                and isinstance(body.get("approved"), bool)
+                and isinstance(body.get("content"), (str, type(None)))
+            ):
+                self._reply(400, {"error": 'body must be {"approved": true|false, "content": string|null}'})
+                return
+            job_id = int(self.path[11:])
+            if review(scheduler.queue, job_id, body["approved"], body.get("content")):
+                self._reply(202, {"job": job_id, "status": "queued"})
+            else:
+                self._reply(409, {"error": f"job {job_id} is not waiting for approval"})
+
+        def _reply(self, status: int, body: dict):
+            data = json.dumps(body, default=str).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, name="http", daemon=True).start()
+    print(f"Metrics on http://127.0.0.1:{port}/metrics, approvals on http://127.0.0.1:{port}/approvals")
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name in ("schedule", "enqueue"):
+        command = commands.add_parser(name)
+        if name == "schedule":
+            command.add_argument("name")
+        command.add_argument("ebook_path")
+        command.add_argument("start_page", type=int)
+        command.add_argument("end_page", type=int)
+        if name == "schedule":
+            command.add_argument("--every", type=float, default=24 * 3600, help="seconds between runs")
+        command.add_argument("--require-approval", action="store_true", help="pause each run for review")
+    serve = commands.add_parser("serve")
+    serve.add_argument("--workers", type=int, default=2)
+    serve.add_argument("--http-port", type=int)
+    commands.add_parser("metrics")
+    commands.add_parser("pending")
+    for name in ("approve", "reject"):
+        command = commands.add_parser(name)
+        command.add_argument("job_id", type=int)
+        if name == "approve":
+            command.add_argument("--content", help="post text to use instead of the draft")
+    args = parser.parse_args(argv)
+
+    queue = JobQueue(os.getenv("JOB_QUEUE_PATH", "jobs.sqlite"), lease=120)
+    if args.command == "schedule":
+        payload = ebook_payload(args.ebook_path, args.start_page, args.end_page, args.require_approval)
+        queue.add_schedule(args.name, EBOOK_JOB, payload, args.every, concurrency_key=payload["ebook_path"])
+        print(f"Scheduled {args.name} every {args.every:.0f}s")
+    elif args.command == "enqueue":
+        payload = ebook_payload(args.ebook_path, args.start_page, args.end_page, args.require_approval)
+        print(f"Enqueued job {queue.enqueue(EBOOK_JOB, payload, concurrency_key=payload['ebook_path'])}")
+    elif args.command == "metrics":
+        print(json.dumps(queue.metrics(), indent=2))
+    elif args.command == "pending":
+        for job in queue.waiting(EBOOK_JOB, limit=1000):
+            print(f"{job['id']}: page {job['detail']['page_number']}: {job['detail']['content']}")
+    elif args.command in ("approve", "reject"):
+        if not review(queue, args.job_id, args.command == "approve", getattr(args, "content", None)):
+            sys.exit(f"Job {args.job_id} is not waiting for approval")
+        print(f"Job {args.job_id} {args.command}d; a worker will resume it")
+    else:
+        runner = EbookRunner(SqliteCheckpointSaver(os.getenv("CHECKPOINT_PATH", "checkpoints.sqlite")))
+        scheduler = Scheduler(queue, {EBOOK_JOB: runner}, max_workers=args.workers, retry_delay=300)
+        if args.http_port:
+            serve_http(scheduler, args.http_port)
+        signal.signal(signal.SIGTERM, lambda *_: scheduler.stop())
+        try:
+            scheduler.run_forever()
+        except KeyboardInterrupt:
+            scheduler.stop()
+
+
+if __name__ == "__main__":
+    main()
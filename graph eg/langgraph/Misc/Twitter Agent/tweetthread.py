@@ -3,26 +3,54 @@ LangGraph Implementation for Daily Ebook Sharing to X/Twitter
 
 This implementation:
 1. Reads a PDF ebook and extracts a random page within a specified range
-2. Takes a screenshot of that page
-3. Uses Groq LLM to generate a social media post based on the page content
+2. Takes a screenshot of that page while uploading the cover image in parallel
+3. Uses Groq LLM to generate a social media post based on the page content,
+   while the screenshot is uploaded in parallel
 4. Posts the content and image to X (Twitter)
 """
 
 import os
+import sys
 import json
+import pickle
 import random
+import threading
 from datetime import datetime
-from typing import Dict, TypedDict, Literal
+from pathlib import Path
+from typing import Annotated, Dict, List, Optional, TypedDict, Literal
+from langchain_core.runnables import RunnableConfig
+from langgraph.cache.base import BaseCache
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.graph import StateGraph, END
+from langgraph.types import CachePolicy, interrupt
 import time as sleep_time
 import fitz 
 import requests
 import tweepy  # For X API
 from dotenv import load_dotenv
 
+# Make the shared helpers in ../../common importable
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from common.graph_compile import compile_graph
+from common.budget import RunBudget, remaining_time, run_with_budget
+from common.memory_profile import MemoryProfiler
+from common.telemetry import instrument_graph
+from common.node_cache import SqliteNodeCache, state_key
+
 # Load environment variables
 load_dotenv()
 
+# Reducers used to merge partial updates from parallel branches
+def merge_dicts(current: dict, update: dict) -> dict:
+    """Merges dictionary updates written by parallel nodes in the same superstep."""
+    return {**(current or {}), **(update or {})}
+
+def merge_errors(current: str, update: str) -> str:
+    """Joins errors from parallel nodes; an empty update clears the error."""
+    if not update or not current:
+        return update
+    return f"{current}; {update}"
+
 # Type definitions for state management
 class PageInfo(TypedDict):
     page_number: int
@@ -31,64 +59,121 @@ class PageInfo(TypedDict):
     
 class PostDetails(TypedDict):
     content: str
-    status: Literal["draft", "approved", "posted"]
+    status: Literal["draft", "approved", "rejected", "posted"]
     
 class EbookSharerState(TypedDict):
     ebook_path: str
     page_range: Dict[str, int]  # {start: int, end: int}
-    current_page_info: PageInfo
+    current_page_info: Annotated[PageInfo, merge_dicts]
+    media_ids: Annotated[Dict[str, int], merge_dicts]  # {"page": id, "cover": id}
     post: PostDetails
-    error: str
+    error: Annotated[str, merge_errors]
+    tweet_ids: Annotated[Dict[str, str], merge_dicts]  # {"post": id, "reply": id}
+
+COVER_IMAGE_PATH = os.getenv("COVER_IMAGE_PATH", "/Users/demo/Code/CMO/Cover.jpeg")
+
+# PyMuPDF is not thread-safe, and the PDF nodes run as parallel branches on
+# LangGraph's thread pool, so every use of `fitz` holds this lock
+PDF_LOCK = threading.Lock()
 
 # Node implementations
-def select_random_page(state: EbookSharerState) -> EbookSharerState:
+#
+# Page text extraction, page rendering and the cover upload only depend on
+# the selected page number, so they run as parallel branches in one
+# superstep. Post generation and the page image upload then run in parallel
+# in the next superstep, and `post_to_x` joins all branches. Parallel nodes
+# return only the keys they own so the reducers above can merge them.
+def select_random_page(state: EbookSharerState) -> dict:
     """Selects a random page from the ebook within the specified range."""
     try:
         # Open the PDF document
-        doc = fitz.open(state["ebook_path"])
+        with PDF_LOCK:
+            doc = fitz.open(state["ebook_path"])
+            page_count = doc.page_count
+            doc.close()
         
         # Select a random page within the range
         start_page = state["page_range"]["start"]
-        end_page = min(state["page_range"]["end"], doc.page_count)
+        end_page = min(state["page_range"]["end"], page_count)
         random_page_num = random.randint(start_page, end_page)
         
-        # Extract the page
-        page = doc[random_page_num-1]  # 0-indexed
+        print(f"Selected page {random_page_num}")
+        return {
+            "current_page_info": {"page_number": random_page_num, "image_path": "", "page_text": ""},
+            "error": ""
+        }
         
-        # Extract text for context
-        text = page.get_text()
+    except Exception as e:
+        error = f"Error selecting random page: {str(e)}"
+        print(error)
+        return {"error": error}
+
+def extract_page_text(state: EbookSharerState) -> dict:
+    """Extracts the text of the selected page for the post prompt."""
+    try:
+        page_number = state["current_page_info"]["page_number"]
+        with PDF_LOCK:
+            doc = fitz.open(state["ebook_path"])
+            text = doc[page_number-1].get_text()  # 0-indexed
+            doc.close()
+        return {"current_page_info": {"page_text": text}}
+    except Exception as e:
+        error = f"Error extracting page text: {str(e)}"
+        print(error)
+        return {"error": error}
+
+def render_page_image(state: EbookSharerState) -> dict:
+    """Renders the selected page to a PNG screenshot."""
+    try:
+        page_number = state["current_page_info"]["page_number"]
         
         # Generate image path with timestamp
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        image_path = f"page_{random_page_num}_{timestamp}.png"
+        image_path = f"page_{page_number}_{timestamp}.png"
         
         # Render page to an image and save
-        pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # 2x zoom for better quality
-        pix.save(image_path)
-        
-        doc.close()
-        
-        # Update state
-        state["current_page_info"] = {
-            "page_number": random_page_num,
-            "image_path": image_path,
-            "page_text": text
-        }
-        state["error"] = ""
-        
-        print(f"Selected page {random_page_num} and saved as {image_path}")
+        with PDF_LOCK:
+            doc = fitz.open(state["ebook_path"])
+            pix = doc[page_number-1].get_pixmap(matrix=fitz.Matrix(2, 2))  # 2x zoom for better quality
+            pix.save(image_path)
+            doc.close()
         
+        print(f"Saved page {page_number} as {image_path}")
+        return {"current_page_info": {"image_path": image_path}}
     except Exception as e:
-        state["error"] = f"Error selecting random page: {str(e)}"
-        print(state["error"])
-    
-    return state
+        error = f"Error rendering page image: {str(e)}"
+        print(error)
+        return {"error": error}
+
+def upload_cover_image(state: EbookSharerState) -> dict:
+    """Uploads the book cover used by the reply tweet (via v1.1 media upload)."""
+    try:
+        _, api = get_twitter_auth()
+        cover_media = api.media_upload(filename=COVER_IMAGE_PATH)
+        return {"media_ids": {"cover": cover_media.media_id}}
+    except Exception as e:
+        error = f"Error uploading cover image: {str(e)}"
+        print(error)
+        return {"error": error}
+
+def upload_page_image(state: EbookSharerState) -> dict:
+    """Uploads the rendered page screenshot (via v1.1 media upload)."""
+    try:
+        if state["error"]:
+            return {}
+        _, api = get_twitter_auth()
+        media = api.media_upload(filename=state["current_page_info"]["image_path"])
+        return {"media_ids": {"page": media.media_id}}
+    except Exception as e:
+        error = f"Error uploading page image: {str(e)}"
+        print(error)
+        return {"error": error}
 
-def generate_post_with_groq(state: EbookSharerState) -> EbookSharerState:
+def generate_post_with_groq(state: EbookSharerState) -> dict:
     """Sends the page screenshot to Groq and asks it to create a post."""
     try:
         if state["error"]:
-            return state
+            return {}
 
         # Get Groq API key from environment
         groq_api_key = os.getenv("GROQ_API_KEY")
@@ -124,30 +209,64 @@ def generate_post_with_groq(state: EbookSharerState) -> EbookSharerState:
         response_data = response.json()
         post_content = response_data["choices"][0]["message"]["content"]
 
-        # Update state
-        state["post"] = {
-            "content": post_content,
-            "status": "draft"
-        }
-
         print(f"Generated post: {post_content}")
+        return {"post": {"content": post_content, "status": "draft"}}
 
     except Exception as e:
-        state["error"] = f"Error generating post with Groq: {str(e)}"
-        print(state["error"])
+        error = f"Error generating post with Groq: {str(e)}"
+        print(error)
+        return {"error": error}
 
-    return state
+def review_post(state: EbookSharerState) -> dict:
+    """Pauses the run until a reviewer approves, edits or rejects the draft.
+
+    The run is checkpointed at the interrupt and nothing is held while it
+    waits; resume it with Command(resume={"approved": bool, "content": str}),
+    where "content" optionally replaces the draft, or with a plain bool.
+    """
+    if state["error"]:
+        return {}
+
+    decision = interrupt({
+        "ebook_path": state["ebook_path"],
+        "page_number": state["current_page_info"]["page_number"],
+        "content": state["post"]["content"],
+    })
+    if isinstance(decision, bool):
+        decision = {"approved": decision}
+    elif not isinstance(decision, dict):
+        raise TypeError(f"review decision must be a bool or a dict with 'approved', not {decision!r}")
+    if not isinstance(decision.get("approved"), bool):
+        raise TypeError(f"'approved' must be true or false, not {decision.get('approved')!r}")
+    if not isinstance(decision.get("content"), (str, type(None))):
+        raise TypeError(f"'content' must be a string or None, not {decision.get('content')!r}")
+    if not decision["approved"]:
+        print("🚫 Post rejected by reviewer")
+        return {"post": {**state["post"], "status": "rejected"}}
+
+    print("👍 Post approved")
+    return {"post": {"content": decision.get("content") or state["post"]["content"], "status": "approved"}}
+
+# Tweepy clients are reused per thread and rebuilt when the credentials change
+_twitter_clients = threading.local()
 
 def get_twitter_auth():
     """Fetch Twitter credentials from .env and return Tweepy clients (v2 and v1.1)."""
-    api_key = os.getenv("TWITTER_API_KEY")
-    api_secret = os.getenv("TWITTER_API_SECRET")
-    access_token = os.getenv("TWITTER_ACCESS_TOKEN")
-    access_token_secret = os.getenv("TWITTER_ACCESS_TOKEN_SECRET")
+    credentials = (
+        os.getenv("TWITTER_API_KEY"),
+        os.getenv("TWITTER_API_SECRET"),
+        os.getenv("TWITTER_ACCESS_TOKEN"),
+        os.getenv("TWITTER_ACCESS_TOKEN_SECRET"),
+    )
+    api_key, api_secret, access_token, access_token_secret = credentials
 
-    if not all([api_key, api_secret, access_token, access_token_secret]):
+    if not all(credentials):
         raise EnvironmentError("Missing one or more required Twitter API credentials.")
 
+    cached = getattr(_twitter_clients, "entry", None)
+    if cached is not None and cached[0] == credentials:
+        return cached[1]
+
     # Initialize OAuth1.0a for media upload
     auth = tweepy.OAuth1UserHandler(api_key, api_secret, access_token, access_token_secret)
     api_v1 = tweepy.API(auth)
@@ -161,121 +280,198 @@ def get_twitter_auth():
         wait_on_rate_limit=True
     )
 
+    _twitter_clients.entry = (credentials, (client_v2, api_v1))
     return client_v2, api_v1
 
-def post_to_x(state: EbookSharerState) -> EbookSharerState:
-    """Posts content and image to X (Twitter) using v2 client and v1.1 media upload."""
-    try:
-        if state.get("error"):
-            return state
-
-        client, api = get_twitter_auth()
+# Errors written by post_to_x itself; retrying them repeats only the failed call
+POSTING_ERRORS = ("Twitter API error", "Error posting to X")
 
-        # Upload media (required via v1.1)
-        image_path = state["current_page_info"]["image_path"]
-        media = api.media_upload(filename=image_path)
+def post_to_x(state: EbookSharerState) -> dict:
+    """Joins the parallel branches and posts the tweet and cover reply using the v2 client.
 
-        # Create tweet with media
-        tweet_text = state["post"]["content"]
-        response = client.create_tweet(text=tweet_text, media_ids=[media.media_id])
+    Tweets already created by an earlier attempt (in `tweet_ids`) are not
+    created again, so a retry after a failed reply only posts the reply, and
+    a thread that already posted both never posts again.
+    """
+    error = state.get("error")
+    if (error and not error.startswith(POSTING_ERRORS)) or state["post"]["status"] == "rejected":
+        return {}
 
-        tweet_id = response.data.get("id")
-        print(f"✅ Successfully posted to X with tweet ID: {tweet_id}")
+    tweet_ids = dict(state.get("tweet_ids") or {})
+    if "reply" in tweet_ids:
+        print(f"Already posted in this thread as tweet {tweet_ids['post']}; not posting again")
+        return {"post": {**state["post"], "status": "posted"}, "error": ""}
+    try:
+        client, _ = get_twitter_auth()
 
-        state["post"]["status"] = "posted"
+        # Create tweet with the already uploaded page image
+        if "post" not in tweet_ids:
+            tweet_text = state["post"]["content"]
+            response = client.create_tweet(text=tweet_text, media_ids=[state["media_ids"]["page"]])
+            tweet_ids["post"] = response.data.get("id")
+            print(f"✅ Successfully posted to X with tweet ID: {tweet_ids['post']}")
 
         # ➕ Post reply tweet
         reply_text = "Excel at the art that is software engineering! Get a mentor in print format. Invest in yourself. https://cladiusfernando.com/excellence/"
         
-        # Upload cover image for reply
-        cover_image_path = "/Users/demo/Code/CMO/Cover.jpeg"
-        cover_media = api.media_upload(filename=cover_image_path)
-        
         reply = client.create_tweet(
             text=reply_text,
-            media_ids=[cover_media.media_id],
-            in_reply_to_tweet_id=tweet_id
+            media_ids=[state["media_ids"]["cover"]],
+            in_reply_to_tweet_id=tweet_ids["post"]
         )
-        reply_id = reply.data.get("id")
-        print(f"💬 Posted reply tweet with ID: {reply_id}")
+        tweet_ids["reply"] = reply.data.get("id")
+        print(f"💬 Posted reply tweet with ID: {tweet_ids['reply']}")
 
         # Optional: clean up image file
+        image_path = state["current_page_info"]["image_path"]
         if os.path.exists(image_path):
             os.remove(image_path)
             print(f"🧹 Deleted image file: {image_path}")
 
+        return {"post": {**state["post"], "status": "posted"}, "tweet_ids": tweet_ids, "error": ""}
+
     except tweepy.TweepyException as e:
-        state["error"] = f"Twitter API error: {str(e)}"
-        print(state["error"])
+        error = f"Twitter API error: {str(e)}"
     except Exception as e:
-        state["error"] = f"Error posting to X: {str(e)}"
-        print(state["error"])
+        error = f"Error posting to X: {str(e)}"
+    print(error)
+    # Keep the ids of tweets that did go out so a retry doesn't repeat them
+    return {"error": error, "tweet_ids": tweet_ids}
 
-    return state
+RETRY_DELAY_SECONDS = 300
 
-def handle_error(state: EbookSharerState) -> Literal["retry", "end"]:
+def handle_error(state: EbookSharerState, config: RunnableConfig) -> Literal["continue", "retry", "end"]:
     """Error handling logic to determine next steps."""
     if state["error"]:
         print(f"Error encountered: {state['error']}")
         # For certain errors, we might want to retry
         if "connection" in state["error"].lower() or "timeout" in state["error"].lower():
+            # Don't wait for a retry that the run's deadline won't allow
+            remaining = remaining_time(config)
+            if remaining is not None and remaining < RETRY_DELAY_SECONDS:
+                print("Not enough time left in the run budget to retry")
+                return "end"
             print("Will retry in 5 minutes")
-            sleep_time.sleep(300)  # Wait 5 minutes
+            sleep_time.sleep(RETRY_DELAY_SECONDS)  # Wait 5 minutes
             return "retry"
         else:
             return "end"
-    return "end"
+    return "continue"
+
+def route_after_post(state: EbookSharerState, config: RunnableConfig) -> Literal["continue", "retry", "retry_post", "end"]:
+    """Like handle_error, but a failed tweet is retried on its own instead of from page selection."""
+    decision = handle_error(state, config)
+    if decision == "retry" and state["error"].startswith(POSTING_ERRORS):
+        return "retry_post"
+    return decision
+
+def fan_out_on_continue(*targets: str):
+    """Wraps handle_error so that a "continue" decision fans out to several nodes."""
+    def route(state: EbookSharerState, config: RunnableConfig) -> List[str] | Literal["retry", "end"]:
+        decision = handle_error(state, config)
+        return list(targets) if decision == "continue" else decision
+    return route
+
+# Page text only depends on the book and the page number, so repeat pages
+# are served from the node cache instead of opening the PDF again
+_page_key = state_key("ebook_path", "current_page_info.page_number")
+
+def page_text_key(state: EbookSharerState) -> bytes:
+    """Book, page and the PDF's mtime and size, so a replaced file is read again."""
+    try:
+        stat = os.stat(state["ebook_path"])
+        version = (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        version = None
+    return _page_key(state) + pickle.dumps(version, protocol=pickle.HIGHEST_PROTOCOL)
+
+PAGE_TEXT_CACHE = CachePolicy(key_func=page_text_key)
+
+def default_node_cache() -> SqliteNodeCache:
+    """On-disk node cache shared by runs; runs that wrote an error are not stored."""
+    return SqliteNodeCache(
+        os.getenv("NODE_CACHE_PATH", "node_cache.sqlite"),
+        max_entries=5000,
+        skip_if=lambda writes: any(channel == "error" and value for channel, value in writes),
+    )
 
-# Build the LangGraph
-def build_ebook_sharing_graph(ebook_path: str, start_page: int, end_page: int) -> StateGraph:
-    """Builds the LangGraph for the ebook sharing process."""
-    
-    # Initialize the graph
-    graph = StateGraph(EbookSharerState)
-    
-    # Set up the initial state
-    initial_state = EbookSharerState(
+def new_run_state(ebook_path: str, start_page: int, end_page: int) -> EbookSharerState:
+    """Initial state for one posting run."""
+    return EbookSharerState(
         ebook_path=ebook_path,
         page_range={"start": start_page, "end": end_page},
         current_page_info={"page_number": 0, "image_path": "", "page_text": ""},
+        media_ids={},
         post={"content": "", "status": "draft"},
-        error=""
+        error="",
+        tweet_ids={}
     )
+
+# Build the LangGraph
+def build_ebook_sharing_graph(
+    ebook_path: str,
+    start_page: int,
+    end_page: int,
+    node_cache: Optional[BaseCache] = None,
+    checkpointer: Optional[BaseCheckpointSaver] = None,
+    require_approval: bool = False,
+) -> StateGraph:
+    """Builds the LangGraph for the ebook sharing process.
+
+    With a durable `checkpointer`, an interrupted run resumes from its last
+    finished superstep when invoked again on the same thread with no input.
+    `require_approval` adds a `review_post` step that pauses every run for a
+    human decision before posting (it needs a checkpointer).
+    """
+    if require_approval and checkpointer is None:
+        raise ValueError("require_approval needs a checkpointer to pause the run")
+    
+    # Initialize the graph
+    graph = StateGraph(EbookSharerState)
     
     # Add nodes
     graph.add_node("select_random_page", select_random_page)
+    graph.add_node("extract_page_text", extract_page_text, cache_policy=PAGE_TEXT_CACHE)
+    graph.add_node("render_page_image", render_page_image)
+    graph.add_node("upload_cover_image", upload_cover_image)
     graph.add_node("generate_post", generate_post_with_groq)
+    graph.add_node("upload_page_image", upload_page_image)
     graph.add_node("post_to_x", post_to_x)
+    if require_approval:
+        graph.add_node("review_post", review_post)
     
-    # Add edges
-    graph.add_edge("select_random_page", "generate_post")
-    graph.add_edge("generate_post", "post_to_x")
-    graph.add_edge("post_to_x", END)
-    
-    # Add error handling
+    # Fan out: once a page is selected, its text, screenshot and the cover
+    # upload are produced in parallel
     graph.add_conditional_edges(
         "select_random_page",
-        handle_error,
+        fan_out_on_continue("extract_page_text", "render_page_image", "upload_cover_image"),
         {
+            "extract_page_text": "extract_page_text",
+            "render_page_image": "render_page_image",
+            "upload_cover_image": "upload_cover_image",
             "retry": "select_random_page",
             "end": END
         }
     )
+    graph.add_edge("extract_page_text", "generate_post")
+    graph.add_edge("render_page_image", "upload_page_image")
+    if require_approval:
+        graph.add_edge("generate_post", "review_post")
     
-    graph.add_conditional_edges(
-        "generate_post",
-        handle_error,
-        {
-            "retry": "generate_post",
-            "end": END
-        }
-    )
+    # Fan in: post_to_x waits for every branch (and the review) before posting
+    post_ready = "review_post" if require_approval else "generate_post"
+    graph.add_edge([post_ready, "upload_page_image", "upload_cover_image"], "post_to_x")
     
+    # A transient failure in any branch surfaces at the join; retrying starts
+    # again from page selection, which clears the error. A failed tweet is
+    # retried by post_to_x alone, which skips tweets that already went out
     graph.add_conditional_edges(
         "post_to_x",
-        handle_error,
+        route_after_post,
         {
-            "retry": "post_to_x",
+            "continue": END,
+            "retry": "select_random_page",
+            "retry_post": "post_to_x",
             "end": END
         }
     )
@@ -283,26 +479,38 @@ def build_ebook_sharing_graph(ebook_path: str, start_page: int, end_page: int) -
     # Set the entry point
     graph.set_entry_point("select_random_page")
     
-    return graph.compile()
+    return instrument_graph(compile_graph(
+        graph,
+        cache=default_node_cache() if node_cache is None else node_cache,
+        checkpointer=checkpointer,
+    ))
+
+# Limits for one posting run, including retries
+RUN_BUDGET = RunBudget(max_steps=20, deadline=15 * 60)
 
 def run_once_for_testing(ebook_path: str, start_page: int, end_page: int):
     """Run the graph once for testing purposes."""
     graph = build_ebook_sharing_graph(ebook_path, start_page, end_page)
     
     # Create initial state
-    state = EbookSharerState(
-        ebook_path=ebook_path,
-        page_range={"start": start_page, "end": end_page},
-        current_page_info={"page_number": 0, "image_path": "", "page_text": ""},
-        post={"content": "", "status": "draft"},
-        error=""
-    )
+    state = new_run_state(ebook_path, start_page, end_page)
     
-    # Run the graph
-    final_state = graph.invoke(state)
+    # MEMORY_PROFILE=<report.json> profiles memory per node and per step
+    profile_path = os.getenv("MEMORY_PROFILE")
+    profiler = MemoryProfiler() if profile_path else None
+    if profiler:
+        graph = profiler.instrument(graph)
+
+    # Run the graph; retries can't loop or wait forever
+    final_state, _ = run_with_budget(graph, state, RUN_BUDGET)
     print("Final state:", json.dumps(final_state, indent=2))
+    if profiler:
+        report = profiler.write_json(profile_path)
+        print(f"Memory profile written to {profile_path}; growing nodes: {report['growing_nodes']}")
     
     return final_state
 
-run_once_for_testing("/Users/demo/Code/CMO/Excellence.pdf", 9, 268)
+if __name__ == "__main__":
+    # One-off run; use scheduler.py for recurring posts
+    run_once_for_testing(os.getenv("EBOOK_PATH", "/Users/demo/Code/CMO/Excellence.pdf"), 9, 268)
 
@@ -1,12 +1,20 @@
 from typing import TypedDict, List 
 from langchain_astradb import AstraDBVectorStore 
 from langchain_huggingface import HuggingFaceEmbeddings 
-from langchain_groq import ChatGroq 
 from langgraph.graph import StateGraph, END 
 import os
+import sys
+from pathlib import Path
 from dotenv import load_dotenv
 load_dotenv()
 
+# Make the shared helpers in ../common importable
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.hybrid_retrieval import HybridRetriever
+from common.write_behind import WriteBehindVectorStore
+from common.model_provider import chat_model
+from common.telemetry import instrument_graph
+
 # Your Groq API key (keep this secure in production)
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
@@ -29,19 +37,34 @@ vector_store = AstraDBVectorStore(collection_name=ASTRA_DB_COLLECTION,
                 embedding=embedding_model,api_endpoint=ASTRA_DB_API_ENDPOINT,
                 token=ASTRA_DB_APPLICATION_TOKEN,) 
 
-retriever = vector_store.as_retriever() 
+# New memories are buffered and written to AstraDB in background batches;
+# a local WAL keeps them durable and they are searchable while buffered
+buffered_store = WriteBehindVectorStore(vector_store, wal_path="memory_wal.jsonl", max_batch=16, flush_interval=5.0)
+
+# Hybrid retrieval: BM25 over stored memories + dense search, fused with
+# reciprocal rank, filtered by similarity and capped to a token budget.
+# AstraDB scores are (1 + cosine) / 2, so 0.7 keeps hits with cosine >= 0.4
+memory_index = HybridRetriever(buffered_store, k=4, score_threshold=0.7, token_budget=800)
+
+# Make memories from earlier sessions keyword-searchable, including ones
+# still waiting in the write-behind log (read first, so a flush in between
+# can only duplicate a memory, never skip it)
+BM25_BOOTSTRAP_LIMIT = int(os.getenv("BM25_BOOTSTRAP_LIMIT", "10000"))
+buffered_memories = [record["text"] for record in list(buffered_store.pending)]
+stored_memories = [doc.page_content for doc in vector_store.metadata_search(filter={}, n=BM25_BOOTSTRAP_LIMIT)]
+indexed = memory_index.index_existing(buffered_memories + stored_memories)
+print(f"Indexed {indexed} stored memories for keyword search")
 
 # ----- Step 4: Initialize LLM ----- 
-llm=ChatGroq(groq_api_key=GROQ_API_KEY,model="llama-3.3-70b-versatile") 
+llm=chat_model("llama-3.3-70b-versatile",groq_api_key=GROQ_API_KEY) 
 
 # ----- Step 5: Memory Node with LLM ----- 
 def memory_node(state: MemoryState) -> MemoryState:    
     user_input = state["input"]    
     # Store input in AstraDB    
-    vector_store.add_texts([user_input])    
+    memory_index.add_texts([user_input])    
     # Retrieve relevant memory    
-    relevant_docs = retriever.get_relevant_documents(user_input)   
-    retrieved_memory = [doc.page_content for doc in relevant_docs]    
+    retrieved_memory = memory_index.retrieve(user_input)    
     
     # Build context for LLM    
     context = "\n".join(retrieved_memory)    
@@ -58,7 +81,7 @@ def build_memory_graph():
     builder.add_node("memory_node", memory_node)    
     builder.set_entry_point("memory_node")    
     builder.add_edge("memory_node", END)    
-    return builder.compile() 
+    return instrument_graph(builder.compile())
 
 graph = build_memory_graph() 
 
@@ -69,6 +92,7 @@ while True:
     user_input = input("You: ")    
     if user_input.strip().lower() in ["exit", "quit"]:        
         print("Exiting chat.")        
+        buffered_store.close()
         break    
     output = graph.invoke({"input": user_input})    
     print("\nRetrieved Memory:")    
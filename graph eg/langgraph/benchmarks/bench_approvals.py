@@ -0,0 +1,167 @@
+"""
+Human approval of ebook posts at scale, without holding workers.
+
+Uses the fakes from bench_ebook_pipeline and the scheduler service with
+`require_approval`. The checks are:
+1. Thousands of runs pause for review on a small worker pool; afterwards
+   no run is held in memory or on a thread, so process memory stays flat
+   as pending approvals grow and each one costs only checkpoint rows
+2. Decisions arrive from outside the worker: `scheduler.py approve` in a
+   separate process (with an edited post), POST /approvals/<job> over HTTP
+   (a rejection, after malformed bodies are turned away with 400), and
+   `review()` for the rest
+3. A new service instance (a different process in production) resumes
+   every run from its checkpoint: nothing is generated again, approved
+   posts are published with the reviewer's text and rejected ones are not
+4. The graph also accepts a plain bool as the decision, rejects other
+   values (including "no" for `approved`) with a clear error, and a job
+   resumed without a decision for its draft goes back to waiting
+
+Run from this folder:
+    python bench_approvals.py
+"""
+
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.types import Command
+
+import bench_ebook_pipeline
+from bench_ebook_pipeline import tweetthread
+from bench_scheduler import open_service, service, setup
+
+PENDING = 2000
+WORKERS = 4
+EDITED = "Edited by the reviewer #softwareengineering"
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        # Peak rather than current RSS where /proc is not available
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def enqueue_and_run(queue, scheduler, count: int) -> float:
+    for _ in range(count):
+        queue.enqueue(service.EBOOK_JOB, service.ebook_payload("excellence.pdf", 1, 300, require_approval=True))
+    start = time.perf_counter()
+    scheduler.run_until_idle()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        llm_calls = setup(tmp)
+        bench_ebook_pipeline.LATENCY.update(text=0, render=0, llm=0, upload=0, tweet=0, open=0)
+        tweets = []
+        create_tweet = bench_ebook_pipeline.FakeClient.create_tweet
+        bench_ebook_pipeline.FakeClient.create_tweet = (
+            lambda self, text, media_ids, in_reply_to_tweet_id=None:
+            tweets.append(text) or create_tweet(self, text, media_ids, in_reply_to_tweet_id)
+        )
+        queue, runner, scheduler = open_service(tmp, max_workers=WORKERS)
+
+        # 1. Runs pause for review and release their worker and memory
+        enqueue_and_run(queue, scheduler, WORKERS)  # warm up the graph and worker threads
+        threads, rss_start = threading.active_count(), rss_mb()
+        first = PENDING // 4
+        enqueue_and_run(queue, scheduler, first - WORKERS)
+        rss_first = rss_mb()
+        elapsed = enqueue_and_run(queue, scheduler, PENDING - first)
+        rss_all = rss_mb()
+        metrics = scheduler.metrics()
+        assert metrics["jobs"]["waiting"] == PENDING and metrics["workers"]["busy"] == 0, metrics
+        assert not runner.checkpointer.storage, "paused runs are still held in memory"
+        assert threading.active_count() <= threads, "paused runs hold threads"
+        assert tweets == [], "a post was published before it was approved"
+        per_pending_kb = (rss_all - rss_first) * 1024 / (PENDING - first)
+        disk_kb = os.path.getsize(os.path.join(tmp, "checkpoints.sqlite")) / 1024 / PENDING
+        print(f"{PENDING} runs paused for approval on {WORKERS} workers in {elapsed:.1f} s")
+        print(f"  threads: {threading.active_count()} (unchanged), runs held in memory: 0")
+        print(f"  RSS: {rss_start:.0f} MB warm, {rss_first:.0f} MB at {first} pending, {rss_all:.0f} MB at "
+              f"{PENDING} pending ({per_pending_kb:.2f} KB per extra pending approval)")
+        print(f"  checkpoint storage: {disk_kb:.1f} KB per pending approval")
+        assert per_pending_kb < 4, "memory grows with pending approvals"
+
+        # 2. Decisions from another process, over HTTP and in-process
+        pending = queue.waiting(service.EBOOK_JOB, limit=PENDING)
+        assert len(pending) == PENDING and pending[0]["detail"]["content"]
+        edited_id, rejected_id = pending[0]["id"], pending[1]["id"]
+        env = {**os.environ, "JOB_QUEUE_PATH": queue.path}
+        subprocess.run(
+            [sys.executable, "scheduler.py", "approve", str(edited_id), "--content", EDITED],
+            check=True, env=env, cwd=Path(service.__file__).parent,
+        )
+        server = service.serve_http(scheduler, 0)
+        url = f"http://127.0.0.1:{server.server_address[1]}/approvals"
+        for body in ({"approved": "false"}, {"approved": 1}, {"approved": True, "content": 7}, ["approved"]):
+            request = urllib.request.Request(f"{url}/{rejected_id}", data=json.dumps(body).encode())
+            try:
+                urllib.request.urlopen(request)
+            except urllib.error.HTTPError as e:
+                assert e.code == 400, (body, e.code)
+            else:
+                raise AssertionError(f"POST {body} was accepted")
+        request = urllib.request.Request(f"{url}/{rejected_id}", data=json.dumps({"approved": False}).encode())
+        assert urllib.request.urlopen(request).status == 202
+        with urllib.request.urlopen(url) as response:
+            assert len(json.load(response)["pending"]) == min(100, PENDING - 2)
+        server.shutdown()
+        for job in pending[2:]:
+            assert service.review(queue, job["id"], approved=True)
+        assert not service.review(queue, edited_id, approved=True), "a decided job accepted a second decision"
+
+        # 3. A fresh service instance resumes every run from its checkpoint
+        llm_calls.clear()
+        queue, runner, scheduler = open_service(tmp, max_workers=WORKERS)
+        start = time.perf_counter()
+        scheduler.run_until_idle()
+        elapsed = time.perf_counter() - start
+        done = scheduler.metrics()["jobs"]["done"]
+        assert done == PENDING and not queue.waiting(), scheduler.metrics()
+        statuses = [json.loads(queue.get(job["id"])["result"])["status"] for job in pending]
+        assert statuses.count("posted") == PENDING - 1 and statuses[1] == "rejected"
+        assert not llm_calls, "resumed runs generated their post again"
+        posts = [text for text in tweets if not text.startswith("Excel at the art")]  # skip cover replies
+        assert len(posts) == PENDING - 1 and posts.count(EDITED) == 1
+        print(f"{PENDING} decisions (1 edit from another process, 1 rejection over HTTP) resumed by a new "
+              f"service instance in {elapsed:.1f} s; {len(posts)} posts published, none regenerated")
+
+        # 4. Decision values
+        graph = tweetthread.build_ebook_sharing_graph(
+            "excellence.pdf", 1, 300, checkpointer=InMemorySaver(), require_approval=True
+        )
+        for thread_id, decision, status in (("yes", True, "posted"), ("no", False, "rejected")):
+            config = {"configurable": {"thread_id": thread_id}}
+            graph.invoke(tweetthread.new_run_state("excellence.pdf", 1, 300), config)
+            assert graph.invoke(Command(resume=decision), config)["post"]["status"] == status
+        for n, decision in enumerate(("yes", {"approved": "no"}, {"approved": True, "content": 7})):
+            config = {"configurable": {"thread_id": f"invalid-{n}"}}
+            graph.invoke(tweetthread.new_run_state("excellence.pdf", 1, 300), config)
+            try:
+                graph.invoke(Command(resume=decision), config)
+            except TypeError as e:
+                assert "must be" in str(e), e
+            else:
+                raise AssertionError(f"an invalid review decision was accepted: {decision!r}")
+        payload = service.ebook_payload("excellence.pdf", 1, 300, require_approval=True)
+        job_id = queue.enqueue(service.EBOOK_JOB, payload)
+        scheduler.run_until_idle()
+        assert queue.resume(job_id, True)
+        scheduler.run_until_idle()
+        assert queue.get(job_id)["status"] == "waiting", "a resume without a decision for the draft ran the job"
+        print("plain bool decisions accepted, invalid ones raise TypeError; a job resumed without a decision "
+              "for its draft waits again")
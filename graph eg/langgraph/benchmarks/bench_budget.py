@@ -0,0 +1,140 @@
+"""
+Per-invocation budgets on small offline graphs.
+
+The checks are:
+1. A run that finishes on its last allowed step is reported as completed;
+   one that needs another step is stopped before that step runs
+2. A step that runs past the deadline is stopped at the deadline, not when
+   it finishes, and the state of the last finished step is returned; the
+   overrunning step finishes in the background but no later step starts,
+   and `wait_for_step=True` returns only once that step is done
+3. A model message that asks for too many tool calls stops the run before
+   the tools run
+4. The overhead of `run_with_budget` over `graph.invoke`
+
+Run from this folder:
+    python bench_budget.py
+"""
+
+import operator
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Annotated, List, Optional, TypedDict
+
+from langchain_core.messages import AIMessage
+from langgraph.graph import END, START, StateGraph
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.budget import RunBudget, run_with_budget
+
+STEPS = 3
+SLOW_STEP = 2.0  # seconds
+DEADLINE = 0.3  # seconds
+RUNS = 200
+
+
+class State(TypedDict):
+    count: int
+    visited: Annotated[List[str], operator.add]
+    messages: Annotated[list, operator.add]
+
+
+def counter_graph(slow_at: int = 0, ran: Optional[list] = None):
+    """Increments `count` until it reaches STEPS; step `slow_at` sleeps for SLOW_STEP.
+
+    Each finished step is also appended to `ran`, which outlives the run.
+    """
+
+    def step(state: State):
+        if state["count"] + 1 == slow_at:
+            time.sleep(SLOW_STEP)
+        if ran is not None:
+            ran.append(state["count"] + 1)
+        return {"count": state["count"] + 1, "visited": [f"step-{state['count'] + 1}"]}
+
+    builder = StateGraph(State)
+    builder.add_node("step", step)
+    builder.add_edge(START, "step")
+    builder.add_conditional_edges("step", lambda state: END if state["count"] >= STEPS else "step")
+    return builder.compile()
+
+
+def tool_graph():
+    def agent(state: State):
+        calls = [{"name": "search", "args": {"q": str(i)}, "id": f"call_{i}"} for i in range(3)]
+        return {"messages": [AIMessage(content="", tool_calls=calls)]}
+
+    def tools(state: State):
+        return {"visited": ["tools"]}
+
+    builder = StateGraph(State)
+    builder.add_node("agent", agent)
+    builder.add_node("tools", tools)
+    builder.add_edge(START, "agent")
+    builder.add_edge("agent", "tools")
+    builder.add_edge("tools", END)
+    return builder.compile()
+
+
+def inputs() -> State:
+    return {"count": 0, "visited": [], "messages": []}
+
+
+def quiet(report):
+    pass
+
+
+if __name__ == "__main__":
+    # 1. Exactly enough steps versus one step short
+    graph = counter_graph()
+    state, report = run_with_budget(graph, inputs(), RunBudget(max_steps=STEPS), on_event=quiet)
+    assert report["status"] == "completed" and report["steps"] == STEPS and state["count"] == STEPS, report
+    state, report = run_with_budget(graph, inputs(), RunBudget(max_steps=STEPS - 1), on_event=quiet)
+    assert report["status"] == "budget_exceeded" and report["reason"] == "max_steps", report
+    assert state["visited"] == [f"step-{i}" for i in range(1, STEPS)], "the step after the budget ran"
+    print(f"max_steps={STEPS}: completed; max_steps={STEPS - 1}: stopped before step {STEPS}")
+
+    # 2. The deadline stops a slow step
+    start = time.perf_counter()
+    state, report = run_with_budget(counter_graph(slow_at=2), inputs(), RunBudget(deadline=DEADLINE), on_event=quiet)
+    elapsed = time.perf_counter() - start
+    assert report["status"] == "budget_exceeded" and report["reason"] == "deadline", report
+    assert state["count"] == 1 and elapsed < SLOW_STEP / 2, (state, elapsed)
+    print(f"deadline {DEADLINE}s with a {SLOW_STEP}s step: stopped after {elapsed:.2f}s with the state of step 1")
+    ran = []
+    run_with_budget(counter_graph(slow_at=1, ran=ran), inputs(), RunBudget(deadline=DEADLINE), on_event=quiet)
+    time.sleep(SLOW_STEP + 0.5)
+    assert ran == [1], f"steps {ran} ran after the deadline"
+    ran = []
+    start = time.perf_counter()
+    state, report = run_with_budget(
+        counter_graph(slow_at=1, ran=ran), inputs(), RunBudget(deadline=DEADLINE), on_event=quiet, wait_for_step=True
+    )
+    elapsed = time.perf_counter() - start
+    assert report["reason"] == "deadline" and state["count"] == 1 and ran == [1] and elapsed >= SLOW_STEP, report
+    assert not any(thread.name == "budget" for thread in threading.enumerate()), "the worker is still running"
+    print(f"the overrunning step finishes in the background and no later step starts; "
+          f"wait_for_step=True returned after it ended ({elapsed:.2f}s)")
+
+    # 3. Tool calls over budget never reach the tools node
+    state, report = run_with_budget(tool_graph(), inputs(), RunBudget(max_tool_calls=2), on_event=quiet)
+    assert report["reason"] == "max_tool_calls" and "tools" not in state["visited"], report
+    print("max_tool_calls=2 with 3 requested calls: stopped before the tools ran")
+
+    # 4. Overhead per run
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        graph.invoke(inputs())
+    invoke_ms = (time.perf_counter() - start) / RUNS * 1000
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        run_with_budget(graph, inputs(), RunBudget(max_steps=10, max_tokens=1000), on_event=quiet)
+    budget_ms = (time.perf_counter() - start) / RUNS * 1000
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        run_with_budget(graph, inputs(), RunBudget(deadline=60), on_event=quiet)
+    deadline_ms = (time.perf_counter() - start) / RUNS * 1000
+    print(f"{STEPS}-step graph: invoke {invoke_ms:.2f} ms, run_with_budget {budget_ms:.2f} ms, "
+          f"with a deadline {deadline_ms:.2f} ms per run")
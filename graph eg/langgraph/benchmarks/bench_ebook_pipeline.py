@@ -0,0 +1,153 @@
+"""
+End-to-end latency of the ebook posting graph with local fakes.
+
+The PDF reader, the Groq HTTP call and the Twitter clients are replaced with
+fakes that sleep for a fixed latency, so no network or credentials are needed.
+The same node functions are run twice: as a strictly sequential chain (the
+old layout) and as the parallel fan-out/fan-in graph from
+`build_ebook_sharing_graph`. The fake PDF fails if it is used from two
+threads at once (PyMuPDF is not thread-safe), and a reply that fails with a
+connection error must be retried without posting the main tweet again.
+
+Run from this folder:
+    python bench_ebook_pipeline.py
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from langgraph.graph import END, START, StateGraph
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "Misc" / "Twitter Agent"))
+import tweetthread
+from common.node_cache import MemoryNodeCache
+
+RUNS = 5
+
+# Simulated latencies in seconds
+LATENCY = {
+    "open": 0.01,
+    "text": 0.05,
+    "render": 0.2,
+    "llm": 0.8,
+    "upload": 0.3,
+    "tweet": 0.1,
+}
+
+
+class FakePixmap:
+    def save(self, path):
+        time.sleep(LATENCY["render"])
+
+
+class FakePage:
+    def get_text(self):
+        time.sleep(LATENCY["text"])
+        return "Great engineers keep learning long after they leave the classroom."
+
+    def get_pixmap(self, matrix=None):
+        return FakePixmap()
+
+
+open_documents = []
+
+
+class FakeDocument:
+    page_count = 300
+
+    def __getitem__(self, index):
+        return FakePage()
+
+    def close(self):
+        open_documents.remove(self)
+
+
+def fake_open(path):
+    assert not open_documents, "PyMuPDF used from two threads at once"
+    document = FakeDocument()
+    open_documents.append(document)
+    time.sleep(LATENCY["open"])
+    return document
+
+
+def fake_post(url, headers=None, json=None):
+    time.sleep(LATENCY["llm"])
+    body = {"choices": [{"message": {"content": "Keep learning! #softwareengineering"}}]}
+    return SimpleNamespace(json=lambda: body)
+
+
+class FakeApi:
+    def media_upload(self, filename):
+        time.sleep(LATENCY["upload"])
+        return SimpleNamespace(media_id=hash(filename) & 0xFFFF)
+
+
+class FakeClient:
+    def create_tweet(self, text, media_ids, in_reply_to_tweet_id=None):
+        time.sleep(LATENCY["tweet"])
+        return SimpleNamespace(data={"id": "1"})
+
+
+def install_fakes():
+    tweetthread.fitz = SimpleNamespace(open=fake_open, Matrix=lambda x, y: None)
+    tweetthread.requests = SimpleNamespace(post=fake_post)
+    tweetthread.get_twitter_auth = lambda: (FakeClient(), FakeApi())
+
+
+def build_sequential_graph():
+    """The pre-parallel layout: every stage runs in its own superstep."""
+    builder = StateGraph(tweetthread.EbookSharerState)
+    builder.add_sequence([
+        ("select_random_page", tweetthread.select_random_page),
+        ("extract_page_text", tweetthread.extract_page_text),
+        ("render_page_image", tweetthread.render_page_image),
+        ("upload_cover_image", tweetthread.upload_cover_image),
+        ("generate_post", tweetthread.generate_post_with_groq),
+        ("upload_page_image", tweetthread.upload_page_image),
+        ("post_to_x", tweetthread.post_to_x),
+    ])
+    builder.add_edge(START, "select_random_page")
+    builder.add_edge("post_to_x", END)
+    return builder.compile()
+
+
+def measure(graph) -> float:
+    state = tweetthread.new_run_state("fake.pdf", 1, 300)
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        result = graph.invoke(state)
+    elapsed = time.perf_counter() - start
+    assert result["post"]["status"] == "posted", result["error"]
+    return elapsed / RUNS
+
+
+if __name__ == "__main__":
+    # Keep node_cache.sqlite and telemetry.jsonl out of this folder
+    os.environ["OTEL_SDK_DISABLED"] = "true"
+    install_fakes()
+    sequential = measure(build_sequential_graph())
+    parallel = measure(tweetthread.build_ebook_sharing_graph("fake.pdf", 1, 300, MemoryNodeCache()))
+    print(f"sequential: {sequential * 1000:.0f} ms per run")
+    print(f"parallel:   {parallel * 1000:.0f} ms per run ({sequential / parallel:.2f}x faster)")
+
+    # A reply that fails with a connection error is retried on its own
+    tweetthread.RETRY_DELAY_SECONDS = 0
+    tweets, failures = [], []
+
+    def flaky_tweet(self, text, media_ids, in_reply_to_tweet_id=None):
+        if in_reply_to_tweet_id and not failures:
+            failures.append(1)
+            raise ConnectionError("connection reset")
+        tweets.append(text)
+        return SimpleNamespace(data={"id": str(len(tweets))})
+
+    FakeClient.create_tweet = flaky_tweet
+    result = tweetthread.build_ebook_sharing_graph("fake.pdf", 1, 300, MemoryNodeCache()).invoke(
+        tweetthread.new_run_state("fake.pdf", 1, 300)
+    )
+    assert result["post"]["status"] == "posted" and len(tweets) == 2, tweets
+    assert result["tweet_ids"] == {"post": "1", "reply": "2"}
+    print("a failed reply was retried without posting the main tweet again")
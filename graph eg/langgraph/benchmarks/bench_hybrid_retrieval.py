@@ -0,0 +1,93 @@
+"""
+Hybrid BM25 + dense memory retrieval against a local fake vector store.
+
+Uses the hashing embeddings and fake store from bench_write_behind, which
+score like AstraDB ((1 + cosine) / 2). The checks are:
+1. BM25 finds a memory by a rare keyword, and a memory that both searches
+   rank is fused ahead of memories only one of them found (RRF)
+2. Cutoffs: an unrelated query returns nothing, and memories that only
+   share a common word with the query are dropped from the BM25 ranking
+3. The retrieved context stays within the token budget
+4. A new retriever (a restart) finds stored memories by keyword once it
+   has indexed what is already in the store
+5. BM25 query latency over a larger memory set
+
+Run from this folder:
+    python bench_hybrid_retrieval.py
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import bench_write_behind
+from bench_write_behind import FakeVectorStore
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.hybrid_retrieval import HybridRetriever, estimate_tokens, reciprocal_rank_fusion
+
+LARGE_CORPUS = 5000
+QUERIES = 200
+
+MEMORIES = [
+    "my favourite editor is vim",
+    "my sister lives in lisbon",
+    "ticket INC4821 is the login outage from monday",
+    "my kubernetes cluster runs on three nodes",
+    "i prefer tea over coffee in the morning",
+    "the quarterly review is moved to friday",
+    "my dog is called pixel",
+    "remember to renew the tls certificate before june",
+]
+
+
+def stored_texts(store) -> list:
+    return [text for text, _ in store.docs.values()]
+
+
+if __name__ == "__main__":
+    bench_write_behind.WRITE_LATENCY = 0
+    store = FakeVectorStore()
+    retriever = HybridRetriever(store, k=4, fetch_k=20)
+    retriever.add_texts(MEMORIES)
+
+    # 1. Keyword recall and fusion
+    assert retriever.sparse_search("what was INC4821 about")[0] == MEMORIES[2]
+    assert reciprocal_rank_fusion([["a", "b"], ["b", "c"]])[0][0] == "b"
+    query = "favourite editor"
+    dense, sparse = retriever.dense_search(query), retriever.sparse_search(query)
+    both = [text for text in dense if text in sparse]
+    assert both and retriever.retrieve(query)[0] == both[0]
+    print(f"keyword hit via BM25; '{both[0]}' found by both searches is ranked first")
+
+    # 2. Cutoffs
+    assert retriever.retrieve("zebra quantum chromodynamics") == []
+    loose = HybridRetriever(store, score_threshold=0.5, bm25_cutoff=0)
+    loose.index_existing(MEMORIES)
+    assert len(loose.dense_search("zebra quantum chromodynamics")) == len(MEMORIES)
+    assert len(loose.sparse_search("my kubernetes cluster")) > 1
+    assert retriever.sparse_search("my kubernetes cluster") == [MEMORIES[3]]
+    print("cutoffs: unrelated query returns nothing (0.5 would keep every memory); "
+          "common-word BM25 matches dropped")
+
+    # 3. Token budget
+    budget = 20
+    selected = retriever.retrieve("my", token_budget=budget)
+    assert selected and sum(estimate_tokens(text) for text in selected) <= budget
+    print(f"token budget: {len(selected)} memories in {sum(map(estimate_tokens, selected))}/{budget} tokens")
+
+    # 4. Restart: BM25 is rebuilt from what the store already holds
+    restarted = HybridRetriever(store)
+    assert restarted.sparse_search("INC4821") == []
+    assert restarted.index_existing(stored_texts(store)) == len(MEMORIES)
+    assert restarted.retrieve("INC4821")[0] == MEMORIES[2]
+    print("restart: stored memories keyword-searchable after index_existing")
+
+    # 5. BM25 latency
+    large = HybridRetriever(FakeVectorStore())
+    large.index_existing(f"note {i}: {MEMORIES[i % len(MEMORIES)]} item{i}" for i in range(LARGE_CORPUS))
+    start = time.perf_counter()
+    for i in range(QUERIES):
+        assert large.sparse_search(f"kubernetes item{i}")
+    elapsed = time.perf_counter() - start
+    print(f"BM25 over {LARGE_CORPUS} memories: {elapsed / QUERIES * 1000:.2f} ms/query")
@@ -0,0 +1,159 @@
+"""
+Memory profiling mode on a small chat-like graph, with assertions on the JSON report.
+
+Each turn runs three nodes:
+- `render`: allocates a large pixmap-sized buffer and frees it again
+  (high peak, nothing retained)
+- `respond`: appends a reply to an unbounded module-level history, the way
+  the plain-list chat loops did (retains memory on every turn)
+- `summarize`: builds a short string (neither)
+
+The report is written to a temp JSON file, read back and checked: only
+`respond` is flagged as growing, `render` has the largest peak, and the
+state grows from turn to turn. A one-node graph with a checkpointer, run
+on the same thread, must also be profiled as one turn per run (its step
+numbers never go back to 1), and a node that invokes another graph
+instrumented by the same profiler (a parent and its subgraph) must not
+deadlock. Wall-clock overhead of profiling is printed.
+
+Run from this folder:
+    python bench_memory_profile.py
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Annotated, List, TypedDict
+
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph import END, START, StateGraph
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.memory_profile import MemoryProfiler
+
+TURNS = 8
+PIXMAP_BYTES = 8 * 1024 * 1024  # about one A4 page at 2x zoom
+REPLY_BYTES = 256 * 1024
+
+HISTORY: List[bytes] = []
+
+
+class State(TypedDict):
+    messages: Annotated[List[str], lambda a, b: a + b]
+    summary: str
+
+
+def render(state: State):
+    pixmap = bytearray(PIXMAP_BYTES)
+    return {"summary": f"rendered {len(pixmap)} bytes"}
+
+
+def respond(state: State):
+    HISTORY.append(bytes(REPLY_BYTES))
+    return {"messages": [f"reply {len(state['messages'])}: " + "x" * 2000]}
+
+
+def summarize(state: State):
+    return {"summary": f"{len(state['messages'])} messages"}
+
+
+def build_graph():
+    builder = StateGraph(State)
+    builder.add_node("render", render)
+    builder.add_node("respond", respond)
+    builder.add_node("summarize", summarize)
+    builder.add_edge(START, "render")
+    builder.add_edge("render", "respond")
+    builder.add_edge("respond", "summarize")
+    builder.add_edge("summarize", END)
+    return builder.compile()
+
+
+def check_checkpointed_single_node():
+    builder = StateGraph(State)
+    builder.add_node("respond", respond)
+    builder.add_edge(START, "respond")
+    profiler = MemoryProfiler()
+    graph = profiler.instrument(builder.compile(checkpointer=InMemorySaver()))
+    config = {"configurable": {"thread_id": "chat"}}
+    for turn in range(TURNS):
+        graph.invoke({"messages": [f"question {turn}"]}, config)
+    assert graph.get_state(config).values["messages"], "the profiled copy lost its checkpointer"
+    report = profiler.report()
+    assert [s["turn"] for s in report["steps"]] == list(range(TURNS)), report["steps"]
+    assert [c["turn"] for c in profiler.calls["respond"]] == list(range(TURNS))
+    print(f"one-node checkpointed graph: {TURNS} runs on one thread profiled as {TURNS} turns")
+
+
+def check_nested_graphs():
+    profiler = MemoryProfiler()
+    child_builder = StateGraph(State)
+    child_builder.add_node("summarize", summarize)
+    child_builder.add_edge(START, "summarize")
+    child = profiler.instrument(child_builder.compile())
+
+    def call_child(state: State):
+        return {"summary": child.invoke(state)["summary"]}
+
+    parent_builder = StateGraph(State)
+    parent_builder.add_node("call_child", call_child)
+    parent_builder.add_edge(START, "call_child")
+    parent = profiler.instrument(parent_builder.compile())
+    # Run on a daemon thread, so a deadlock fails the check instead of hanging it
+    result = []
+    runner = threading.Thread(
+        target=lambda: result.append(parent.invoke({"messages": ["question"], "summary": ""})), daemon=True
+    )
+    runner.start()
+    runner.join(10)
+    assert result and result[0]["summary"] == "1 messages", "a profiled node calling a profiled graph deadlocked"
+    assert set(profiler.calls) == {"call_child", "summarize"}
+    print("parent and subgraph instrumented by one profiler: both profiled, no deadlock")
+
+
+def run_turns(graph) -> float:
+    state = {"messages": [], "summary": ""}
+    start = time.perf_counter()
+    for turn in range(TURNS):
+        state = graph.invoke({"messages": state["messages"] + [f"question {turn}"], "summary": state["summary"]})
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    graph = build_graph()
+    plain_s = run_turns(graph)
+    HISTORY.clear()
+
+    profiler = MemoryProfiler(leak_threshold=128 * 1024)
+    profiled_s = run_turns(profiler.instrument(graph))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "memory_profile.json")
+        profiler.write_json(path)
+        with open(path) as f:
+            report = json.load(f)
+
+    nodes = report["nodes"]
+    assert report["growing_nodes"] == ["respond"], report["growing_nodes"]
+    assert max(nodes, key=lambda n: nodes[n]["max_peak_bytes"]) == "render"
+    assert nodes["render"]["max_peak_bytes"] >= PIXMAP_BYTES
+    assert all(n["calls"] == TURNS for n in nodes.values())
+    first_steps = [s for s in report["steps"] if s["step"] == 1]
+    assert len(first_steps) == TURNS
+    assert first_steps[-1]["state_bytes"] > first_steps[0]["state_bytes"]
+
+    for name, node in nodes.items():
+        print(
+            f"{name:10s} calls={node['calls']} "
+            f"retained={node['total_retained_bytes'] / 1024:.0f} KiB "
+            f"peak={node['max_peak_bytes'] / 1024:.0f} KiB growing={node['growing']}"
+        )
+        print(f"{'':10s} top site: {node['top_allocations'][0]['site'] if node['top_allocations'] else '-'}")
+    print(f"state size at step 1: {first_steps[0]['state_bytes']} -> {first_steps[-1]['state_bytes']} bytes")
+    print(f"{TURNS} turns: {plain_s * 1000:.0f} ms plain, {profiled_s * 1000:.0f} ms profiled")
+    check_checkpointed_single_node()
+    check_nested_graphs()
@@ -0,0 +1,197 @@
+"""
+Record/replay cassettes for load testing a ReAct agent offline.
+
+A fake streaming model stands in for Groq: it streams a tool call chunk by
+chunk, then an answer, with LIVE_LATENCY per call. The checks are:
+1. Record: a few questions run through `RecordingChatModel`, streamed and
+   invoked, and land in a cassette file
+2. Replay: the same questions give the same answers from the cassette,
+   streaming replays the recorded chunks (tool call chunks included), and
+   every replayed tool call gets its own id, within and across sessions
+3. Load: SESSIONS concurrent sessions (recorded and unseen questions) run
+   through `ReplayChatModel` with synthetic latency and token rate, without
+   calling the live model
+4. Strict replay raises `CassetteMiss` for an unseen conversation
+
+Run from this folder:
+    python bench_model_replay.py
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Iterator, List
+
+from langchain_core.language_models.chat_models import BaseChatModel, generate_from_stream
+from langchain_core.messages import AIMessageChunk, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_core.tools import tool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.prebuilt import create_react_agent
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.model_provider import Cassette, CassetteMiss, RecordingChatModel, ReplayChatModel
+
+LIVE_LATENCY = 0.2  # seconds per call to the stand-in for Groq
+REPLAY_LATENCY = 0.05  # synthetic time to first token
+REPLAY_TOKENS_PER_SEC = 400
+SESSIONS = 2000
+CONCURRENCY = 500
+QUESTIONS = ["What is 2 + 40?", "Add 17 and 25.", "What is 40 plus 2?"]
+MODEL = "llama-3.3-70b-versatile"
+
+
+@tool
+def add(a: int, b: int) -> int:
+    """Add two numbers."""
+    return a + b
+
+
+class FakeGroq(BaseChatModel):
+    """Streams an `add` tool call for a question and an answer for a tool result."""
+
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-groq"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    def _script(self, messages) -> List[AIMessageChunk]:
+        last = messages[-1]
+        if isinstance(last, ToolMessage):
+            words = f"The answer is {last.content}.".split(" ")
+            chunks = [AIMessageChunk(content=w if i == 0 else " " + w) for i, w in enumerate(words)]
+        else:
+            a = len(last.content)
+            parts = ['{"a": ', f'{a}, "b": ', f'{42 - a}' + "}"]
+            chunks = [
+                AIMessageChunk(content="", tool_call_chunks=[{
+                    "index": 0, "id": "call_add" if i == 0 else None, "name": "add" if i == 0 else None, "args": part,
+                }])
+                for i, part in enumerate(parts)
+            ]
+        chunks[-1] = chunks[-1] + AIMessageChunk(
+            content="", usage_metadata={"input_tokens": 30 * len(messages), "output_tokens": 12, "total_tokens": 30 * len(messages) + 12}
+        )
+        return chunks
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        self.calls += 1
+        time.sleep(LIVE_LATENCY)
+        for chunk in self._script(messages):
+            yield ChatGenerationChunk(message=chunk)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return generate_from_stream(self._stream(messages, stop, run_manager, **kwargs))
+
+
+def answer(graph, question: str, thread_id: str) -> str:
+    config = {"configurable": {"thread_id": thread_id}}
+    return graph.invoke({"messages": [HumanMessage(content=question)]}, config)["messages"][-1].content
+
+
+def streamed_chunks(graph, question: str, thread_id: str) -> List[AIMessageChunk]:
+    config = {"configurable": {"thread_id": thread_id}}
+    return [
+        chunk
+        for chunk, _ in graph.stream({"messages": [HumanMessage(content=question)]}, config, stream_mode="messages")
+        if isinstance(chunk, AIMessageChunk)
+    ]
+
+
+def tool_call_ids(graph, thread_id: str) -> List[str]:
+    """Ids of the tool calls in a thread, checking each has its one result."""
+    messages = graph.get_state({"configurable": {"thread_id": thread_id}}).values["messages"]
+    ids = [call["id"] for m in messages for call in getattr(m, "tool_calls", None) or []]
+    assert ids == [m.tool_call_id for m in messages if isinstance(m, ToolMessage)]
+    return ids
+
+
+async def load_test(graph) -> List[float]:
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    latencies = []
+
+    async def session(i: int):
+        question = QUESTIONS[i % len(QUESTIONS)] if i % 4 else f"What is {i} + 1?"
+        async with semaphore:
+            start = time.perf_counter()
+            config = {"configurable": {"thread_id": f"load-{i}"}}
+            await graph.ainvoke({"messages": [HumanMessage(content=question)]}, config)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(session(i) for i in range(SESSIONS)))
+    return latencies
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "llm_cassette.jsonl")
+
+        # 1. Record
+        live = FakeGroq()
+        recording = create_react_agent(
+            RecordingChatModel(inner=live, cassette=Cassette(path), model_name=MODEL), [add], checkpointer=InMemorySaver()
+        )
+        start = time.perf_counter()
+        recorded = {q: answer(recording, q, f"record-{i}") for i, q in enumerate(QUESTIONS)}
+        live_chunks = streamed_chunks(recording, QUESTIONS[0], "record-stream")
+        record_s = time.perf_counter() - start
+        with open(path) as f:
+            lines = sum(1 for _ in f)
+        print(f"recorded {lines} calls in {record_s * 1000:.0f} ms ({live.calls} live calls)")
+        assert lines == live.calls
+
+        # 2. Deterministic replay, invoke and stream
+        cassette = Cassette(path)
+        replay = ReplayChatModel(cassette=cassette, model_name=MODEL)
+        replaying = create_react_agent(replay, [add], checkpointer=InMemorySaver())
+        for i, question in enumerate(QUESTIONS):
+            assert answer(replaying, question, f"replay-{i}") == recorded[question]
+        replayed_chunks = streamed_chunks(replaying, QUESTIONS[0], "replay-stream")
+        assert [c.content for c in replayed_chunks] == [c.content for c in live_chunks]
+        assert any(c.tool_call_chunks for c in replayed_chunks)
+        for thread_id in ("replay-a", "replay-b"):
+            for _ in range(2):
+                answer(replaying, QUESTIONS[0], thread_id)
+        replayed_ids = tool_call_ids(replaying, "replay-a") + tool_call_ids(replaying, "replay-b")
+        assert len(set(replayed_ids)) == len(replayed_ids) == 4 and "call_add" not in replayed_ids, replayed_ids
+        print(f"replay matches the recording: {len(QUESTIONS)} answers, {len(replayed_chunks)} streamed chunks, "
+              f"{len(replayed_ids)} replayed tool calls with distinct ids")
+
+        # 3. Load test with synthetic latency and token rate
+        calls_before = live.calls
+        timed = create_react_agent(
+            ReplayChatModel(
+                cassette=cassette, model_name=MODEL, latency=REPLAY_LATENCY, tokens_per_second=REPLAY_TOKENS_PER_SEC
+            ),
+            [add],
+            checkpointer=InMemorySaver(),
+        )
+        start = time.perf_counter()
+        latencies = asyncio.run(load_test(timed))
+        load_s = time.perf_counter() - start
+        assert live.calls == calls_before and len(latencies) == SESSIONS
+        expected = 2 * (REPLAY_LATENCY + 12 / REPLAY_TOKENS_PER_SEC)
+        latencies.sort()
+        print(
+            f"{SESSIONS} sessions in {load_s:.1f} s ({SESSIONS / load_s:.0f} sessions/s), "
+            f"p50 {latencies[len(latencies) // 2] * 1000:.0f} ms, p99 {latencies[int(len(latencies) * 0.99)] * 1000:.0f} ms "
+            f"(synthetic model time {expected * 1000:.0f} ms per session), 0 live calls"
+        )
+        assert latencies[0] >= expected * 0.95
+
+        # 4. Strict replay
+        strict = create_react_agent(ReplayChatModel(cassette=cassette, model_name=MODEL, strict=True), [add])
+        try:
+            strict.invoke({"messages": [HumanMessage(content="Something never recorded")]})
+        except CassetteMiss:
+            print("strict replay: unseen conversation raises CassetteMiss")
+        else:
+            raise AssertionError("strict replay served an unrecorded call")
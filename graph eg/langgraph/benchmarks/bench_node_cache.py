@@ -0,0 +1,160 @@
+"""
+Per-node result caching on a subgraph node and on ebook page text extraction.
+
+The checks are:
+1. A parent node that invokes a slow subgraph, called with a few repeating
+   inputs, with and without a `CachePolicy` on the parent node; on a hit the
+   whole subgraph invocation is skipped
+2. The ebook posting graph (with the fakes from bench_ebook_pipeline) over a
+   small page range: the PDF is read once per distinct page, and each hit
+   shows up as a `node extract_page_text` span with `langgraph.cache_hit`,
+   and replacing the PDF file makes its pages be read again
+3. Eviction: both backends stay within `max_entries`, the SQLite cache is
+   reused by a new instance (a restart), and runs rejected by `skip_if`
+   are not stored
+
+Run from this folder:
+    python bench_node_cache.py
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import TypedDict
+
+from langgraph.graph import START, StateGraph
+from langgraph.types import CachePolicy
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+import bench_ebook_pipeline
+from bench_ebook_pipeline import install_fakes, tweetthread
+from common.node_cache import MemoryNodeCache, SqliteNodeCache, state_key
+from common.telemetry import FileExporter, Telemetry, instrument_graph
+
+SUBGRAPH_LATENCY = 0.05  # seconds per subgraph run
+CALLS = 200
+DISTINCT_INPUTS = 10
+EBOOK_RUNS = 40
+PAGES = 8
+
+
+class State(TypedDict):
+    sample: str
+
+
+def build_parent(cache=None):
+    def slow_node(state: State):
+        time.sleep(SUBGRAPH_LATENCY)
+        return {"sample": "hi! " + state["sample"]}
+
+    sub_builder = StateGraph(State)
+    sub_builder.add_node("subgraph_node_1", slow_node)
+    sub_builder.add_edge(START, "subgraph_node_1")
+    subgraph = sub_builder.compile()
+
+    def call_subgraph(state: State):
+        return {"sample": subgraph.invoke({"sample": state["sample"]})["sample"]}
+
+    builder = StateGraph(State)
+    policy = CachePolicy(key_func=state_key("sample")) if cache is not None else None
+    builder.add_node("node_1", call_subgraph, cache_policy=policy)
+    builder.add_edge(START, "node_1")
+    return builder.compile(cache=cache)
+
+
+def run_parent(graph) -> float:
+    start = time.perf_counter()
+    for i in range(CALLS):
+        result = graph.invoke({"sample": f"input {i % DISTINCT_INPUTS}"})
+        assert result["sample"] == f"hi! input {i % DISTINCT_INPUTS}"
+    return time.perf_counter() - start
+
+
+def ebook_state(path: str = "fake.pdf", pages: int = PAGES):
+    return {
+        "ebook_path": path,
+        "page_range": {"start": 1, "end": pages},
+        "current_page_info": {"page_number": 0, "image_path": "", "page_text": ""},
+        "media_ids": {},
+        "post": {"content": "", "status": "draft"},
+        "error": "",
+    }
+
+
+if __name__ == "__main__":
+    # 1. Subgraph behind a cached node
+    plain_s = run_parent(build_parent())
+    cache = MemoryNodeCache(max_entries=64)
+    cached_s = run_parent(build_parent(cache))
+    assert cache.stats["misses"] == DISTINCT_INPUTS and cache.stats["hits"] == CALLS - DISTINCT_INPUTS
+    print(f"{CALLS} subgraph calls, {DISTINCT_INPUTS} distinct inputs")
+    print(f"  uncached: {plain_s * 1000:.0f} ms")
+    print(f"  cached:   {cached_s * 1000:.0f} ms {cache.stats}")
+
+    # 2. Ebook page text extraction
+    install_fakes()
+    page_reads = []
+    get_text = bench_ebook_pipeline.FakePage.get_text
+    bench_ebook_pipeline.FakePage.get_text = lambda self: page_reads.append(1) or get_text(self)
+    bench_ebook_pipeline.LATENCY.update(render=0, llm=0, upload=0, tweet=0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        trace_path = os.path.join(tmp, "telemetry.jsonl")
+        telemetry = Telemetry(exporter=FileExporter(trace_path))
+        tweetthread.instrument_graph = lambda graph: instrument_graph(graph, telemetry)
+        page_cache = MemoryNodeCache(max_entries=64)
+        graph = tweetthread.build_ebook_sharing_graph("fake.pdf", 1, PAGES, page_cache)
+        for _ in range(EBOOK_RUNS):
+            assert graph.invoke(ebook_state())["post"]["status"] == "posted"
+        telemetry.flush()
+        with open(trace_path) as f:
+            spans = [
+                span
+                for line in f if "resourceSpans" in (payload := json.loads(line))
+                for span in payload["resourceSpans"][0]["scopeSpans"][0]["spans"]
+            ]
+        hit_spans = [
+            s for s in spans
+            if s["name"] == "node extract_page_text"
+            and {"key": "langgraph.cache_hit", "value": {"boolValue": True}} in s["attributes"]
+        ]
+        stats = page_cache.by_node["extract_page_text"]
+        assert len(page_reads) == stats["misses"] <= PAGES
+        assert len(hit_spans) == stats["hits"] == EBOOK_RUNS - stats["misses"]
+        print(f"{EBOOK_RUNS} ebook runs over {PAGES} pages: {len(page_reads)} page text reads, "
+              f"{stats['hits']} cache hits traced as spans")
+
+        book = os.path.join(tmp, "book.pdf")
+        Path(book).write_bytes(b"first edition")
+        graph = tweetthread.build_ebook_sharing_graph(book, 1, 1, MemoryNodeCache())
+        page_reads.clear()
+        for _ in range(2):
+            graph.invoke(ebook_state(book, 1))
+        Path(book).write_bytes(b"second edition, revised")
+        graph.invoke(ebook_state(book, 1))
+        assert len(page_reads) == 2, "a replaced PDF was served from the cache"
+        telemetry.flush()
+        print("replaced PDF: its page text is read again instead of served from the cache")
+
+        # 3. Eviction, restart and skip_if
+        small = MemoryNodeCache(max_entries=5)
+        disk_path = os.path.join(tmp, "node_cache.sqlite")
+        disk = SqliteNodeCache(disk_path, max_entries=5)
+        for backend in (small, disk):
+            graph = build_parent(backend)
+            for i in range(DISTINCT_INPUTS):
+                graph.invoke({"sample": f"input {i}"})
+            assert len(backend) == 5 and backend.stats["evictions"] == DISTINCT_INPUTS - 5
+        restarted = SqliteNodeCache(disk_path, max_entries=5)
+        graph = build_parent(restarted)
+        graph.invoke({"sample": f"input {DISTINCT_INPUTS - 1}"})
+        assert restarted.stats["hits"] == 1, "disk cache did not survive a restart"
+        guarded = MemoryNodeCache(skip_if=lambda writes: any("skip" in value for _, value in writes))
+        graph = build_parent(guarded)
+        graph.invoke({"sample": "skip me"})
+        graph.invoke({"sample": "skip me"})
+        assert guarded.stats["hits"] == 0 and len(guarded) == 0
+        print("eviction: both backends capped at 5 entries; disk cache reused after restart; skip_if respected")
@@ -0,0 +1,132 @@
+"""
+Client-side request serialization time per ReAct step at a 500-message history.
+
+Each step appends an AI tool call and its ToolMessage to the history and
+builds the request body the way ChatGroq does before calling the API:
+convert every message to a wire dict, then JSON-encode messages and tool
+schemas. No request is sent. `ChatGroq` and `PrefixCachingChatGroq` are
+compared. For the caching model it also checks that:
+- the tools block is byte-identical whichever order the tools are bound in
+  (plain ChatGroq keeps the bind order, which breaks the provider's prefix)
+- each step converts only the two new messages, and the cache is an LRU:
+  messages still in use survive when newer ones push it past its bound
+- one model instance shared by concurrent sessions keeps a consistent
+  cache while they evict each other's messages
+
+Run from this folder:
+    python bench_prompt_cache.py
+"""
+
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.tools import tool
+from langchain_groq import ChatGroq
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.prompt_cache import PrefixCachingChatGroq
+
+HISTORY = 500
+STEPS = 50
+
+
+@tool
+def get_weather(location: str) -> str:
+    """Call to get the current weather."""
+    return "It's 60 degrees and foggy."
+
+
+@tool
+def add(a: int, b: int) -> int:
+    """Add two numbers."""
+    return a + b
+
+
+TOOLS = [get_weather, add]
+SYSTEM_MESSAGE = SystemMessage(content="You are a helpful assistant. Use the available tools when they help answer the question.")
+
+
+def tool_round(i: int) -> list:
+    call_id = f"call_{i}"
+    return [
+        AIMessage(content="", id=f"ai-{i}", tool_calls=[{"name": "add", "args": {"a": i, "b": 1}, "id": call_id}]),
+        ToolMessage(content=str(i + 1), id=f"tool-{i}", tool_call_id=call_id),
+    ]
+
+
+def build_history(size: int) -> list:
+    history = []
+    i = 0
+    while len(history) < size:
+        history.append(HumanMessage(content=f"What is {i} plus one? " * 5, id=f"human-{i}"))
+        history.extend(tool_round(i))
+        i += 1
+    return history[:size]
+
+
+def tools_bytes(llm, tools) -> bytes:
+    return json.dumps(llm.bind_tools(tools).kwargs["tools"]).encode()
+
+
+def run(llm) -> float:
+    """Returns ms per step."""
+    tools = llm.bind_tools(TOOLS).kwargs["tools"]
+    history = build_history(HISTORY)
+    elapsed = 0.0
+    for step in range(STEPS):
+        messages = [SYSTEM_MESSAGE] + history
+        start = time.perf_counter()
+        message_dicts, _ = llm._create_message_dicts(messages, None)
+        json.dumps({"messages": message_dicts, "tools": tools}).encode()
+        elapsed += time.perf_counter() - start
+        history.extend(tool_round(HISTORY + step))
+    return elapsed / STEPS * 1000
+
+
+def check_lru():
+    llm = PrefixCachingChatGroq(groq_api_key="offline", model="llama-3.3-70b-versatile", max_cached_messages=2)
+    old, recent, new = (HumanMessage(content=text, id=text) for text in ("old", "recent", "new"))
+    llm._create_message_dicts([old, recent], None)
+    llm._create_message_dicts([old], None)  # old is used again, so recent is now the least recent
+    llm._create_message_dicts([new], None)
+    before = llm.cache_info()["hits"]
+    llm._create_message_dicts([old], None)
+    assert llm.cache_info()["hits"] == before + 1, "a message in use was evicted before an idle one"
+
+
+def check_shared_instance(sessions: int = 8, steps: int = 200):
+    llm = PrefixCachingChatGroq(groq_api_key="offline", model="llama-3.3-70b-versatile", max_cached_messages=16)
+
+    def session(n: int) -> int:
+        history = [SYSTEM_MESSAGE]
+        for i in range(steps):
+            history.append(HumanMessage(content=f"session {n} step {i}", id=f"s{n}-{i}"))
+            assert len(llm._create_message_dicts(history[-8:], None)[0]) == min(len(history), 8)
+        return sum(min(i + 2, 8) for i in range(steps))
+
+    with ThreadPoolExecutor(sessions) as pool:
+        sent = sum(pool.map(session, range(sessions)))
+    info = llm.cache_info()
+    assert info["hits"] + info["misses"] == sent and info["size"] <= 16, info
+
+
+if __name__ == "__main__":
+    plain = ChatGroq(groq_api_key="offline", model="llama-3.3-70b-versatile")
+    plain_ms = run(plain)
+    cached_llm = PrefixCachingChatGroq(groq_api_key="offline", model="llama-3.3-70b-versatile")
+    cached_ms = run(cached_llm)
+    reordered = TOOLS[::-1]
+    assert tools_bytes(plain, TOOLS) != tools_bytes(plain, reordered)
+    assert tools_bytes(cached_llm, TOOLS) == tools_bytes(cached_llm, reordered), "tool order changed the prefix"
+    info = cached_llm.cache_info()
+    assert info["misses"] == HISTORY + 1 + 2 * (STEPS - 1), f"messages were converted again: {info}"
+    check_lru()
+    check_shared_instance()
+    print(f"{HISTORY}-message history, {STEPS} steps")
+    print(f"ChatGroq:              {plain_ms:.2f} ms/step")
+    print(f"PrefixCachingChatGroq: {cached_ms:.2f} ms/step ({plain_ms / cached_ms:.1f}x)")
+    print(f"message cache: {cached_llm.cache_info()}")
@@ -0,0 +1,90 @@
+"""
+`compile_graph` on a 50-node synthetic routed graph.
+
+Every node increments a counter and a router decides whether to continue to
+the next node or end. Each node also carries a redundant plain edge to its
+successor, the same layout mistake the ebook graph used to have. The checks:
+1. `compile_graph` collapses every redundant edge and rejects a path_map
+   that names a missing node
+2. Steps/sec compared with `builder.compile()`: `compile_graph` only
+   validates, so throughput is expected to be the same (about 1.00x)
+
+Run from this folder:
+    python bench_routing.py
+"""
+
+import sys
+import time
+import warnings
+from pathlib import Path
+from typing import Literal, TypedDict
+
+from langgraph.graph import END, START, StateGraph
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.graph_compile import GraphFanOutWarning, compile_graph
+
+NUM_NODES = 50
+RUNS = 200
+
+
+class CounterState(TypedDict):
+    steps: int
+
+
+def step(state: CounterState) -> CounterState:
+    return {"steps": state["steps"] + 1}
+
+
+def route(state: CounterState) -> Literal["next", "end"]:
+    return "next" if state["steps"] < NUM_NODES else "end"
+
+
+def build_synthetic_graph() -> StateGraph:
+    builder = StateGraph(CounterState)
+    names = [f"node_{i}" for i in range(NUM_NODES)]
+    for name in names:
+        builder.add_node(name, step)
+    builder.add_edge(START, names[0])
+    for current, following in zip(names, names[1:] + [END]):
+        builder.add_edge(current, following)
+        builder.add_conditional_edges(current, route, {"next": following, "end": END})
+    return builder
+
+
+def measure(graph) -> float:
+    config = {"recursion_limit": NUM_NODES + 10}
+    graph.invoke({"steps": 0}, config)  # warm up
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        result = graph.invoke({"steps": 0}, config)
+    elapsed = time.perf_counter() - start
+    assert result["steps"] == NUM_NODES
+    return RUNS * NUM_NODES / elapsed
+
+
+if __name__ == "__main__":
+    baseline = build_synthetic_graph().compile()
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always", GraphFanOutWarning)
+        optimized = compile_graph(build_synthetic_graph())
+    dropped = [w for w in caught if "Dropped edge" in str(w.message)]
+    assert len(dropped) == NUM_NODES, len(dropped)
+
+    broken = StateGraph(CounterState)
+    broken.add_node("node_0", step)
+    broken.add_edge(START, "node_0")
+    broken.add_conditional_edges("node_0", route, {"next": "node_typo", "end": END})
+    try:
+        compile_graph(broken)
+    except ValueError as e:
+        assert "node_typo" in str(e)
+    else:
+        raise AssertionError("a path_map naming a missing node compiled")
+    print(f"collapsed {len(dropped)} redundant edges; a path_map typo fails at compile time")
+
+    before = measure(baseline)
+    after = measure(optimized)
+    print(f"{NUM_NODES}-node graph, {RUNS} runs")
+    print(f"builder.compile(): {before:,.0f} steps/sec")
+    print(f"compile_graph():   {after:,.0f} steps/sec ({after / before:.2f}x)")
@@ -0,0 +1,207 @@
+"""
+Durable job queue and scheduler service for the ebook posting graph.
+
+Uses the fakes from bench_ebook_pipeline, so no network or credentials are
+needed. The checks are:
+1. Start-up cost: a cron-style run pays imports and graph setup in a fresh
+   process every time; the scheduler service pays it once
+2. Concurrency: jobs for several ebooks on a worker pool never run more
+   than one posting run per ebook at a time, and queue latency is reported
+3. Crash and resume: a worker process dies while posting; after its lease
+   runs out a new process picks the job up and resumes the run from its
+   checkpoint without generating the post again
+4. Retries and schedules: a failed run is retried, and a schedule that
+   missed several periods while the service was down enqueues one job,
+   also when read by a new queue instance
+5. Fencing: a worker whose lease ran out cannot finish the job another
+   worker took over, expired jobs out of attempts fail, and a job retried
+   after its run already posted completes without tweeting again
+
+Run from this folder:
+    python bench_scheduler.py
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+import bench_ebook_pipeline
+from bench_ebook_pipeline import install_fakes, tweetthread
+import scheduler as service
+from common.job_queue import Job, JobQueue, Scheduler
+from common.sqlite_saver import SqliteCheckpointSaver
+
+EBOOKS = 3
+JOBS_PER_EBOOK = 4
+WORKERS = 4
+COLD_STARTS = 3
+
+
+def setup(tmp: str) -> list:
+    """Installs the fakes and returns a list that records every LLM call."""
+    install_fakes()
+    bench_ebook_pipeline.LATENCY.update(render=0.02, llm=0.1, upload=0.02, tweet=0.01)
+    os.environ["NODE_CACHE_PATH"] = os.path.join(tmp, "node_cache.sqlite")
+    tweetthread.instrument_graph = lambda graph: graph
+    llm_calls = []
+    post = tweetthread.requests.post
+    tweetthread.requests.post = lambda *args, **kwargs: llm_calls.append(1) or post(*args, **kwargs)
+    return llm_calls
+
+
+def open_service(tmp: str, lease: float = 60.0, **kwargs):
+    queue = JobQueue(os.path.join(tmp, "jobs.sqlite"), lease=lease)
+    runner = service.EbookRunner(SqliteCheckpointSaver(os.path.join(tmp, "checkpoints.sqlite")))
+    return queue, runner, Scheduler(queue, {service.EBOOK_JOB: runner}, metrics_interval=None, **kwargs)
+
+
+def crash_while_posting(tmp: str):
+    """Child process: runs queued jobs and dies inside the tweet call."""
+    setup(tmp)
+    bench_ebook_pipeline.FakeClient.create_tweet = lambda *args, **kwargs: os._exit(3)
+    _, _, scheduler = open_service(tmp, lease=0.5)
+    scheduler.run_until_idle()
+
+
+if __name__ == "__main__" and sys.argv[1:2] == ["--crash"]:
+    crash_while_posting(sys.argv[2])
+
+elif __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        # 1. Cron-style cold starts versus one long-running service
+        script = (
+            "import sys; sys.path.insert(0, '.'); "
+            "from bench_ebook_pipeline import tweetthread; "
+            "tweetthread.build_ebook_sharing_graph('fake.pdf', 1, 300, checkpointer=None)"
+        )
+        env = {
+            **os.environ,
+            "NODE_CACHE_PATH": os.path.join(tmp, "cold.sqlite"),
+            "TELEMETRY_FILE": os.path.join(tmp, "telemetry.jsonl"),
+        }
+        start = time.perf_counter()
+        for _ in range(COLD_STARTS):
+            subprocess.run([sys.executable, "-c", script], check=True, env=env, cwd=Path(__file__).parent)
+        cold_s = (time.perf_counter() - start) / COLD_STARTS
+
+        llm_calls = setup(tmp)
+        queue, runner, scheduler = open_service(tmp, max_workers=WORKERS)
+        start = time.perf_counter()
+        runner.graph_for("ebook-0.pdf", 1, 300)
+        warm_s = time.perf_counter() - start
+        print(f"start-up per run: {cold_s * 1000:.0f} ms in a fresh process (cron), "
+              f"{warm_s * 1000:.0f} ms once per ebook in the service")
+
+        # 2. Concurrency limits and queue latency
+        active, peak, lock = Counter(), Counter(), threading.Lock()
+
+        def tracked(job):
+            key = job.concurrency_key
+            with lock:
+                active[key] += 1
+                active["all"] += 1
+                peak[key] = max(peak[key], active[key])
+                peak["all"] = max(peak["all"], active["all"])
+            try:
+                return runner(job)
+            finally:
+                with lock:
+                    active[key] -= 1
+                    active["all"] -= 1
+
+        scheduler.handlers[service.EBOOK_JOB] = tracked
+        for i in range(JOBS_PER_EBOOK):
+            for book in range(EBOOKS):
+                queue.enqueue(service.EBOOK_JOB, service.ebook_payload(f"ebook-{book}.pdf", 1, 300),
+                              concurrency_key=f"ebook-{book}")
+        start = time.perf_counter()
+        scheduler.run_until_idle()
+        elapsed = time.perf_counter() - start
+        metrics = scheduler.metrics()
+        jobs = EBOOKS * JOBS_PER_EBOOK
+        assert metrics["jobs"]["done"] == jobs, metrics
+        assert max(peak[f"ebook-{book}"] for book in range(EBOOKS)) == 1 and peak["all"] == EBOOKS, peak
+        assert metrics["queue_latency_s"]["samples"] == jobs
+        assert not runner.checkpointer.storage, "finished runs were not released from memory"
+        print(f"{jobs} jobs over {EBOOKS} ebooks on {WORKERS} workers: {elapsed:.2f} s, "
+              f"peak {peak['all']} running, 1 per ebook")
+        print(f"queue latency: {metrics['queue_latency_s']}")
+        scheduler.stop()
+
+        # 3. A worker process dies while posting; a new one resumes the run
+        job_id = queue.enqueue(service.EBOOK_JOB, service.ebook_payload("ebook-crash.pdf", 1, 300))
+        child = subprocess.run([sys.executable, __file__, "--crash", tmp], cwd=Path(__file__).parent)
+        assert child.returncode == 3 and queue.get(job_id)["status"] == "running"
+        time.sleep(0.6)
+        llm_calls.clear()
+        queue, runner, scheduler = open_service(tmp)
+        scheduler.run_until_idle()
+        job = queue.get(job_id)
+        assert job["status"] == "done" and job["attempts"] == 2, job
+        assert '"resumed": true' in job["result"] and not llm_calls, "the run did not resume from its checkpoint"
+        print(f"crash while posting: job {job_id} resumed by a new process after its lease ran out, "
+              f"post not generated again")
+
+        # 4. Retries and collapsed missed schedule periods
+        tweets = bench_ebook_pipeline.FakeClient.create_tweet
+        failures = []
+
+        def flaky_tweet(self, *args, **kwargs):
+            if not failures:
+                failures.append(1)
+                raise RuntimeError("rate limited")
+            return tweets(self, *args, **kwargs)
+
+        bench_ebook_pipeline.FakeClient.create_tweet = flaky_tweet
+        queue, runner, scheduler = open_service(tmp, retry_delay=0)
+        job_id = queue.enqueue(service.EBOOK_JOB, service.ebook_payload("ebook-retry.pdf", 1, 300))
+        scheduler.run_until_idle()
+        job = queue.get(job_id)
+        assert job["status"] == "done" and job["attempts"] == 2, job
+
+        day = 24 * 3600
+        queue.add_schedule("daily", service.EBOOK_JOB, service.ebook_payload("ebook-0.pdf", 1, 300), day,
+                           first_run_at=time.time() - 3 * day - 60, concurrency_key="ebook-0")
+        restarted = JobQueue(os.path.join(tmp, "jobs.sqlite"))
+        assert len(restarted.enqueue_due()) == 1 and not restarted.enqueue_due()
+        print("a failed run was retried; a schedule that missed 3 days enqueued one job")
+
+        # 5. Fencing, exhausted attempts and retries of finished runs
+        fenced = JobQueue(os.path.join(tmp, "fenced.sqlite"), lease=0)
+        job_id = fenced.enqueue("noop", {})
+        stale = fenced.claim("worker-a")
+        time.sleep(0.01)
+        fenced.recover_expired()
+        current = fenced.claim("worker-b")
+        assert current.id == stale.id == job_id
+        assert not fenced.complete(stale, "stale") and fenced.fail(stale, "stale") is None
+        assert not fenced.suspend(stale) and fenced.get(job_id)["status"] == "running"
+        assert fenced.complete(current, "current") and fenced.get(job_id)["result"] == '"current"'
+        job_id = fenced.enqueue("noop", {}, max_attempts=1)
+        fenced.claim("worker-a")
+        time.sleep(0.01)
+        fenced.recover_expired()
+        assert fenced.get(job_id)["status"] == "failed"
+
+        posted = []
+        bench_ebook_pipeline.FakeClient.create_tweet = lambda self, *args, **kwargs: (
+            posted.append(1) or tweets(self, *args, **kwargs)
+        )
+        payload = service.ebook_payload("ebook-done.pdf", 1, 300)
+        job = Job(0, service.EBOOK_JOB, payload, "finished-run", None, 1, time.time(), time.time())
+        assert runner(job)["status"] == "posted" and len(posted) == 2
+        # The worker died before recording the job: the retry finds the run finished
+        retried = runner(job)
+        assert retried["status"] == "posted" and retried["resumed"] and retried["steps"] == 0
+        graph = runner.graph_for(payload["ebook_path"], 1, 300)
+        config = {"configurable": {"thread_id": "finished-run"}}
+        graph.invoke(tweetthread.new_run_state(payload["ebook_path"], 1, 300), config)
+        assert len(posted) == 2, "a thread that already posted tweeted again"
+        print("a stale worker cannot finish a job taken over by another; expired jobs out of attempts fail; "
+              "a retried job whose run already posted completes without tweeting again")
@@ -0,0 +1,134 @@
+"""
+Search latency and backend calls with the persistent search cache and multi-query search.
+
+A local stub stands in for Tavily: every call sleeps for SEARCH_LATENCY and
+returns three results, some of them shared between related queries. The
+checks are:
+1. A stream of repeated news questions (with casing and punctuation
+   variations) with and without the cache
+2. Four related queries run one by one versus through `multi_search`, whose
+   results must not repeat a URL and whose search threads are gone once it
+   returns
+3. The cache file is reused by a new cache instance (a restart), entries
+   past their TTL are fetched again and purged when a cache is opened
+4. Backend errors (Tavily returns them as strings) are not cached, and
+   queries that differ in meaningful punctuation ("C++" and "C") are not
+   merged
+
+Run from this folder:
+    python bench_search_cache.py
+"""
+
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.search_cache import CachedSearch, SearchResultCache, make_search_tools, normalize_query
+
+SEARCH_LATENCY = 0.05  # seconds per backend call
+QUESTIONS = [
+    "What is the latest news about AI regulations in the EU?",
+    "Latest news on the EU AI Act",
+    "AI Act enforcement timeline",
+    "GPAI code of practice news",
+]
+
+
+class StubSearchBackend:
+    """Offline search backend with fixed latency and overlapping results."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, query: str) -> list:
+        self.calls += 1
+        time.sleep(SEARCH_LATENCY)
+        topic = normalize_query(query)
+        return [
+            {"url": "https://www.example.eu/ai-act/", "content": "Overview of the EU AI Act."},
+            {"url": f"https://news.example.com/{abs(hash(topic)) % 1000}", "content": f"Story about {topic}."},
+            {"url": f"https://blog.example.org/{len(topic)}#comments", "content": f"Analysis of {topic}."},
+        ]
+
+
+def question_stream(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    for _ in range(count):
+        question = rng.choice(QUESTIONS)
+        yield rng.choice([question, question.lower(), question.upper(), question.rstrip("?") + " ?"])
+
+
+def run_stream(search, count: int = 200) -> float:
+    start = time.perf_counter()
+    for question in question_stream(count):
+        search(question)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = os.path.join(tmp, "search_cache.sqlite")
+
+        # 1. Repeated questions
+        plain_backend = StubSearchBackend()
+        plain_s = run_stream(plain_backend)
+        cached_backend = StubSearchBackend()
+        cache = SearchResultCache(cache_path, ttl=60)
+        cached_s = run_stream(CachedSearch(cached_backend, cache))
+        print(f"200 questions, uncached: {plain_s * 1000:.0f} ms, {plain_backend.calls} backend calls")
+        print(f"200 questions, cached:   {cached_s * 1000:.0f} ms, {cached_backend.calls} backend calls {cache.stats}")
+        assert cached_backend.calls == len(QUESTIONS)
+
+        # 2. Sequential versus multi-query search on a cold cache
+        backend = StubSearchBackend()
+        _, multi_search = make_search_tools(
+            CachedSearch(backend, SearchResultCache(os.path.join(tmp, "cold.sqlite")))
+        )
+        start = time.perf_counter()
+        sequential = [r for q in QUESTIONS for r in StubSearchBackend()(q)]
+        sequential_s = time.perf_counter() - start
+        start = time.perf_counter()
+        merged = multi_search.invoke({"queries": QUESTIONS + [QUESTIONS[0].lower()]})
+        multi_s = time.perf_counter() - start
+        urls = [r["url"] for r in merged]
+        assert len(urls) == len(set(urls)) and "https://www.example.eu/ai-act/" in urls
+        assert backend.calls == len(QUESTIONS)
+        assert not [t for t in threading.enumerate() if t.name.startswith("search")], "search threads left running"
+        print(f"{len(QUESTIONS)} queries one by one: {sequential_s * 1000:.0f} ms, {len(sequential)} results")
+        print(f"multi_search:         {multi_s * 1000:.0f} ms, {len(merged)} results after URL de-duplication")
+
+        # 3. Restart and TTL
+        restarted_backend = StubSearchBackend()
+        run_stream(CachedSearch(restarted_backend, SearchResultCache(cache_path, ttl=60)), count=20)
+        assert restarted_backend.calls == 0, "cache did not survive a restart"
+        expired_backend = StubSearchBackend()
+        short_cache = SearchResultCache(cache_path, ttl=0.01)
+        time.sleep(0.02)
+        CachedSearch(expired_backend, short_cache)(QUESTIONS[0])
+        assert expired_backend.calls == 1, "expired entry was served"
+        time.sleep(0.02)
+        reopened = SearchResultCache(cache_path, ttl=0.01)
+        assert reopened._conn.execute("SELECT COUNT(*) FROM search_results").fetchone()[0] == 0
+        print("restart: served from disk; expired entries: refetched and purged on open")
+
+        # 4. Errors and punctuation
+        failures = []
+
+        def failing_backend(query: str):
+            failures.append(query)
+            return "ConnectionError('search is down')"
+
+        search = CachedSearch(failing_backend, SearchResultCache(os.path.join(tmp, "errors.sqlite")))
+        assert search("EU AI Act") == search("EU AI Act") == "ConnectionError('search is down')"
+        assert len(failures) == 2, "an error was served from the cache"
+        _, multi_search = make_search_tools(search)
+        assert multi_search.invoke({"queries": ["EU AI Act"]})[0]["error"]
+        assert normalize_query("What is C++?") != normalize_query("What is C?")
+        assert normalize_query("C# jobs") != normalize_query("C jobs")
+        assert normalize_query("Latest news on the EU AI Act!") == normalize_query("latest news  on the EU AI act")
+        print("errors: returned uncached; C++, C# and C: separate cache keys")
@@ -0,0 +1,153 @@
+"""
+Resident memory of many chat sessions, with and without the session store.
+
+A long-lived worker serves SESSIONS users. Each turn picks a user (a few
+users are much more active than the rest) and appends a question and an
+answer to that user's history. A plain dict of lists keeps every history in
+memory. `SessionStore` keeps at most MAX_RESIDENT sessions or
+MAX_RESIDENT_BYTES in memory, spills the rest to a temp folder and loads them
+back on demand. Every history is checked to be complete at the end.
+
+It also checks that:
+- `SessionStoreSaver` keeps the cost of a checkpoint write flat as a thread
+  grows, and its tracked size matches a full measurement
+- spill files left by an earlier process are read back, expire by age, and
+  torn temp files are removed
+- `trim_history` caps a chat loop's history on a human turn
+
+Run from this folder:
+    python bench_session_store.py
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, TypedDict
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langgraph.graph import START, StateGraph
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.session_store import SessionStore, SessionStoreSaver, pickled_size, trim_history
+
+SESSIONS = 2000
+TURNS = 10000
+MAX_RESIDENT = 200
+MAX_RESIDENT_BYTES = 4 * 1024 * 1024
+THREAD_TURNS = 1500
+
+
+def turns(seed: int = 0):
+    rng = random.Random(seed)
+    for turn in range(TURNS):
+        # Skewed activity: a few hot users, a long cold tail
+        user = int(SESSIONS * rng.random() ** 3)
+        yield turn, f"user-{user}"
+
+
+def exchange(turn: int) -> list:
+    return [
+        HumanMessage(content=f"Question {turn}: " + "context " * 20),
+        AIMessage(content=f"Answer {turn}: " + "details " * 40),
+    ]
+
+
+def run_plain():
+    histories = {}
+    start = time.perf_counter()
+    for turn, session_id in turns():
+        histories.setdefault(session_id, []).extend(exchange(turn))
+    elapsed = time.perf_counter() - start
+    resident_bytes = sum(pickled_size(history) for history in histories.values())
+    return histories, elapsed, resident_bytes
+
+
+def run_store(spill_dir: str):
+    store = SessionStore(spill_dir, max_sessions=MAX_RESIDENT, max_resident_bytes=MAX_RESIDENT_BYTES)
+    start = time.perf_counter()
+    for turn, session_id in turns():
+        store.append(session_id, *exchange(turn))
+    elapsed = time.perf_counter() - start
+    return store, elapsed
+
+
+class ChatState(TypedDict):
+    messages: List[BaseMessage]
+
+
+def check_saver(spill_dir: str):
+    """One long thread: checkpoint writes must not get slower as the thread grows."""
+
+    def respond(state: ChatState):
+        return {"messages": state["messages"][-3:] + [AIMessage(content="ok " * 20)]}
+
+    saver = SessionStoreSaver(spill_dir, max_threads=10)
+    builder = StateGraph(ChatState)
+    builder.add_node("respond", respond)
+    builder.add_edge(START, "respond")
+    graph = builder.compile(checkpointer=saver)
+    config = {"configurable": {"thread_id": "long"}}
+    timings = []
+    for turn in range(THREAD_TURNS):
+        start = time.perf_counter()
+        graph.invoke({"messages": [HumanMessage(content=f"turn {turn}")]}, config)
+        timings.append(time.perf_counter() - start)
+    tracked = saver.sessions.metrics()["resident_bytes"]
+    assert tracked == saver._thread_size(saver._bundle("long")), "tracked size drifted"
+    early, late = sum(timings[:100]) / 100, sum(timings[-100:]) / 100
+    assert late < early * 2, f"writes slow down as the thread grows: {early * 1e3:.2f} -> {late * 1e3:.2f} ms"
+    print(f"SessionStoreSaver, {THREAD_TURNS} checkpoints on one thread: "
+          f"{early * 1e3:.2f} ms/turn early, {late * 1e3:.2f} ms/turn late, {tracked / 1024:.0f} KiB tracked")
+
+
+def check_earlier_process(spill_dir: str):
+    old = SessionStore(spill_dir, max_sessions=1)
+    old.put("kept", ["a"])
+    old.put("stale", ["b"])
+    old.put("current", ["c"])  # spills kept and stale
+    stale_path = old._path("stale")
+    hour_ago = time.time() - 3600
+    os.utime(stale_path, (hour_ago, hour_ago))
+    Path(spill_dir, "torn.tmp").write_bytes(b"partial")
+    # A new process with a 10 minute TTL
+    new = SessionStore(spill_dir, max_sessions=1, idle_ttl=600)
+    assert new.metrics()["spilled"] == 2 and not Path(spill_dir, "torn.tmp").exists()
+    new.sweep()
+    assert not stale_path.exists() and new.get("stale") is None
+    assert new.get("kept") == ["a"] and new.metrics()["spilled"] == 0
+    print("spill files of an earlier process: read back, expired by age, torn temp files removed")
+
+
+def check_trim():
+    history = [SystemMessage(content="system")]
+    for turn in range(30):
+        history += [HumanMessage(content=f"q{turn}"), AIMessage(content=f"a{turn}")]
+    trimmed = trim_history(history, 9)
+    assert isinstance(trimmed[0], SystemMessage) and isinstance(trimmed[1], HumanMessage)
+    assert len(trimmed) <= 10 and trimmed[-1].content == "a29"
+
+
+if __name__ == "__main__":
+    histories, plain_s, plain_bytes = run_plain()
+    with tempfile.TemporaryDirectory() as spill_dir:
+        store, store_s = run_store(spill_dir)
+        metrics = store.metrics()
+        for session_id, history in histories.items():
+            assert len(store.get(session_id)) == len(history), session_id
+
+    print(f"{len(histories)} sessions, {TURNS} turns")
+    print(f"dict of lists: {plain_bytes / 1024:.0f} KiB resident, {plain_s / TURNS * 1e6:.0f} us/turn")
+    print(
+        f"SessionStore:  {metrics['resident_bytes'] / 1024:.0f} KiB resident, "
+        f"{store_s / TURNS * 1e6:.0f} us/turn"
+    )
+    print(f"session metrics: {metrics}")
+
+    with tempfile.TemporaryDirectory() as spill_dir:
+        check_saver(spill_dir)
+    with tempfile.TemporaryDirectory() as spill_dir:
+        check_earlier_process(spill_dir)
+    check_trim()
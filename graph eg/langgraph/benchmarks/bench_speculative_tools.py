@@ -0,0 +1,143 @@
+"""
+Wall-clock per ReAct iteration with and without speculative tool execution.
+
+A fake streaming chat model emits two tool calls chunk by chunk, followed
+by some trailing text, with a fixed delay per chunk. Each tool sleeps for a
+fixed time. `create_react_agent` waits for the whole message before running
+the tools. `create_speculative_react_agent` starts each call as soon as its
+arguments are complete.
+
+It also checks that concurrent runs, whose model messages use the same tool
+call ids, each get their own results and leave nothing pending, that tools
+see the run's config, and that an empty model stream fails with a
+ValueError.
+
+Run from this folder:
+    python bench_speculative_tools.py
+"""
+
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterator, List
+
+from langchain_core.language_models.chat_models import BaseChatModel, generate_from_stream
+from langchain_core.messages import AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import tool
+from langgraph.prebuilt import create_react_agent
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.speculative_tools import create_speculative_react_agent
+
+CHUNK_DELAY = 0.02  # seconds between streamed chunks
+TOOL_LATENCY = 0.3  # seconds per tool call
+RUNS = 5
+CONCURRENT = 8
+
+
+@tool
+def get_weather(location: str) -> str:
+    """Call to get the current weather."""
+    time.sleep(TOOL_LATENCY)
+    return "It's 60 degrees and foggy."
+
+
+@tool
+def add(a: int, b: int, config: RunnableConfig) -> int:
+    """Add two numbers."""
+    time.sleep(TOOL_LATENCY)
+    # A per-run offset shows whether a result reached the run that asked for it
+    return a + b + config.get("configurable", {}).get("offset", 0)
+
+
+def tool_call_chunks(index: int, call_id: str, name: str, arg_parts: List[str]) -> List[AIMessageChunk]:
+    chunks = []
+    for i, part in enumerate(arg_parts):
+        chunks.append(AIMessageChunk(content="", tool_call_chunks=[{
+            "index": index,
+            "id": call_id if i == 0 else None,
+            "name": name if i == 0 else None,
+            "args": part,
+            "type": "tool_call_chunk",
+        }]))
+    return chunks
+
+
+class FakeStreamingToolModel(BaseChatModel):
+    """Streams two tool calls on the first turn and an answer with the sum after tool results."""
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-streaming-tools"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _script(self, messages: List[BaseMessage]) -> List[AIMessageChunk]:
+        if isinstance(messages[-1], HumanMessage):
+            return (
+                tool_call_chunks(0, "call_weather", "get_weather", ['{"loc', 'ation": ', '"sf"}'])
+                + tool_call_chunks(1, "call_add", "add", ['{"a": ', '59, "b"', ': 69}'])
+                + [AIMessageChunk(content="") for _ in range(10)]  # trailing tokens
+            )
+        answer = f"It is foggy and the sum is {messages[-1].content}."
+        return [AIMessageChunk(content=word + " ") for word in answer.split()]
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        for chunk in self._script(messages):
+            time.sleep(CHUNK_DELAY)
+            yield ChatGenerationChunk(message=chunk)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return generate_from_stream(self._stream(messages, stop, run_manager, **kwargs))
+
+
+def measure(graph) -> float:
+    inputs = {"messages": [HumanMessage(content="Weather in SF, and what is 59 + 69?")]}
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        result = graph.invoke(inputs)
+    elapsed = time.perf_counter() - start
+    assert "128" in result["messages"][-1].content
+    return elapsed / RUNS
+
+
+class EmptyStreamModel(FakeStreamingToolModel):
+    def _script(self, messages: List[BaseMessage]) -> List[AIMessageChunk]:
+        return []
+
+
+def check_concurrent_runs(graph):
+    def run(offset: int) -> str:
+        inputs = {"messages": [HumanMessage(content="Weather in SF, and what is 59 + 69?")]}
+        return graph.invoke(inputs, {"configurable": {"offset": offset}})["messages"][-1].content
+
+    runner = graph.tool_runner
+    reused = runner.stats["reused"]
+    with ThreadPoolExecutor(CONCURRENT) as pool:
+        answers = list(pool.map(run, range(CONCURRENT)))
+    for offset, answer in enumerate(answers):
+        assert f"sum is {128 + offset}." in answer, (offset, answer)
+    assert runner.stats["reused"] - reused == 2 * CONCURRENT, runner.stats
+    assert not runner.pending, "speculative results leaked"
+    print(f"{CONCURRENT} concurrent runs with the same tool call ids: each got its own results, none left pending")
+
+
+if __name__ == "__main__":
+    model = FakeStreamingToolModel()
+    tools = [get_weather, add]
+    baseline = measure(create_react_agent(model, tools))
+    speculative_graph = create_speculative_react_agent(model, tools)
+    speculative = measure(speculative_graph)
+    print(f"create_react_agent:             {baseline * 1000:.0f} ms per run")
+    print(f"create_speculative_react_agent: {speculative * 1000:.0f} ms per run ({baseline / speculative:.2f}x)")
+    print(f"speculation stats: {speculative_graph.tool_runner.stats}")
+    check_concurrent_runs(speculative_graph)
+    try:
+        create_speculative_react_agent(EmptyStreamModel(), tools).invoke({"messages": [HumanMessage(content="hi")]})
+        raise AssertionError("an empty stream was accepted")
+    except ValueError:
+        pass
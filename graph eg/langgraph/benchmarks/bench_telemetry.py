@@ -0,0 +1,176 @@
+"""
+Overhead of `instrument_graph` on a ReAct agent with a fake LLM.
+
+Every turn, the fake chat model asks for one tool call and then answers.
+Each model call sleeps LLM_LATENCY to stand in for the network, and the agent
+checkpoints to an InMemorySaver. Identical graphs run with and without
+instrumentation, turn by turn and taking turns at going first, so both see
+the same machine load. The instrumented graph exports to a temp file, which
+is then checked for node, LLM, tool and checkpoint spans and for token and
+tool-call counters. The median overhead over the batches must stay below 2%.
+
+Two more checks: runs on several threads at once must each get their own
+checkpoint spans (same trace, parented to that run's graph span), and
+`OTEL_SDK_DISABLED=true` must leave the graph untouched with no export
+thread.
+
+Run from this folder:
+    python bench_telemetry.py
+"""
+
+import gc
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import tool
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.prebuilt import create_react_agent
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.telemetry import FileExporter, Telemetry, instrument_graph, telemetry_disabled
+
+LLM_LATENCY = 0.01  # seconds per model call
+TURNS = 50
+BATCHES = 21
+CONCURRENT = 8
+
+
+@tool
+def add(a: int, b: int) -> int:
+    """Add two numbers."""
+    return a + b
+
+
+class FakeToolModel(BaseChatModel):
+    """Calls `add` once per question, then answers with the tool result."""
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-tool-model"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(LLM_LATENCY)
+        last = messages[-1]
+        usage = {"input_tokens": 20 * len(messages), "output_tokens": 10, "total_tokens": 20 * len(messages) + 10}
+        if isinstance(last, ToolMessage):
+            message = AIMessage(content=f"The answer is {last.content}.", usage_metadata=usage)
+        else:
+            call = {"name": "add", "args": {"a": len(messages), "b": 1}, "id": f"call_{len(messages)}"}
+            message = AIMessage(content="", tool_calls=[call], usage_metadata=usage)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def build_graph():
+    return create_react_agent(FakeToolModel(), [add], checkpointer=InMemorySaver())
+
+
+def run_batch(plain, traced, batch: int) -> tuple:
+    """Seconds spent in each graph over TURNS turns."""
+    gc.collect()
+    times = [0.0, 0.0]
+    for turn in range(TURNS):
+        config = {"configurable": {"thread_id": f"batch-{batch}-{turn % 5}"}}
+        inputs = {"messages": [HumanMessage(content=f"What is {turn} + 1?")]}
+        for i in ((0, 1) if turn % 2 else (1, 0)):
+            start = time.perf_counter()
+            (plain, traced)[i].invoke(inputs, config)
+            times[i] += time.perf_counter() - start
+    return times[0], times[1]
+
+
+def read_spans(path: str) -> list:
+    with open(path) as f:
+        payloads = [json.loads(line) for line in f]
+    return [
+        span
+        for p in payloads if "resourceSpans" in p
+        for span in p["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    ]
+
+
+def check_concurrent_runs(tmp: str):
+    path = os.path.join(tmp, "concurrent.jsonl")
+    telemetry = Telemetry(exporter=FileExporter(path))
+    graph = instrument_graph(build_graph(), telemetry)
+
+    def run(worker: int):
+        for turn in range(5):
+            config = {"configurable": {"thread_id": f"worker-{worker}"}}
+            graph.invoke({"messages": [HumanMessage(content=f"What is {turn} + 1?")]}, config)
+
+    with ThreadPoolExecutor(CONCURRENT) as pool:
+        list(pool.map(run, range(CONCURRENT)))
+    telemetry.flush()
+    spans = read_spans(path)
+    roots = {span["traceId"]: span["spanId"] for span in spans if span["name"].startswith("graph")}
+    threads_per_trace = defaultdict(set)
+    for span in spans:
+        if span["name"].startswith("checkpoint"):
+            assert span["parentSpanId"] == roots[span["traceId"]], "checkpoint span under another run's graph span"
+            threads_per_trace[span["traceId"]].update(
+                a["value"]["stringValue"] for a in span["attributes"] if a["key"] == "langgraph.thread_id"
+            )
+    assert len(threads_per_trace) == CONCURRENT * 5, len(threads_per_trace)
+    assert all(len(threads) == 1 for threads in threads_per_trace.values()), "runs share a trace"
+    print(f"{CONCURRENT} threads running at once: every checkpoint span is in its own run's trace")
+
+
+def check_opt_out():
+    os.environ["OTEL_SDK_DISABLED"] = "true"
+    exporters = threading.active_count()
+    graph = build_graph()
+    config = graph.config
+    instrument_graph(graph, Telemetry(enabled=not telemetry_disabled()))
+    assert graph.config == config and threading.active_count() == exporters
+    graph.telemetry.observe_cache("noop", lambda: {"hits": 0, "misses": 0})
+    print("OTEL_SDK_DISABLED=true: graph left as is, no export thread")
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "telemetry.jsonl")
+        telemetry = Telemetry(exporter=FileExporter(path))
+        plain = build_graph()
+        traced = instrument_graph(build_graph(), telemetry)
+        run_batch(plain, traced, -1)  # warm up
+
+        plain_times, traced_times = zip(*(run_batch(plain, traced, batch) for batch in range(BATCHES)))
+        telemetry.flush()
+
+        spans = read_spans(path)
+        with open(path) as f:
+            payloads = [json.loads(line) for line in f]
+        check_concurrent_runs(tmp)
+
+    names = {span["name"].split()[0] for span in spans}
+    assert {"graph", "node", "llm", "tool", "checkpoint.put", "checkpoint.put_writes"} <= names, names
+    metrics = [p for p in payloads if "resourceMetrics" in p][-1]
+    totals = {
+        m["name"]: sum(int(d["asInt"]) for d in m["sum"]["dataPoints"])
+        for m in metrics["resourceMetrics"][0]["scopeMetrics"][0]["metrics"]
+    }
+    runs = (BATCHES + 1) * TURNS
+    assert totals["llm.calls"] == 2 * runs and totals["tool.calls"] == runs, totals
+
+    plain_ms = statistics.median(plain_times) / TURNS * 1000
+    traced_ms = statistics.median(traced_times) / TURNS * 1000
+    overhead = statistics.median((t - p) / p * 100 for p, t in zip(plain_times, traced_times))
+    print(f"{len(spans)} spans exported, counters: {totals}")
+    print(f"plain:        {plain_ms:.2f} ms per turn")
+    print(f"instrumented: {traced_ms:.2f} ms per turn ({overhead:+.2f}% overhead, target < 2%)")
+    assert overhead < 2, f"instrumentation adds {overhead:.2f}% per turn"
+    check_opt_out()
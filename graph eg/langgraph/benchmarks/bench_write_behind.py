@@ -0,0 +1,140 @@
+"""
+Write-behind memory inserts against a local fake vector store.
+
+The fake store sleeps on every `add_texts` call to stand in for a remote
+AstraDB write. The script checks three things:
+1. Per-turn insert latency, writing directly vs. through the write-behind buffer
+2. Buffered memories are returned by search before they are flushed, also
+   when a flush lands while the remote search is running
+3. Memories logged while the store is down survive a restart via the WAL,
+   also after a torn final line and a second restart with the store down
+
+Run from this folder:
+    python bench_write_behind.py
+"""
+
+import hashlib
+import math
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from langchain_core.documents import Document
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.write_behind import WriteBehindVectorStore
+
+TURNS = 50
+WRITE_LATENCY = 0.05  # seconds per remote add_texts call
+
+
+class HashingEmbeddings:
+    """Deterministic bag-of-words embeddings; no model download needed."""
+
+    def embed_query(self, text):
+        vector = [0.0] * 64
+        for word in text.lower().split():
+            vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % 64] += 1.0
+        return vector
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+class FakeVectorStore:
+    """In-memory store with a fixed write latency, standing in for AstraDB."""
+
+    def __init__(self, available=True):
+        self.embeddings = HashingEmbeddings()
+        self.available = available
+        self.docs = {}
+        self.write_calls = 0
+
+    def add_texts(self, texts, metadatas=None, ids=None):
+        if not self.available:
+            raise ConnectionError("vector store unreachable")
+        time.sleep(WRITE_LATENCY)
+        self.write_calls += 1
+        ids = ids or [str(len(self.docs) + i) for i in range(len(texts))]
+        for doc_id, text in zip(ids, texts):
+            self.docs[doc_id] = (text, self.embeddings.embed_query(text))
+        return ids
+
+    def similarity_search_with_score(self, query, k=4):
+        query_vector = self.embeddings.embed_query(query)
+        scored = []
+        for doc_id, (text, vector) in self.docs.items():
+            dot = sum(a * b for a, b in zip(query_vector, vector))
+            norm = math.sqrt(sum(a * a for a in query_vector)) * math.sqrt(sum(b * b for b in vector))
+            cosine = dot / norm if norm else 0.0
+            scored.append((Document(page_content=text, id=doc_id), (cosine + 1) / 2))
+        return sorted(scored, key=lambda item: item[1], reverse=True)[:k]
+
+
+def time_inserts(store) -> float:
+    start = time.perf_counter()
+    for turn in range(TURNS):
+        store.add_texts([f"user message number {turn}"])
+    return (time.perf_counter() - start) / TURNS
+
+
+if __name__ == "__main__":
+    wal_dir = tempfile.mkdtemp()
+
+    # 1. Insert latency
+    direct = FakeVectorStore()
+    direct_latency = time_inserts(direct)
+
+    remote = FakeVectorStore()
+    buffered = WriteBehindVectorStore(remote, os.path.join(wal_dir, "bench.jsonl"), max_batch=16, flush_interval=0.5)
+    buffered_latency = time_inserts(buffered)
+    buffered.close()
+    assert len(remote.docs) == TURNS
+    print(f"direct insert:       {direct_latency * 1000:.2f} ms/turn, {direct.write_calls} remote writes")
+    print(f"write-behind insert: {buffered_latency * 1000:.2f} ms/turn, {remote.write_calls} remote writes")
+
+    # 2. Read-your-writes through the overlay
+    remote = FakeVectorStore()
+    buffered = WriteBehindVectorStore(remote, os.path.join(wal_dir, "overlay.jsonl"), max_batch=100, flush_interval=60)
+    buffered.add_texts(["my favourite editor is vim"])
+    hits = buffered.similarity_search("favourite editor", k=1)
+    assert not remote.docs and hits[0].page_content == "my favourite editor is vim"
+    buffered.close()
+
+    class FlushDuringSearch(FakeVectorStore):
+        def similarity_search_with_score(self, query, k=4):
+            racing.flush()
+            return super().similarity_search_with_score(query, k)
+
+    racing = WriteBehindVectorStore(FlushDuringSearch(), os.path.join(wal_dir, "race.jsonl"), flush_interval=60)
+    racing.add_texts(["my favourite editor is vim"])
+    assert [doc.page_content for doc in racing.similarity_search("favourite editor", k=1)] == ["my favourite editor is vim"]
+    racing.close()
+    print("overlay: buffered memory visible before flush and while one runs")
+
+    # 3. Durability across a restart while the store is down
+    wal_path = os.path.join(wal_dir, "crash.jsonl")
+    offline = WriteBehindVectorStore(FakeVectorStore(available=False), wal_path, flush_interval=60)
+    offline.add_texts(["remember the milk", "meeting moved to friday"])
+    offline.close()
+    recovered_store = FakeVectorStore()
+    recovered = WriteBehindVectorStore(recovered_store, wal_path, flush_interval=60)
+    recovered.close()
+    assert sorted(text for text, _ in recovered_store.docs.values()) == ["meeting moved to friday", "remember the milk"]
+    assert os.path.getsize(wal_path) == 0
+
+    torn_path = os.path.join(wal_dir, "torn.jsonl")
+    offline = WriteBehindVectorStore(FakeVectorStore(available=False), torn_path, flush_interval=60)
+    offline.add_texts(["remember the milk"])
+    offline.close()
+    with open(torn_path, "a", encoding="utf-8") as wal:
+        wal.write('{"id": "x", "text": "half writ')
+    still_down = WriteBehindVectorStore(FakeVectorStore(available=False), torn_path, flush_interval=60)
+    still_down.add_texts(["meeting moved to friday"])
+    still_down.close()
+    recovered_store = FakeVectorStore()
+    WriteBehindVectorStore(recovered_store, torn_path, flush_interval=60).close()
+    assert sorted(text for text, _ in recovered_store.docs.values()) == ["meeting moved to friday", "remember the milk"]
+    print("durability: WAL replayed after restart, torn tail cut off before new writes")
@@ -0,0 +1,6 @@
+"""
+Shared helpers used by the LangGraph examples.
+
+Scripts live in per-level folders and are run from there, so each one adds
+this directory's parent to ``sys.path`` before importing from ``common``.
+"""
@@ -0,0 +1,173 @@
+"""
+Per-invocation budgets for graph runs.
+
+`run_with_budget` streams a compiled graph superstep by superstep and stops
+it as soon as any limit in a `RunBudget` is reached:
+- max_steps: supersteps executed
+- deadline: wall-clock seconds since the run started
+- max_tokens: LLM tokens, from `usage_metadata` on AI messages
+- max_tool_calls: tool calls requested by AI messages (checked before the
+  tools run)
+
+Limits are checked when the next superstep is about to start, so it never
+starts once one is reached, while a run that reaches a limit on its last
+step is still reported as completed. With a deadline the graph runs on a
+worker thread and the caller stops waiting at the deadline, also in the
+middle of a slow step; that step finishes in the background (a running
+node can't be killed) and the worker is cancelled, so no further step
+starts. Callers that must not touch the run's thread while that step is
+still writing to it (e.g. to retry it) pass `wait_for_step=True`: the run
+is still reported as stopped by the deadline, but the call returns only
+once the worker has exited. The run then ends gracefully: the partial
+state of the last finished superstep is returned with a report, and the
+report is emitted as a metrics event. Nodes that wait (like retry
+back-off) can call `remaining_time(config)` to avoid sleeping past the
+deadline.
+
+A run that pauses at an `interrupt()` (e.g. waiting for human approval) is
+reported as "interrupted"; resume it on the same thread with
+`Command(resume=...)`.
+"""
+
+import contextvars
+import json
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from langchain_core.messages import AIMessage
+
+
+@dataclass
+class RunBudget:
+    max_steps: Optional[int] = None
+    deadline: Optional[float] = None  # seconds
+    max_tokens: Optional[int] = None
+    max_tool_calls: Optional[int] = None
+
+
+def print_metrics(report: Dict[str, Any]) -> None:
+    """Default metrics sink: one JSON line per run."""
+    print(f"[METRICS] {json.dumps(report)}")
+
+
+def remaining_time(config: Optional[dict]) -> Optional[float]:
+    """Seconds left before the run's deadline, or None when there is no deadline."""
+    deadline_at = ((config or {}).get("configurable") or {}).get("budget_deadline_at")
+    if deadline_at is None:
+        return None
+    return deadline_at - time.monotonic()
+
+
+def _new_messages(update: Any) -> list:
+    if not isinstance(update, dict):
+        return []
+    messages = update.get("messages") or []
+    return messages if isinstance(messages, list) else [messages]
+
+
+def run_with_budget(
+    graph,
+    inputs: Any,
+    budget: RunBudget,
+    config: Optional[dict] = None,
+    on_event: Callable[[Dict[str, Any]], None] = print_metrics,
+    wait_for_step: bool = False,
+    **stream_kwargs: Any,
+) -> Tuple[Any, Dict[str, Any]]:
+    """Invokes `graph` under `budget` and returns (final or partial state, report).
+
+    Extra keyword arguments go to `graph.stream`, e.g. `durability="sync"`.
+    """
+    start = time.monotonic()
+    config = dict(config or {})
+    configurable = dict(config.get("configurable") or {})
+    if budget.deadline is not None:
+        configurable["budget_deadline_at"] = start + budget.deadline
+    config["configurable"] = configurable
+    if budget.max_steps is not None:
+        # Keep LangGraph's recursion limit from firing before the step budget
+        # (the step after the last allowed one must still be scheduled)
+        config["recursion_limit"] = max(config.get("recursion_limit", 25), budget.max_steps + 2)
+
+    # Shared with the worker thread when there is a deadline
+    run = {"state": inputs, "steps": 0, "tokens": 0, "tool_calls": 0, "reason": None, "interrupted": False}
+    # Set when the caller gave up at the deadline; the worker stops at the next step
+    cancelled = threading.Event()
+
+    def limit_reached() -> Optional[str]:
+        if budget.max_steps is not None and run["steps"] >= budget.max_steps:
+            return "max_steps"
+        if budget.deadline is not None and time.monotonic() - start >= budget.deadline:
+            return "deadline"
+        if budget.max_tokens is not None and run["tokens"] >= budget.max_tokens:
+            return "max_tokens"
+        if budget.max_tool_calls is not None and run["tool_calls"] > budget.max_tool_calls:
+            return "max_tool_calls"
+        return None
+
+    def consume() -> None:
+        in_step = False
+        for mode, chunk in graph.stream(inputs, config, stream_mode=["tasks", "updates", "values"], **stream_kwargs):
+            if mode == "tasks":
+                # A task start means another superstep is about to run; it
+                # hasn't yet, since LangGraph waits for this chunk to be read
+                if "input" in chunk and not in_step:
+                    run["reason"] = "deadline" if cancelled.is_set() else limit_reached()
+                    if run["reason"]:
+                        break
+                continue
+            if mode == "updates":
+                # Parallel nodes emit one "updates" chunk each within a superstep
+                in_step = True
+                run["interrupted"] = run["interrupted"] or "__interrupt__" in chunk
+                for update in chunk.values():
+                    for message in _new_messages(update):
+                        if isinstance(message, AIMessage):
+                            run["tokens"] += (message.usage_metadata or {}).get("total_tokens", 0)
+                            run["tool_calls"] += len(message.tool_calls)
+                continue
+
+            # "values" closes a superstep (the first one is just the input)
+            if in_step:
+                in_step = False
+                run["steps"] += 1
+            run["state"] = chunk
+
+    if budget.deadline is None:
+        consume()
+    else:
+        errors = []
+
+        def worker() -> None:
+            try:
+                consume()
+            except BaseException as e:
+                errors.append(e)
+
+        # The worker gets a copy of this context, so context-local state
+        # (like the current trace span) carries over into the graph
+        thread = threading.Thread(target=contextvars.copy_context().run, args=(worker,), name="budget", daemon=True)
+        thread.start()
+        thread.join(max(start + budget.deadline - time.monotonic(), 0))
+        if thread.is_alive():
+            # A step is still running past the deadline; it stops at the next step
+            cancelled.set()
+            run["reason"] = "deadline"
+            if wait_for_step:
+                thread.join()
+        if errors:
+            raise errors[0]
+
+    reason = run["reason"]
+    report = {
+        "status": "budget_exceeded" if reason else "interrupted" if run["interrupted"] else "completed",
+        "reason": reason,
+        "steps": run["steps"],
+        "elapsed_s": round(time.monotonic() - start, 3),
+        "tokens": run["tokens"],
+        "tool_calls": run["tool_calls"],
+    }
+    on_event(report)
+    return run["state"], report
@@ -0,0 +1,117 @@
+"""
+Validated compilation for StateGraph builders.
+
+`compile_graph` is a drop-in replacement for `builder.compile()` that:
+1. Collapses plain edges that duplicate a conditional edge from the same node
+2. Warns about plain edges next to a router that go elsewhere (both fire on
+   every step; with `strict=True` they are rejected instead)
+3. Checks that every router's path_map only names existing nodes, so a typo
+   fails at compile time instead of mid-run
+4. Warns about fan-out where one branch already leads to another, which
+   costs an extra superstep and re-runs the shared target
+
+It only validates the layout: routing itself is left to LangGraph, which
+already resolves each path_map once at compile time.
+"""
+
+import warnings
+from typing import Any, Dict
+
+from langgraph.graph import END, StateGraph
+
+
+class GraphFanOutWarning(UserWarning):
+    """Emitted when the graph layout causes redundant supersteps."""
+
+
+def _collapse_routed_edges(builder: StateGraph, strict: bool) -> None:
+    """Drops plain edges already covered by a router and rejects conflicting ones."""
+    for source, branches in builder.branches.items():
+        routed_targets = set()
+        for branch in branches.values():
+            if branch.ends is not None:
+                routed_targets.update(branch.ends.values())
+
+        for edge in [e for e in builder.edges if e[0] == source]:
+            target = edge[1]
+            if target in routed_targets:
+                builder.edges.discard(edge)
+                warnings.warn(
+                    f"Dropped edge '{source}' -> '{target}': the router on "
+                    f"'{source}' already decides when to go there.",
+                    GraphFanOutWarning,
+                    stacklevel=3,
+                )
+            elif strict:
+                raise ValueError(
+                    f"Node '{source}' has both a router and a plain edge to "
+                    f"'{target}'; add '{target}' to the router's path_map instead."
+                )
+            else:
+                warnings.warn(
+                    f"Node '{source}' has both a router and a plain edge to "
+                    f"'{target}'; both will run on every step.",
+                    GraphFanOutWarning,
+                    stacklevel=3,
+                )
+
+
+def _validate_routes(builder: StateGraph) -> None:
+    """Rejects path_map entries that point at nodes the graph doesn't have."""
+    for source, branches in builder.branches.items():
+        for name, branch in branches.items():
+            if branch.ends is None:
+                warnings.warn(
+                    f"Router '{name}' on '{source}' has no path_map or Literal "
+                    "return type, so its targets cannot be checked.",
+                    GraphFanOutWarning,
+                    stacklevel=3,
+                )
+                continue
+            for label, target in branch.ends.items():
+                if target != END and target not in builder.nodes:
+                    raise ValueError(
+                        f"Router '{name}' on '{source}' maps '{label}' to unknown node '{target}'"
+                    )
+
+
+def _warn_redundant_fan_out(builder: StateGraph) -> None:
+    """Warns when a node fans out to targets where one already reaches the other."""
+    successors: Dict[str, set] = {}
+    for start, end in builder.edges:
+        successors.setdefault(start, set()).add(end)
+
+    def reachable(node: str) -> set:
+        seen, stack = set(), [node]
+        while stack:
+            for nxt in successors.get(stack.pop(), ()):
+                if nxt not in seen:
+                    seen.add(nxt)
+                    stack.append(nxt)
+        return seen
+
+    for source, targets in successors.items():
+        if len(targets) < 2:
+            continue
+        for target in targets:
+            shortcut = (targets - {target}) & reachable(target)
+            for other in sorted(shortcut):
+                warnings.warn(
+                    f"'{source}' fans out to both '{target}' and '{other}', but "
+                    f"'{target}' already leads to '{other}'; '{other}' will run "
+                    "in an extra superstep.",
+                    GraphFanOutWarning,
+                    stacklevel=3,
+                )
+
+
+def compile_graph(builder: StateGraph, *, strict: bool = False, **compile_kwargs: Any):
+    """
+    Validates, collapses and compiles a StateGraph builder.
+
+    Extra keyword arguments are passed through to `builder.compile()`.
+    """
+    _collapse_routed_edges(builder, strict)
+    _validate_routes(builder)
+    _warn_redundant_fan_out(builder)
+    return builder.compile(**compile_kwargs)
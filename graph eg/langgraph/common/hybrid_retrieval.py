@@ -0,0 +1,161 @@
+"""
+Hybrid BM25 + dense retrieval for conversation memories.
+
+`HybridRetriever` wraps any LangChain vector store:
+1. `add_texts` writes to the vector store and updates an in-process BM25
+   inverted index incrementally; `index_existing` indexes memories that
+   are already in the store (call it once at startup)
+2. `retrieve` runs a dense similarity search and a BM25 search, drops weak
+   hits from both and fuses the two rankings with reciprocal rank fusion
+   (RRF)
+3. The fused results are trimmed to a token budget so the context block
+   handed to the LLM stays short
+
+Cutoffs:
+- `score_threshold` is on the store's relevance scale. AstraDB (and
+  `WriteBehindVectorStore`) report cosine similarity mapped to [0, 1] as
+  (1 + cos) / 2, so 0.5 means cos >= 0 and keeps nearly everything; the
+  default 0.7 keeps hits with cos >= 0.4
+- BM25 scores are not comparable across queries, so `bm25_cutoff` is
+  relative: hits scoring below that fraction of the best hit are dropped
+  (e.g. memories that only share a common word with the query)
+"""
+
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercases and splits text into word tokens."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough LLM token estimate (about four characters per token)."""
+    return len(text) // 4 + 1
+
+
+class BM25Index:
+    """Incremental Okapi BM25 over an inverted index of term -> {doc_id: term frequency}."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self.doc_lengths: Dict[int, int] = {}
+        self.texts: Dict[int, str] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, text: str) -> int:
+        """Indexes one document and returns its local id."""
+        doc_id = len(self.doc_lengths)
+        terms = tokenize(text)
+        for term, freq in Counter(terms).items():
+            self.postings[term][doc_id] = freq
+        self.doc_lengths[doc_id] = len(terms)
+        self.texts[doc_id] = text
+        self.total_length += len(terms)
+        return doc_id
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """Returns up to k (text, score) pairs with a positive BM25 score."""
+        if not self.doc_lengths:
+            return []
+        num_docs = len(self.doc_lengths)
+        avg_length = self.total_length / num_docs or 1.0
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (num_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, freq in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] += idf * freq * (self.k1 + 1) / (freq + norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.texts[doc_id], score) for doc_id, score in ranked]
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[str]], rrf_k: int = 60) -> List[Tuple[str, float]]:
+    """Fuses several ranked lists of texts into one list of (text, fused score)."""
+    fused: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, text in enumerate(ranking):
+            fused[text] += 1.0 / (rrf_k + rank + 1)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+class HybridRetriever:
+    """Keeps a BM25 index next to a vector store and retrieves from both."""
+
+    def __init__(
+        self,
+        vector_store,
+        k: int = 4,
+        fetch_k: int = 20,
+        score_threshold: float = 0.7,
+        bm25_cutoff: float = 0.3,
+        token_budget: int = 1000,
+        rrf_k: int = 60,
+    ):
+        self.vector_store = vector_store
+        self.k = k
+        self.fetch_k = fetch_k
+        self.score_threshold = score_threshold
+        self.bm25_cutoff = bm25_cutoff
+        self.token_budget = token_budget
+        self.rrf_k = rrf_k
+        self.bm25 = BM25Index()
+
+    def add_texts(self, texts: List[str], **kwargs) -> List[str]:
+        """Writes texts to the vector store and indexes them for BM25."""
+        ids = self.vector_store.add_texts(texts, **kwargs)
+        for text in texts:
+            self.bm25.add(text)
+        return ids
+
+    def index_existing(self, texts: Iterable[str]) -> int:
+        """Indexes memories already in the store for BM25; returns how many."""
+        count = 0
+        for text in texts:
+            self.bm25.add(text)
+            count += 1
+        return count
+
+    def dense_search(self, query: str) -> List[str]:
+        """Dense hits whose similarity clears the cutoff, best first."""
+        # AstraDB and the in-memory store both return similarity (higher is better)
+        hits = self.vector_store.similarity_search_with_score(query, k=self.fetch_k)
+        return [doc.page_content for doc, score in hits if score >= self.score_threshold]
+
+    def sparse_search(self, query: str) -> List[str]:
+        """BM25 hits within `bm25_cutoff` of the best one, best first."""
+        hits = self.bm25.search(query, self.fetch_k)
+        if not hits:
+            return []
+        cutoff = hits[0][1] * self.bm25_cutoff
+        return [text for text, score in hits if score >= cutoff]
+
+    def retrieve(self, query: str, token_budget: Optional[int] = None) -> List[str]:
+        """Returns at most k fused memories whose combined size fits the token budget."""
+        budget = self.token_budget if token_budget is None else token_budget
+        fused = reciprocal_rank_fusion(
+            [self.dense_search(query), self.sparse_search(query)], self.rrf_k
+        )
+        selected, used = [], 0
+        for text, _ in fused:
+            cost = estimate_tokens(text)
+            if used + cost > budget:
+                continue
+            selected.append(text)
+            used += cost
+            if len(selected) == self.k:
+                break
+        return selected
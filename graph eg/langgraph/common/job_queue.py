@@ -0,0 +1,417 @@
+"""
+Durable job queue and scheduler for long-running graph services.
+
+`JobQueue` keeps jobs and recurring schedules in a local SQLite file, so
+nothing is lost when the service restarts and several processes can share
+one queue:
+1. `enqueue` adds a job (a kind, a JSON payload and the time it is due);
+   `add_schedule` registers a payload to enqueue every `interval` seconds,
+   and `enqueue_due` turns due schedules into jobs (missed periods while the
+   service was down collapse into one job)
+2. `claim` atomically hands the oldest due job to a worker, skipping jobs
+   whose `concurrency_key` (e.g. the ebook) already has `key_limit` jobs
+   running, and leases it for `lease` seconds
+3. Workers renew leases with `heartbeat`; a job whose lease ran out (its
+   process died) is queued again by `recover_expired`, or failed once it
+   has used up `max_attempts`
+4. `complete` or `fail` finishes a job; failures are retried after
+   `retry_delay` until `max_attempts` is reached. Only the lease holder can
+   finish or `suspend` a job: the update must match the worker and attempt
+   that claimed it, so a worker whose lease ran out cannot overwrite the
+   outcome of the attempt that took the job over
+5. A handler that has to wait for something outside the service (e.g. a
+   human approval) returns `WaitForResume`: the job is parked as "waiting"
+   and its worker is free again. `resume(job_id, value)`, called from any
+   process, queues it again with `payload["resume"] = value`
+
+Each job keeps one `thread_id` across attempts, so a retried graph run can
+resume from its last checkpoint instead of starting over.
+
+`Scheduler` runs the loop on a thread pool with at most `max_workers` jobs
+at a time and reports queue metrics (jobs per status, how long due jobs
+waited before a worker picked them up) through `on_event`.
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from common.budget import print_metrics
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS jobs ("
+    "id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, payload TEXT NOT NULL, "
+    "thread_id TEXT, concurrency_key TEXT, status TEXT NOT NULL, run_at REAL NOT NULL, "
+    "enqueued_at REAL NOT NULL, started_at REAL, finished_at REAL, attempts INTEGER NOT NULL DEFAULT 0, "
+    "max_attempts INTEGER NOT NULL, lease_until REAL, worker TEXT, queue_latency REAL, error TEXT, result TEXT)",
+    "CREATE INDEX IF NOT EXISTS jobs_due ON jobs (status, run_at)",
+    "CREATE TABLE IF NOT EXISTS schedules ("
+    "name TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL, interval REAL NOT NULL, "
+    "next_run_at REAL NOT NULL, concurrency_key TEXT, max_attempts INTEGER NOT NULL)",
+]
+
+_JOB_COLUMNS = "id, kind, payload, thread_id, concurrency_key, attempts, run_at, enqueued_at"
+
+
+@dataclass
+class Job:
+    id: int
+    kind: str
+    payload: Dict[str, Any]
+    thread_id: str
+    concurrency_key: Optional[str]
+    attempts: int
+    run_at: float
+    enqueued_at: float
+    worker: Optional[str] = None
+
+
+@dataclass
+class WaitForResume:
+    """Handler result that parks the job until `JobQueue.resume`."""
+
+    detail: Any = None
+
+
+def _job(row) -> Job:
+    return Job(row[0], row[1], json.loads(row[2]), row[3], row[4], row[5], row[6], row[7])
+
+
+class JobQueue:
+    """SQLite-backed job queue with leases, retries and recurring schedules."""
+
+    def __init__(self, path: str = "jobs.sqlite", lease: float = 60.0, latency_window: int = 1000):
+        self.path = path
+        self.lease = lease
+        self.latency_window = latency_window
+        # Autocommit mode, so claims can take the write lock up front
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+        self._lock = threading.Lock()
+
+    def _write(self, sql: str, params=()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    def enqueue(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        run_at: Optional[float] = None,
+        concurrency_key: Optional[str] = None,
+        max_attempts: int = 3,
+        thread_id: Optional[str] = None,
+    ) -> int:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            job_id = self._conn.execute(
+                "INSERT INTO jobs (kind, payload, thread_id, concurrency_key, status, run_at, enqueued_at, max_attempts) "
+                "VALUES (?, ?, ?, ?, 'queued', ?, ?, ?)",
+                (kind, json.dumps(payload), thread_id, concurrency_key, run_at or now, now, max_attempts),
+            ).lastrowid
+            if thread_id is None:
+                self._conn.execute("UPDATE jobs SET thread_id = ? WHERE id = ?", (f"job-{job_id}", job_id))
+            self._conn.execute("COMMIT")
+        return job_id
+
+    def add_schedule(
+        self,
+        name: str,
+        kind: str,
+        payload: Dict[str, Any],
+        interval: float,
+        first_run_at: Optional[float] = None,
+        concurrency_key: Optional[str] = None,
+        max_attempts: int = 3,
+    ) -> None:
+        """Creates or replaces a recurring job; its next run time is kept when it already exists."""
+        self._write(
+            "INSERT INTO schedules (name, kind, payload, interval, next_run_at, concurrency_key, max_attempts) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (name) DO UPDATE SET kind = excluded.kind, "
+            "payload = excluded.payload, interval = excluded.interval, "
+            "concurrency_key = excluded.concurrency_key, max_attempts = excluded.max_attempts",
+            (name, kind, json.dumps(payload), interval, first_run_at or time.time(), concurrency_key, max_attempts),
+        )
+
+    def remove_schedule(self, name: str) -> None:
+        self._write("DELETE FROM schedules WHERE name = ?", (name,))
+
+    def enqueue_due(self, now: Optional[float] = None) -> List[int]:
+        """Enqueues one job per due schedule and moves each schedule past `now`."""
+        now = now or time.time()
+        job_ids = []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            due = self._conn.execute(
+                "SELECT name, kind, payload, interval, next_run_at, concurrency_key, max_attempts "
+                "FROM schedules WHERE next_run_at <= ?", (now,)
+            ).fetchall()
+            for name, kind, payload, interval, next_run_at, key, max_attempts in due:
+                cursor = self._conn.execute(
+                    "INSERT INTO jobs (kind, payload, concurrency_key, status, run_at, enqueued_at, max_attempts) "
+                    "VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                    (kind, payload, key, next_run_at, now, max_attempts),
+                )
+                job_ids.append(cursor.lastrowid)
+                self._conn.execute(
+                    "UPDATE jobs SET thread_id = ? WHERE id = ?", (f"{name}-{cursor.lastrowid}", cursor.lastrowid)
+                )
+                periods = int((now - next_run_at) // interval) + 1
+                self._conn.execute(
+                    "UPDATE schedules SET next_run_at = ? WHERE name = ?", (next_run_at + periods * interval, name)
+                )
+            self._conn.execute("COMMIT")
+        return job_ids
+
+    def claim(self, worker: str, key_limit: int = 1) -> Optional[Job]:
+        """Leases the oldest due job to `worker`, or returns None."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            row = self._conn.execute(
+                f"SELECT {_JOB_COLUMNS} FROM jobs j WHERE status = 'queued' AND run_at <= ? "
+                "AND (concurrency_key IS NULL OR (SELECT COUNT(*) FROM jobs r WHERE r.status = 'running' "
+                "AND r.concurrency_key = j.concurrency_key) < ?) ORDER BY run_at, id LIMIT 1",
+                (now, key_limit),
+            ).fetchone()
+            if row is not None:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, started_at = ?, lease_until = ?, "
+                    "attempts = attempts + 1, queue_latency = ? - run_at WHERE id = ?",
+                    (worker, now, now + self.lease, now, row[0]),
+                )
+            self._conn.execute("COMMIT")
+        if row is None:
+            return None
+        job = _job(row)
+        job.attempts += 1
+        job.worker = worker
+        return job
+
+    def heartbeat(self, job_ids: List[int]) -> None:
+        """Extends the leases of running jobs."""
+        if job_ids:
+            self._write(
+                f"UPDATE jobs SET lease_until = ? WHERE status = 'running' AND id IN ({','.join('?' * len(job_ids))})",
+                (time.time() + self.lease, *job_ids),
+            )
+
+    def recover_expired(self) -> int:
+        """Queues running jobs whose lease ran out again, failing those out of attempts; returns how many."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            recovered = self._conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END, "
+                "finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE ? END, "
+                "error = CASE WHEN attempts < max_attempts THEN error ELSE 'lease expired' END, "
+                "worker = NULL, lease_until = NULL WHERE status = 'running' AND lease_until < ?", (now, now)
+            ).rowcount
+            self._conn.execute("COMMIT")
+        return recovered
+
+    def complete(self, job: Job, result: Any = None) -> bool:
+        """Marks a leased job done; False if this worker no longer holds its lease."""
+        return self._write(
+            "UPDATE jobs SET status = 'done', finished_at = ?, lease_until = NULL, result = ?, error = NULL "
+            "WHERE id = ? AND status = 'running' AND worker = ? AND attempts = ?",
+            (time.time(), json.dumps(result, default=str), job.id, job.worker, job.attempts),
+        ).rowcount == 1
+
+    def fail(self, job: Job, error: str, retry_delay: float = 60.0) -> Optional[str]:
+        """Records a failed attempt; returns the new status (queued for a retry, or failed).
+
+        Returns None if this worker no longer holds the job's lease.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            row = self._conn.execute(
+                "SELECT max_attempts FROM jobs WHERE id = ? AND status = 'running' AND worker = ? AND attempts = ?",
+                (job.id, job.worker, job.attempts),
+            ).fetchone()
+            status = None if row is None else "queued" if job.attempts < row[0] else "failed"
+            if status is not None:
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, lease_until = NULL, worker = NULL, "
+                    "run_at = CASE WHEN ? = 'queued' THEN ? ELSE run_at END, "
+                    "finished_at = CASE WHEN ? = 'failed' THEN ? ELSE NULL END WHERE id = ?",
+                    (status, error, status, now + retry_delay, status, now, job.id),
+                )
+            self._conn.execute("COMMIT")
+        return status
+
+    def suspend(self, job: Job, detail: Any = None) -> bool:
+        """Parks a leased job as waiting, freeing its lease and worker; False if the lease was lost."""
+        return self._write(
+            "UPDATE jobs SET status = 'waiting', lease_until = NULL, worker = NULL, result = ?, error = NULL "
+            "WHERE id = ? AND status = 'running' AND worker = ? AND attempts = ?",
+            (json.dumps(detail, default=str), job.id, job.worker, job.attempts),
+        ).rowcount == 1
+
+    def resume(self, job_id: int, value: Any = None) -> bool:
+        """Queues a waiting job again with `value` as `payload["resume"]`; False if it is not waiting."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            row = self._conn.execute(
+                "SELECT payload FROM jobs WHERE id = ? AND status = 'waiting'", (job_id,)
+            ).fetchone()
+            if row is not None:
+                payload = {**json.loads(row[0]), "resume": value}
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'queued', payload = ?, run_at = ?, attempts = 0 WHERE id = ?",
+                    (json.dumps(payload), now, job_id),
+                )
+            self._conn.execute("COMMIT")
+        return row is not None
+
+    def waiting(self, kind: Optional[str] = None, limit: int = 100) -> List[dict]:
+        """Oldest waiting jobs with the detail they were suspended with."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, kind, thread_id, result FROM jobs WHERE status = 'waiting' "
+                "AND (? IS NULL OR kind = ?) ORDER BY id LIMIT ?", (kind, kind, limit),
+            ).fetchall()
+        return [
+            {"id": job_id, "kind": job_kind, "thread_id": thread_id, "detail": json.loads(detail)}
+            for job_id, job_kind, thread_id, detail in rows
+        ]
+
+    def get(self, job_id: int) -> Optional[dict]:
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+            return dict(zip([c[0] for c in cursor.description], row)) if row else None
+
+    def metrics(self) -> Dict[str, Any]:
+        """Jobs per status, due backlog and queue latency of recently started jobs."""
+        now = time.time()
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            due, oldest = self._conn.execute(
+                "SELECT COUNT(*), MIN(run_at) FROM jobs WHERE status = 'queued' AND run_at <= ?", (now,)
+            ).fetchone()
+            latencies = [
+                row[0] for row in self._conn.execute(
+                    "SELECT queue_latency FROM jobs WHERE queue_latency IS NOT NULL "
+                    "ORDER BY started_at DESC LIMIT ?", (self.latency_window,)
+                )
+            ]
+        report = {
+            "jobs": {status: counts.get(status, 0) for status in ("queued", "running", "waiting", "done", "failed")},
+            "due": due,
+            "oldest_due_wait_s": round(now - oldest, 3) if oldest is not None else 0.0,
+        }
+        if latencies:
+            latencies.sort()
+            report["queue_latency_s"] = {
+                "p50": round(statistics.median(latencies), 3),
+                "p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3),
+                "max": round(latencies[-1], 3),
+                "samples": len(latencies),
+            }
+        return report
+
+
+class Scheduler:
+    """Runs queued jobs on a worker pool; `handlers` maps a job kind to a function of the job."""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handlers: Dict[str, Callable[[Job], Any]],
+        max_workers: int = 4,
+        key_limit: int = 1,
+        poll_interval: float = 1.0,
+        retry_delay: float = 60.0,
+        metrics_interval: Optional[float] = 60.0,
+        on_event: Callable[[Dict[str, Any]], None] = print_metrics,
+    ):
+        self.queue = queue
+        self.handlers = handlers
+        self.max_workers = max_workers
+        self.key_limit = key_limit
+        self.poll_interval = poll_interval
+        self.retry_delay = retry_delay
+        self.metrics_interval = metrics_interval
+        self.on_event = on_event
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._running: Dict[int, Any] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._last_metrics = time.monotonic()
+
+    def _execute(self, job: Job) -> None:
+        try:
+            handler = self.handlers[job.kind]
+            result = handler(job)
+        except Exception as e:
+            status = self.queue.fail(job, f"{type(e).__name__}: {e}", self.retry_delay)
+            print(f"Job {job.id} ({job.kind}) attempt {job.attempts} failed: {e}; {status or 'lease lost'}")
+        else:
+            if isinstance(result, WaitForResume):
+                recorded = self.queue.suspend(job, result.detail)
+            else:
+                recorded = self.queue.complete(job, result)
+            if not recorded:
+                print(f"Job {job.id} ({job.kind}) attempt {job.attempts} lost its lease; result not recorded")
+        finally:
+            with self._lock:
+                self._running.pop(job.id, None)
+
+    def tick(self) -> int:
+        """One scheduling pass; returns how many jobs were started."""
+        self.queue.recover_expired()
+        self.queue.enqueue_due()
+        with self._lock:
+            self.queue.heartbeat(list(self._running))
+            started = 0
+            while len(self._running) < self.max_workers:
+                job = self.queue.claim(self.worker_id, self.key_limit)
+                if job is None:
+                    break
+                self._running[job.id] = self._executor.submit(self._execute, job)
+                started += 1
+        if self.metrics_interval is not None and time.monotonic() - self._last_metrics >= self.metrics_interval:
+            self._last_metrics = time.monotonic()
+            self.on_event({"event": "job_queue", **self.metrics()})
+        return started
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            busy = len(self._running)
+        return {**self.queue.metrics(), "workers": {"busy": busy, "max": self.max_workers}}
+
+    def run_forever(self) -> None:
+        """Polls the queue until `stop()`, then waits for running jobs."""
+        print(f"Scheduler {self.worker_id} started with {self.max_workers} workers")
+        while not self._stop.is_set():
+            started = self.tick()
+            if not started:
+                self._stop.wait(self.poll_interval)
+        self._executor.shutdown(wait=True)
+
+    def run_until_idle(self) -> None:
+        """Runs jobs until nothing is due or running (schedules are not waited for)."""
+        while True:
+            self.tick()
+            with self._lock:
+                busy = bool(self._running)
+            if not busy and not self.queue.metrics()["due"]:
+                return
+            time.sleep(min(self.poll_interval, 0.05))
+
+    def stop(self) -> None:
+        self._stop.set()
@@ -0,0 +1,176 @@
+"""
+Memory profiling mode for graph runs.
+
+`MemoryProfiler.instrument(graph)` returns a copy of a compiled graph whose
+nodes are wrapped with tracemalloc snapshots. Run the copy as usual (invoke,
+stream, `run_with_budget`, a chat loop); every node execution records:
+- retained bytes: traced memory still allocated when the node returns,
+  including whatever it hands back to the state
+- peak bytes: the high-water mark while the node ran (e.g. a rendered
+  pixmap that is freed again)
+- the allocation sites (file:line) that grew the most
+
+The state a node receives is measured too, which gives the state size per
+superstep and how much it grew. Each run of the graph (an invoke or stream
+call, whatever its number of steps or checkpointer) is one turn: a callback
+handler sees the run start, and each node is matched to its run through its
+parent runs. Across calls, a node is flagged as growing
+when it retained more than `leak_threshold` bytes on each of its last
+`min_calls` calls, the pattern of an unbounded message list or cache.
+
+`report()` returns everything as a JSON-serializable dict and `write_json`
+saves it. Nodes run one at a time while profiled, so snapshots of parallel
+nodes do not mix; timings are not representative in this mode.
+"""
+
+import gc
+import json
+import pickle
+import threading
+import tracemalloc
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+
+
+def state_size(state: Any) -> int:
+    """Pickled size of a state in bytes; values that cannot be pickled are skipped."""
+    try:
+        return len(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        if not isinstance(state, dict):
+            return 0
+        return sum(state_size(value) for value in state.values())
+
+
+class _RunTracker(BaseCallbackHandler):
+    """Remembers the parent of every live chain run, so a node can find the run it belongs to."""
+
+    def __init__(self):
+        self.parents: Dict[UUID, Optional[UUID]] = {}
+
+    def on_chain_start(self, serialized, inputs, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs):
+        self.parents[run_id] = parent_run_id
+
+    def on_chain_end(self, outputs, *, run_id: UUID, **kwargs):
+        self.parents.pop(run_id, None)
+
+    def on_chain_error(self, error, *, run_id: UUID, **kwargs):
+        self.parents.pop(run_id, None)
+
+    def root(self, run_id: Optional[UUID]) -> Optional[UUID]:
+        while self.parents.get(run_id) is not None:
+            run_id = self.parents[run_id]
+        return run_id
+
+
+class MemoryProfiler:
+    """Collects per-node allocation snapshots and per-step state sizes."""
+
+    def __init__(self, top_n: int = 5, leak_threshold: int = 64 * 1024, min_calls: int = 3, frames: int = 1):
+        self.top_n = top_n
+        self.leak_threshold = leak_threshold
+        self.min_calls = min_calls
+        self.frames = frames
+        self.calls: Dict[str, List[dict]] = defaultdict(list)
+        self.sites: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.steps: List[dict] = []
+        self._runs = _RunTracker()
+        self._turns: Dict[Optional[UUID], int] = {}
+        self._measured_step: Optional[tuple] = None
+        # Serializes nodes: tracemalloc is process-wide, so parallel nodes
+        # would otherwise show up in each other's snapshots. Reentrant, so a
+        # node can invoke another graph instrumented by this profiler
+        self._lock = threading.RLock()
+        self._filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ]
+
+    def instrument(self, graph):
+        """Returns a copy of a compiled graph with every node profiled."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        nodes = {
+            name: node if name.startswith("__") else node.copy({"bound": self._wrap(name, node.bound)})
+            for name, node in graph.nodes.items()
+        }
+        return graph.copy({"nodes": nodes}).with_config(callbacks=[self._runs])
+
+    def _wrap(self, name: str, bound) -> RunnableLambda:
+        def profiled_node(state: Any, config: RunnableConfig) -> Any:
+            with self._lock:
+                turn = self._record_step(state, config)
+                return self._measure(name, turn, lambda: bound.invoke(state, config))
+
+        return RunnableLambda(profiled_node, name=name)
+
+    def _record_step(self, state: Any, config: RunnableConfig) -> int:
+        """Returns the node's turn, measuring the state on the first node of each superstep."""
+        callbacks = config.get("callbacks")
+        run = self._runs.root(getattr(callbacks, "parent_run_id", None))
+        turn = self._turns.setdefault(run, len(self._turns))
+        step = (config.get("metadata") or {}).get("langgraph_step")
+        if step is None or (turn, step) == self._measured_step:
+            return turn  # already measured for another node in this superstep
+        self._measured_step = (turn, step)
+        size = state_size(state)
+        growth = size - self.steps[-1]["state_bytes"] if self.steps else 0
+        self.steps.append({"turn": turn, "step": step, "state_bytes": size, "growth_bytes": growth})
+        return turn
+
+    def _measure(self, name: str, turn: int, call) -> Any:
+        gc.collect()
+        before = tracemalloc.take_snapshot().filter_traces(self._filters)
+        start = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        try:
+            return call()
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot().filter_traces(self._filters)
+            top = []
+            for stat in after.compare_to(before, "lineno")[: self.top_n]:
+                frame = stat.traceback[0]
+                site = f"{frame.filename}:{frame.lineno}"
+                self.sites[name][site] += stat.size_diff
+                top.append({"site": site, "size_diff": stat.size_diff, "count_diff": stat.count_diff})
+            self.calls[name].append({
+                "turn": turn,
+                "retained_bytes": current - start,
+                "peak_bytes": peak - start,
+                "top_allocations": top,
+            })
+
+    def growing_nodes(self) -> List[str]:
+        """Nodes that kept retaining more than `leak_threshold` bytes on recent calls."""
+        flagged = []
+        for name, calls in self.calls.items():
+            recent = calls[-self.min_calls:]
+            if len(recent) >= self.min_calls and all(c["retained_bytes"] > self.leak_threshold for c in recent):
+                flagged.append(name)
+        return flagged
+
+    def report(self) -> dict:
+        growing = self.growing_nodes()
+        nodes = {}
+        for name, calls in self.calls.items():
+            sites = sorted(self.sites[name].items(), key=lambda item: item[1], reverse=True)
+            nodes[name] = {
+                "calls": len(calls),
+                "retained_bytes": [c["retained_bytes"] for c in calls],
+                "total_retained_bytes": sum(c["retained_bytes"] for c in calls),
+                "max_peak_bytes": max(c["peak_bytes"] for c in calls),
+                "top_allocations": [{"site": s, "size_diff": d} for s, d in sites[: self.top_n]],
+                "growing": name in growing,
+            }
+        return {"nodes": nodes, "steps": self.steps, "growing_nodes": growing}
+
+    def write_json(self, path: str) -> dict:
+        report = self.report()
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        return report
@@ -0,0 +1,341 @@
+"""
+Chat model provider with record/replay cassettes for offline load testing.
+
+Scripts get their model from `chat_model(...)` instead of constructing
+`ChatGroq` directly. The `LLM_MODE` environment variable picks the provider:
+- `live` (default): the real model class, e.g. `ChatGroq`
+- `record`: the real model, with every call (including tool calls and
+  streamed chunks) appended to a cassette file
+- `replay`: no network and no API key; answers come from the cassette
+
+A cassette is a JSON-lines file (`LLM_CASSETTE`, default
+`llm_cassette.jsonl`), one recorded call per line. Calls are matched on a
+key built from the model name, the bound tool names and the conversation
+(message types, contents and tool call names/args; ids are left out
+because they differ between runs). Replayed tool calls get fresh ids on
+every call, so sessions replaying the same recording never share one.
+When a load test drifts off the recorded conversations, replay falls back
+to a recording with the same tools and the same kind of last message (a
+question or a tool result), picked by a stable hash of the key, so runs
+stay deterministic. Set `LLM_REPLAY_STRICT=1` to
+raise `CassetteMiss` instead.
+
+Replay timing is synthetic: `LLM_LATENCY` seconds before the first token
+and `LLM_TOKENS_PER_SEC` for the output tokens (unset means instant).
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Type
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, BaseMessage, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import ConfigDict
+
+
+class CassetteMiss(KeyError):
+    """A replayed call has no matching recording."""
+
+
+def provider_mode() -> str:
+    """The provider selected by LLM_MODE: live, record or replay."""
+    mode = os.getenv("LLM_MODE", "live").lower()
+    if mode not in ("live", "record", "replay"):
+        raise ValueError(f"LLM_MODE must be live, record or replay, not {mode!r}")
+    return mode
+
+
+def _tool_names(kwargs: Dict[str, Any]) -> List[str]:
+    return sorted(
+        tool.get("function", {}).get("name", "") if isinstance(tool, dict) else getattr(tool, "name", "")
+        for tool in kwargs.get("tools") or []
+    )
+
+
+def _message_key(message: BaseMessage) -> list:
+    calls = [[call["name"], call["args"]] for call in getattr(message, "tool_calls", None) or []]
+    return [message.type, message.content, calls]
+
+
+def request_key(model: str, messages: Sequence[BaseMessage], tools: Sequence[str]) -> str:
+    """Cassette key of a call: model, tool names and conversation, without ids."""
+    payload = json.dumps([model, list(tools), [_message_key(m) for m in messages]], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def _fallback_key(tools: Sequence[str], messages: Sequence[BaseMessage]) -> str:
+    last = messages[-1].type if messages else ""
+    return json.dumps([list(tools), last])
+
+
+class Cassette:
+    """Recorded model calls in a JSON-lines file, appended as they happen."""
+
+    def __init__(self, path: str = "llm_cassette.jsonl"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._by_key: Dict[str, dict] = {}
+        self._by_shape: Dict[str, List[dict]] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._index(json.loads(line))
+
+    def __len__(self) -> int:
+        return len(self._by_key)
+
+    def _index(self, entry: dict) -> None:
+        # The first recording of a request wins, so replays are stable,
+        # except that a streamed recording replaces one without chunks
+        current = self._by_key.get(entry["key"])
+        if current is None or (entry.get("chunks") and not current.get("chunks")):
+            self._by_key[entry["key"]] = entry
+        self._by_shape.setdefault(entry["shape"], []).append(entry)
+
+    def record(self, entry: dict) -> None:
+        line = json.dumps(entry, default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            self._index(entry)
+
+    def find(self, key: str, shape: str, strict: bool = False) -> dict:
+        entry = self._by_key.get(key)
+        if entry is not None:
+            return entry
+        candidates = self._by_shape.get(shape)
+        if strict or not candidates:
+            raise CassetteMiss(f"no recording for request {key} in {self.path}")
+        return candidates[int(key[:8], 16) % len(candidates)]
+
+
+_TOOL_CALL_FIELDS = ("tool_calls", "tool_call_chunks", "invalid_tool_calls")
+
+
+def _fresh_tool_call_ids(entry: dict) -> Dict[str, str]:
+    """New ids for the tool calls of a recording, recorded id -> new id."""
+    ids: Dict[str, str] = {}
+    for data in [entry["message"], *(entry.get("chunks") or [])]:
+        for field in _TOOL_CALL_FIELDS:
+            for call in data["data"].get(field) or []:
+                if call.get("id") and call["id"] not in ids:
+                    ids[call["id"]] = f"call_{uuid.uuid4().hex[:24]}"
+    return ids
+
+
+def _strip_id(data: dict, tool_call_ids: Dict[str, str]) -> dict:
+    # Recorded message ids must not be reused: add_messages would replace
+    # an earlier message with the same id instead of appending. Tool call
+    # ids are swapped too, or replayed tool results could be matched to
+    # another session's call
+    fields = dict(data["data"], id=None)
+
+    def swap(calls):
+        return [dict(call, id=tool_call_ids.get(call.get("id"), call.get("id"))) for call in calls]
+
+    for field in _TOOL_CALL_FIELDS:
+        if fields.get(field):
+            fields[field] = swap(fields[field])
+    kwargs = fields.get("additional_kwargs") or {}
+    if kwargs.get("tool_calls"):
+        fields["additional_kwargs"] = dict(kwargs, tool_calls=swap(kwargs["tool_calls"]))
+    return dict(data, data=fields)
+
+
+def _output_tokens(message: BaseMessage) -> int:
+    usage = getattr(message, "usage_metadata", None) or {}
+    if usage.get("output_tokens"):
+        return usage["output_tokens"]
+    text = message.content if isinstance(message.content, str) else json.dumps(message.content)
+    return max(1, len(text) // 4)
+
+
+class RecordingChatModel(BaseChatModel):
+    """Wraps a live chat model and appends each call to a cassette."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    inner: BaseChatModel
+    cassette: Cassette
+    model_name: str = ""
+
+    @property
+    def _llm_type(self) -> str:
+        return f"recording-{self.inner._llm_type}"
+
+    def _get_ls_params(self, stop=None, **kwargs):
+        return self.inner._get_ls_params(stop=stop, **kwargs)
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any):
+        # Let the live model format tools its own way, then bind the result here
+        return self.bind(**self.inner.bind_tools(tools, **kwargs).kwargs)
+
+    def _record(self, messages, kwargs, message: BaseMessage, chunks, first_token_s: float, total_s: float) -> None:
+        tools = _tool_names(kwargs)
+        self.cassette.record({
+            "key": request_key(self.model_name, messages, tools),
+            "shape": _fallback_key(tools, messages),
+            "model": self.model_name,
+            "tools": tools,
+            "message": message_to_dict(message),
+            "chunks": [message_to_dict(chunk) for chunk in chunks] if chunks else None,
+            "first_token_s": round(first_token_s, 4),
+            "total_s": round(total_s, 4),
+        })
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        start = time.perf_counter()
+        result = self.inner._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        elapsed = time.perf_counter() - start
+        self._record(messages, kwargs, result.generations[0].message, None, elapsed, elapsed)
+        return result
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        start = time.perf_counter()
+        first_token_s = None
+        chunks: List[AIMessageChunk] = []
+        for chunk in self.inner._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            if first_token_s is None:
+                first_token_s = time.perf_counter() - start
+            chunks.append(chunk.message)
+            yield chunk
+        if chunks:
+            merged = chunks[0]
+            for chunk in chunks[1:]:
+                merged = merged + chunk
+            self._record(messages, kwargs, merged, chunks, first_token_s, time.perf_counter() - start)
+
+
+class ReplayChatModel(BaseChatModel):
+    """Answers from a cassette with synthetic latency and token rate."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    cassette: Cassette
+    model_name: str = ""
+    provider: str = "groq"
+    latency: float = 0.0
+    tokens_per_second: Optional[float] = None
+    strict: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay-chat"
+
+    def __repr__(self) -> str:
+        # Callbacks serialize the model with repr(); the pydantic one is slow
+        return f"ReplayChatModel(model_name={self.model_name!r}, cassette={self.cassette.path!r})"
+
+    def _get_ls_params(self, stop=None, **kwargs):
+        params = super()._get_ls_params(stop=stop, **kwargs)
+        params["ls_provider"] = self.provider
+        return params
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _lookup(self, messages: Sequence[BaseMessage], kwargs: Dict[str, Any]) -> dict:
+        tools = _tool_names(kwargs)
+        return self.cassette.find(
+            request_key(self.model_name, messages, tools), _fallback_key(tools, messages), self.strict
+        )
+
+    def _generation_s(self, message: BaseMessage) -> float:
+        """Synthetic time to produce the output tokens after the first one."""
+        return _output_tokens(message) / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def _message(self, entry: dict, tool_call_ids: Dict[str, str]) -> BaseMessage:
+        return messages_from_dict([_strip_id(entry["message"], tool_call_ids)])[0]
+
+    def _chunks(self, entry: dict, message: BaseMessage, tool_call_ids: Dict[str, str]) -> List[AIMessageChunk]:
+        if entry.get("chunks"):
+            return messages_from_dict([_strip_id(chunk, tool_call_ids) for chunk in entry["chunks"]])
+        # Recorded without streaming: stream the content word by word
+        words = message.content.split(" ") if isinstance(message.content, str) and message.content else [""]
+        chunks = [AIMessageChunk(content=w if i == 0 else " " + w) for i, w in enumerate(words)]
+        chunks[-1] = chunks[-1] + AIMessageChunk(
+            content="",
+            tool_call_chunks=[
+                {"name": c["name"], "args": json.dumps(c["args"]), "id": c["id"], "index": i}
+                for i, c in enumerate(getattr(message, "tool_calls", None) or [])
+            ],
+            usage_metadata=message.usage_metadata,
+        )
+        return chunks
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        entry = self._lookup(messages, kwargs)
+        message = self._message(entry, _fresh_tool_call_ids(entry))
+        time.sleep(self.latency + self._generation_s(message))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        entry = self._lookup(messages, kwargs)
+        message = self._message(entry, _fresh_tool_call_ids(entry))
+        await asyncio.sleep(self.latency + self._generation_s(message))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        entry = self._lookup(messages, kwargs)
+        tool_call_ids = _fresh_tool_call_ids(entry)
+        message = self._message(entry, tool_call_ids)
+        chunks = self._chunks(entry, message, tool_call_ids)
+        gap = self._generation_s(message) / len(chunks)
+        time.sleep(self.latency)
+        for i, chunk in enumerate(chunks):
+            if i and gap:
+                time.sleep(gap)
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        entry = self._lookup(messages, kwargs)
+        tool_call_ids = _fresh_tool_call_ids(entry)
+        message = self._message(entry, tool_call_ids)
+        chunks = self._chunks(entry, message, tool_call_ids)
+        gap = self._generation_s(message) / len(chunks)
+        await asyncio.sleep(self.latency)
+        for i, chunk in enumerate(chunks):
+            if i and gap:
+                await asyncio.sleep(gap)
+            yield ChatGenerationChunk(message=chunk)
+
+
+_cassettes: Dict[str, Cassette] = {}
+
+
+def _cassette(path: str) -> Cassette:
+    # Scripts that build several models share one cassette per file
+    if path not in _cassettes:
+        _cassettes[path] = Cassette(path)
+    return _cassettes[path]
+
+
+def chat_model(model: str, model_class: Optional[Type[BaseChatModel]] = None, **kwargs: Any) -> BaseChatModel:
+    """Returns the chat model for LLM_MODE; `model_class` defaults to ChatGroq."""
+    mode = provider_mode()
+    path = os.getenv("LLM_CASSETTE", "llm_cassette.jsonl")
+    if mode == "replay":
+        rate = os.getenv("LLM_TOKENS_PER_SEC")
+        return ReplayChatModel(
+            cassette=_cassette(path),
+            model_name=model,
+            latency=float(os.getenv("LLM_LATENCY", "0")),
+            tokens_per_second=float(rate) if rate else None,
+            strict=os.getenv("LLM_REPLAY_STRICT") == "1",
+        )
+    if model_class is None:
+        from langchain_groq import ChatGroq
+
+        model_class = ChatGroq
+    live = model_class(model=model, **kwargs)
+    if mode == "record":
+        return RecordingChatModel(inner=live, cassette=_cassette(path), model_name=model)
+    return live
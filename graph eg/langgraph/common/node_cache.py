@@ -0,0 +1,216 @@
+"""
+Per-node result caches for deterministic nodes and subgraphs.
+
+A node opts in at `add_node` time with LangGraph's `CachePolicy`, whose key
+function picks the state fields the node depends on; the graph is compiled
+with one of the backends below:
+
+    builder.add_node("extract", extract, cache_policy=CachePolicy(key_func=state_key("path", "page")))
+    graph = builder.compile(cache=MemoryNodeCache(max_entries=1024))
+
+On a hit the node (or a whole subgraph behind a node) is skipped and its
+recorded state writes are applied instead. Both backends evict the least
+recently used entries beyond `max_entries` and honour the policy's `ttl`:
+- `MemoryNodeCache`: an in-process LRU dict
+- `SqliteNodeCache`: a local SQLite file that survives restarts and can be
+  shared by processes
+
+Failed or interrupted node runs are never stored; `skip_if(writes)` can
+exclude more, e.g. runs that wrote an error message into the state. Hits
+and misses per node are kept in `stats`; `instrument_graph` turns each hit
+into a span, and `stream_mode="updates"` marks cached updates with
+`{"__metadata__": {"cached": True}}`.
+"""
+
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, Mapping, Optional, Sequence, Tuple
+
+from langgraph.cache.base import BaseCache, FullKey, Namespace
+
+WritesPredicate = Callable[[Sequence[Tuple[str, Any]]], bool]
+
+# Channels LangGraph uses for failed and interrupted tasks
+_UNCACHEABLE_CHANNELS = {"__error__", "__interrupt__"}
+
+
+def state_key(*fields: str) -> Callable[[Any], bytes]:
+    """Cache key function over state fields; dotted names read nested keys."""
+    paths = [field.split(".") for field in fields]
+
+    def key(state: Any) -> bytes:
+        values = []
+        for path in paths:
+            value = state
+            for part in path:
+                value = value.get(part) if isinstance(value, Mapping) else getattr(value, part, None)
+            values.append(value)
+        return pickle.dumps(values, protocol=pickle.HIGHEST_PROTOCOL)
+
+    return key
+
+
+def node_name(ns: Namespace) -> str:
+    """Node name from a LangGraph cache namespace (writes marker, function, node)."""
+    return ns[-1] if len(ns) > 2 else ns[-1].rsplit(".", 1)[-1]
+
+
+class _NodeCache(BaseCache):
+    """Shared bookkeeping: hit/miss counters per node and write filtering."""
+
+    def __init__(self, *, skip_if: Optional[WritesPredicate] = None, serde=None):
+        super().__init__(serde=serde)
+        self.skip_if = skip_if
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self.by_node: Dict[str, Dict[str, int]] = defaultdict(lambda: {"hits": 0, "misses": 0})
+
+    def cache_info(self) -> Dict[str, int]:
+        return dict(self.stats)
+
+    def _count(self, keys: Sequence[FullKey], found: Mapping[FullKey, Any]) -> None:
+        for key in keys:
+            field = "hits" if key in found else "misses"
+            self.stats[field] += 1
+            self.by_node[node_name(key[0])][field] += 1
+
+    def _cacheable(self, writes: Sequence[Tuple[str, Any]]) -> bool:
+        if not writes or any(channel in _UNCACHEABLE_CHANNELS for channel, _ in writes):
+            return False
+        return not (self.skip_if and self.skip_if(writes))
+
+    async def aget(self, keys):
+        return self.get(keys)
+
+    async def aset(self, pairs):
+        self.set(pairs)
+
+    async def aclear(self, namespaces=None):
+        self.clear(namespaces)
+
+
+class MemoryNodeCache(_NodeCache):
+    """In-process LRU cache of node writes."""
+
+    def __init__(self, max_entries: int = 1024, **kwargs):
+        super().__init__(**kwargs)
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[FullKey, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, keys):
+        now = time.time()
+        found = {}
+        with self._lock:
+            for ns, key in keys:
+                full_key = (tuple(ns), key)
+                entry = self._entries.get(full_key)
+                if entry is None:
+                    continue
+                if entry[1] is not None and entry[1] <= now:
+                    del self._entries[full_key]
+                    continue
+                self._entries.move_to_end(full_key)
+                found[(ns, key)] = self.serde.loads_typed(entry[0])
+            self._count(keys, found)
+        return found
+
+    def set(self, pairs):
+        now = time.time()
+        with self._lock:
+            for (ns, key), (writes, ttl) in pairs.items():
+                if not self._cacheable(writes):
+                    continue
+                full_key = (tuple(ns), key)
+                self._entries[full_key] = (self.serde.dumps_typed(list(writes)), now + ttl if ttl else None)
+                self._entries.move_to_end(full_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def clear(self, namespaces=None):
+        with self._lock:
+            if namespaces is None:
+                self._entries.clear()
+                return
+            drop = {tuple(ns) for ns in namespaces}
+            for full_key in [k for k in self._entries if k[0] in drop]:
+                del self._entries[full_key]
+
+
+class SqliteNodeCache(_NodeCache):
+    """SQLite-backed LRU cache of node writes."""
+
+    def __init__(self, path: str = "node_cache.sqlite", max_entries: int = 10_000, **kwargs):
+        super().__init__(**kwargs)
+        self.max_entries = max_entries
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS node_writes ("
+            "ns TEXT NOT NULL, key TEXT NOT NULL, type TEXT NOT NULL, value BLOB NOT NULL, "
+            "expires_at REAL, last_used REAL NOT NULL, PRIMARY KEY (ns, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS node_writes_lru ON node_writes (last_used)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM node_writes").fetchone()[0]
+
+    def get(self, keys):
+        now = time.time()
+        found = {}
+        with self._lock:
+            for ns, key in keys:
+                ns_text = "|".join(ns)
+                row = self._conn.execute(
+                    "SELECT type, value, expires_at FROM node_writes WHERE ns = ? AND key = ?", (ns_text, key)
+                ).fetchone()
+                if row is None:
+                    continue
+                if row[2] is not None and row[2] <= now:
+                    self._conn.execute("DELETE FROM node_writes WHERE ns = ? AND key = ?", (ns_text, key))
+                    continue
+                self._conn.execute(
+                    "UPDATE node_writes SET last_used = ? WHERE ns = ? AND key = ?", (now, ns_text, key)
+                )
+                found[(ns, key)] = self.serde.loads_typed((row[0], row[1]))
+            self._conn.commit()
+            self._count(keys, found)
+        return found
+
+    def set(self, pairs):
+        now = time.time()
+        with self._lock:
+            for (ns, key), (writes, ttl) in pairs.items():
+                if not self._cacheable(writes):
+                    continue
+                type_, value = self.serde.dumps_typed(list(writes))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO node_writes (ns, key, type, value, expires_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    ("|".join(ns), key, type_, value, now + ttl if ttl else None, now),
+                )
+            excess = self._conn.execute("SELECT COUNT(*) FROM node_writes").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM node_writes WHERE rowid IN "
+                    "(SELECT rowid FROM node_writes ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+                self.stats["evictions"] += excess
+            self._conn.commit()
+
+    def clear(self, namespaces=None):
+        with self._lock:
+            if namespaces is None:
+                self._conn.execute("DELETE FROM node_writes")
+            else:
+                self._conn.executemany("DELETE FROM node_writes WHERE ns = ?", [("|".join(ns),) for ns in namespaces])
+            self._conn.commit()
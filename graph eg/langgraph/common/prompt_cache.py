@@ -0,0 +1,129 @@
+"""
+Prompt-prefix caching for tool-bound Groq models.
+
+In a ReAct loop every step re-sends the system prompt, the tool schemas and
+the whole history, and ChatGroq converts each `BaseMessage` to the wire
+format again. `PrefixCachingChatGroq` keeps that prefix stable and cached:
+1. Tool schemas are converted once per tool set and always sent sorted by
+   name, so the serialized request prefix is byte-identical across steps
+2. Each message's wire dict is cached by message id in a bounded LRU, so
+   only the messages appended since the last step are converted
+3. Callers put a module-level `SystemMessage` first, so the system prompt
+   hits the same cache entry on every step
+
+A stable prefix is what lets provider-side prompt caching hit.
+
+The message cache overrides ChatGroq's private `_create_message_dicts` and
+uses `_convert_message_to_dict`; importing this module fails if their
+signatures change in a new langchain-groq release.
+"""
+
+import inspect
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from langchain_groq import ChatGroq
+from langchain_groq.chat_models import _convert_message_to_dict
+from pydantic import PrivateAttr
+
+
+def _check_groq_internals() -> None:
+    """Fails loudly if the private ChatGroq methods overridden here changed."""
+    expected = {
+        ChatGroq._create_message_dicts: ["self", "messages", "stop"],
+        _convert_message_to_dict: ["message"],
+    }
+    for function, params in expected.items():
+        found = list(inspect.signature(function).parameters)
+        if found != params:
+            raise ImportError(
+                f"langchain_groq changed {function.__qualname__}{tuple(found)}, expected {tuple(params)}; "
+                "update common/prompt_cache.py for this langchain-groq version"
+            )
+
+
+_check_groq_internals()
+
+# Converted tool schemas, shared by every model instance: an LRU keyed by the
+# ids of a tool set. Entries keep the tools alive, so an id can't be reused
+# by another object while its entry exists
+_TOOL_SCHEMA_CACHE: "OrderedDict[Tuple[int, ...], Tuple[Tuple[Any, ...], List[dict]]]" = OrderedDict()
+_TOOL_SCHEMA_CACHE_SIZE = 64
+_tool_schema_lock = threading.Lock()
+
+
+def tool_schemas(tools: Sequence[Any]) -> List[dict]:
+    """Returns the OpenAI-format schemas for a tool set, sorted by name and cached."""
+    tools = tuple(tools)
+    key = tuple(id(tool) for tool in tools)
+    with _tool_schema_lock:
+        entry = _TOOL_SCHEMA_CACHE.get(key)
+        if entry is not None:
+            _TOOL_SCHEMA_CACHE.move_to_end(key)
+            return entry[1]
+    formatted = [convert_to_openai_tool(tool) for tool in tools]
+    formatted.sort(key=lambda schema: schema["function"]["name"])
+    # Round-trip through sorted JSON so key order is stable too
+    schemas = json.loads(json.dumps(formatted, sort_keys=True))
+    with _tool_schema_lock:
+        _TOOL_SCHEMA_CACHE[key] = (tools, schemas)
+        while len(_TOOL_SCHEMA_CACHE) > _TOOL_SCHEMA_CACHE_SIZE:
+            _TOOL_SCHEMA_CACHE.popitem(last=False)
+    return schemas
+
+
+class PrefixCachingChatGroq(ChatGroq):
+    """ChatGroq that reuses serialized tool schemas and messages across steps."""
+
+    # Entries keep their messages alive, so the bound is the memory cost
+    max_cached_messages: int = 2048
+
+    _wire_cache: "OrderedDict[Any, Tuple[BaseMessage, dict]]" = PrivateAttr(default_factory=OrderedDict)
+    _wire_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _cache_hits: int = PrivateAttr(default=0)
+    _cache_misses: int = PrivateAttr(default=0)
+
+    def cache_info(self) -> Dict[str, int]:
+        """Message cache hits, misses and current size."""
+        return {"hits": self._cache_hits, "misses": self._cache_misses, "size": len(self._wire_cache)}
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any):
+        return super().bind_tools(tool_schemas(tools), **kwargs)
+
+    def _create_message_dicts(
+        self, messages: List[BaseMessage], stop: Optional[List[str]]
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        params = self._default_params
+        if stop is not None:
+            params["stop"] = stop
+
+        # Private attributes are slow to reach on pydantic models, so the
+        # loop works on locals and updates the counters once. The lock keeps
+        # the LRU consistent when sessions share one model instance
+        cache = self._wire_cache
+        message_dicts = []
+        misses = 0
+        with self._wire_lock:
+            for message in messages:
+                # Entries hold the message itself: a replaced message with a
+                # reused id is a different object and gets converted again
+                key = message.id or id(message)
+                entry = cache.get(key)
+                if entry is not None and entry[0] is message:
+                    cache.move_to_end(key)
+                    message_dicts.append(entry[1])
+                    continue
+                wire = _convert_message_to_dict(message)
+                cache[key] = (message, wire)
+                message_dicts.append(wire)
+                misses += 1
+            while len(cache) > self.max_cached_messages:
+                cache.popitem(last=False)
+
+            self._cache_hits += len(messages) - misses
+            self._cache_misses += misses
+        return message_dicts, params
@@ -0,0 +1,164 @@
+"""
+Cached and parallel web search tools.
+
+Repeated searches (the same news question asked again, or with different
+casing or spacing) are answered from a persistent cache instead of the
+network:
+1. `normalize_query` turns a query into its cache key: case-folded, with
+   sentence punctuation around words and extra whitespace removed ("C++"
+   and "C#" keep their meaning)
+2. `SearchResultCache` stores results in a local SQLite file for `ttl`
+   seconds, so the cache survives restarts and can be shared by processes;
+   expired entries are purged when it is opened
+3. `CachedSearch` wraps any backend callable `query -> list of result dicts`
+   (Tavily, or a local stub) with the cache. Anything else the backend
+   returns (Tavily returns an error string) is passed through uncached
+
+`make_search_tools` returns a `web_search` tool for one query and a
+`multi_search` tool that runs several queries concurrently and drops results
+whose URL was already returned.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+from langchain_core.tools import tool
+
+SearchBackend = Callable[[str], List[dict]]
+
+# Stripped from the start and end of each word only, so "C++", "C#" and
+# "node.js" stay distinct from "C" and "node"
+_SENTENCE_PUNCTUATION = "?!.,;:\"'()[]{}\u00bf\u00a1\u2018\u2019\u201c\u201d"
+
+
+def normalize_query(query: str) -> str:
+    """Cache key for a query: case-folded, sentence punctuation stripped, whitespace collapsed."""
+    words = (word.strip(_SENTENCE_PUNCTUATION) for word in query.casefold().split())
+    return " ".join(word for word in words if word)
+
+
+def normalize_url(url: str) -> str:
+    """De-duplication key for a URL: host and path without scheme, "www.", trailing slash or fragment."""
+    parts = urlsplit(url.strip())
+    path = parts.path.rstrip("/")
+    return urlunsplit(("", parts.netloc.lower().removeprefix("www."), path, parts.query, ""))
+
+
+class SearchResultCache:
+    """SQLite-backed search results with a time-to-live."""
+
+    def __init__(self, path: str = "search_cache.sqlite", ttl: float = 30 * 60):
+        self.ttl = ttl
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS search_results ("
+            "key TEXT PRIMARY KEY, results TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+        self.purge_expired()
+
+    def get(self, key: str) -> Optional[List[dict]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT results, created_at FROM search_results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or time.time() - row[1] > self.ttl:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            return json.loads(row[0])
+
+    def put(self, key: str, results: List[dict]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_results (key, results, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(results), time.time()),
+            )
+            self._conn.commit()
+
+    def purge_expired(self) -> int:
+        """Deletes expired entries and returns how many were removed."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM search_results WHERE created_at < ?", (time.time() - self.ttl,)
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+
+class CachedSearch:
+    """Runs a search backend through a `SearchResultCache`.
+
+    Concurrent misses for the same key share one backend call. Only list
+    results are cached; anything else is returned to the caller as is.
+    """
+
+    def __init__(self, backend: SearchBackend, cache: SearchResultCache):
+        self.backend = backend
+        self.cache = cache
+        self._in_flight: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, query: str) -> Any:
+        key = normalize_query(query)
+        while True:
+            results = self.cache.get(key)
+            if results is not None:
+                return results
+            with self._lock:
+                event = self._in_flight.get(key)
+                if event is None:
+                    event = self._in_flight[key] = threading.Event()
+                    break
+            # Another thread is fetching this key; wait and read its result
+            event.wait()
+
+        try:
+            results = self.backend(query)
+            if isinstance(results, list):
+                self.cache.put(key, results)
+            return results
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            event.set()
+
+
+def make_search_tools(search: CachedSearch, max_workers: int = 4) -> list:
+    """Builds the `web_search` and `multi_search` tools on top of a cached search."""
+
+    @tool
+    def web_search(query: str) -> List[dict]:
+        """Search the web. Returns a list of results with url and content."""
+        return search(query)
+
+    @tool
+    def multi_search(queries: List[str]) -> List[dict]:
+        """Search the web for several queries at once, e.g. different phrasings or
+        sub-questions. Returns the combined results without duplicate URLs."""
+        # Queries that only differ in case or punctuation are searched once
+        unique = list({normalize_query(q): q for q in queries}.values())
+        # A pool per call: its threads are gone once the tool returns
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(unique) or 1), thread_name_prefix="search") as pool:
+            found = list(pool.map(search, unique))
+        merged, seen = [], set()
+        for query, results in zip(unique, found):
+            if not isinstance(results, list):
+                merged.append({"query": query, "error": str(results)})
+                continue
+            for result in results:
+                url = normalize_url(result.get("url", ""))
+                if url and url in seen:
+                    continue
+                seen.add(url)
+                merged.append(result)
+        return merged
+
+    return [web_search, multi_search]
@@ -0,0 +1,433 @@
+"""
+Bounded session storage for long-lived chat workers.
+
+`SessionStore` keeps one value per session id (a message list, a thread's
+checkpoints, ...) and holds memory steady as sessions come and go:
+1. Idle TTL: sessions untouched for `idle_ttl` seconds are dropped, whether
+   they are resident or spilled
+2. LRU cap: at most `max_sessions` sessions stay resident; the least
+   recently used ones are spilled to `spill_dir`
+3. Memory pressure: when the estimated size of the resident sessions goes
+   over `max_resident_bytes`, cold sessions are spilled until it fits
+
+A spilled session is rehydrated from disk on its next access. Spill files
+left in `spill_dir` by an earlier process can still be read back, and expire
+by their modification time; torn temp files are removed on start. `metrics()`
+reports resident versus spilled sessions.
+
+`SessionStoreSaver` applies the same policy to the threads of an
+`InMemorySaver`, so a checkpointed app only keeps its recent threads in
+memory. A thread's size is tracked from the bytes each write adds.
+
+A store bounds the number and total size of sessions, not one session:
+chat loops cap each history with `trim_history`.
+"""
+
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from langchain_core.messages import trim_messages
+from langgraph.checkpoint.memory import InMemorySaver
+
+_MISSING = object()
+
+
+def pickled_size(value: Any) -> int:
+    """Default size estimate: the session's pickled size in bytes."""
+    return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def trim_history(messages: list, max_messages: int) -> list:
+    """Keeps the system message and the last `max_messages` messages, starting on a human turn."""
+    return trim_messages(
+        messages, max_tokens=max_messages, token_counter=len, strategy="last", start_on="human", include_system=True
+    )
+
+
+class SessionStore:
+    """LRU session map with idle expiry and spill-to-disk eviction."""
+
+    def __init__(
+        self,
+        spill_dir: str,
+        max_sessions: int = 1000,
+        idle_ttl: Optional[float] = None,
+        max_resident_bytes: Optional[int] = None,
+        size_of: Callable[[Any], int] = pickled_size,
+        on_evict: Optional[Callable[[str, str], None]] = None,
+    ):
+        self.spill_dir = Path(spill_dir)
+        self.spill_dir.mkdir(parents=True, exist_ok=True)
+        self.max_sessions = max(1, max_sessions)
+        self.idle_ttl = idle_ttl
+        self.max_resident_bytes = max_resident_bytes
+        self.size_of = size_of
+        self.on_evict = on_evict  # called with (session_id, "spilled" | "expired")
+        self.lock = threading.RLock()
+        # session_id -> [value, size, last_access], least recently used first
+        self._resident: "OrderedDict[str, list]" = OrderedDict()
+        # session_id -> last_access; spills happen in LRU order, so this is too
+        self._spilled: "OrderedDict[str, float]" = OrderedDict()
+        self._resident_bytes = 0
+        self._counters = {"spills": 0, "rehydrations": 0, "expired": 0}
+        # Spill files of earlier processes: path -> last access, oldest first.
+        # Their session ids are only known once they are read back
+        self._orphans: "OrderedDict[Path, float]" = OrderedDict()
+        self._adopt_spill_files()
+
+    def _adopt_spill_files(self) -> None:
+        for tmp_path in self.spill_dir.glob("*.tmp"):
+            tmp_path.unlink(missing_ok=True)
+        age_offset = time.time() - time.monotonic()
+        files = []
+        for path in self.spill_dir.glob("*.pkl"):
+            try:
+                files.append((path.stat().st_mtime - age_offset, path))
+            except OSError:
+                continue
+        for last_access, path in sorted(files):
+            self._orphans[path] = last_access
+
+    def _path(self, session_id: str) -> Path:
+        return self.spill_dir / (hashlib.sha1(session_id.encode()).hexdigest() + ".pkl")
+
+    def get(self, session_id: str, default: Any = None) -> Any:
+        """Returns the session's value, rehydrating it from disk if it was spilled."""
+        with self.lock:
+            now = time.monotonic()
+            entry = self._resident.get(session_id)
+            if entry is not None:
+                entry[2] = now
+                self._resident.move_to_end(session_id)
+            else:
+                value = self._rehydrate(session_id)
+                if value is _MISSING:
+                    self._sweep(now)
+                    return default
+                entry = self._admit(session_id, value, now)
+            self._sweep(now)
+            return entry[0]
+
+    def put(self, session_id: str, value: Any) -> None:
+        """Stores (or replaces) a session's value and re-applies the limits."""
+        with self.lock:
+            now = time.monotonic()
+            self._discard(session_id)
+            self._admit(session_id, value, now)
+            self._sweep(now)
+
+    def append(self, session_id: str, *items: Any) -> list:
+        """Appends items to a list-valued session, sizing only the new items."""
+        with self.lock:
+            now = time.monotonic()
+            entry = self._resident.get(session_id)
+            if entry is None:
+                value = self._rehydrate(session_id)
+                entry = self._admit(session_id, [] if value is _MISSING else value, now)
+            else:
+                entry[2] = now
+                self._resident.move_to_end(session_id)
+            added = sum(self.size_of(item) for item in items)
+            entry[0].extend(items)
+            entry[1] += added
+            self._resident_bytes += added
+            self._sweep(now)
+            return entry[0]
+
+    def delete(self, session_id: str) -> None:
+        with self.lock:
+            self._discard(session_id)
+
+    def __contains__(self, session_id: str) -> bool:
+        with self.lock:
+            return session_id in self._resident or session_id in self._spilled
+
+    def sweep(self) -> None:
+        """Applies the TTL and the limits now (they also apply on every get/put)."""
+        with self.lock:
+            self._sweep(time.monotonic())
+
+    def metrics(self) -> Dict[str, int]:
+        """Resident versus spilled sessions, resident bytes and eviction counters."""
+        with self.lock:
+            return {
+                "resident": len(self._resident),
+                "spilled": len(self._spilled) + len(self._orphans),
+                "resident_bytes": self._resident_bytes,
+                **self._counters,
+            }
+
+    def grow(self, session_id: str, added: int) -> bool:
+        """Adds `added` bytes to a resident session's size without measuring it again.
+
+        Returns False (and changes nothing) if the session is not resident.
+        """
+        with self.lock:
+            entry = self._resident.get(session_id)
+            if entry is None:
+                return False
+            now = time.monotonic()
+            entry[1] += added
+            entry[2] = now
+            self._resident.move_to_end(session_id)
+            self._resident_bytes += added
+            self._sweep(now)
+            return True
+
+    def _admit(self, session_id: str, value: Any, now: float) -> list:
+        entry = [value, self.size_of(value), now]
+        self._resident[session_id] = entry
+        self._resident_bytes += entry[1]
+        return entry
+
+    def _discard(self, session_id: str) -> None:
+        entry = self._resident.pop(session_id, None)
+        if entry is not None:
+            self._resident_bytes -= entry[1]
+        # A session that is not resident may still have a spill file, possibly
+        # left by an earlier process
+        if self._spilled.pop(session_id, None) is not None or entry is None:
+            path = self._path(session_id)
+            self._orphans.pop(path, None)
+            path.unlink(missing_ok=True)
+
+    def _rehydrate(self, session_id: str) -> Any:
+        path = self._path(session_id)
+        if session_id not in self._spilled and not path.exists():
+            return _MISSING
+        try:
+            with open(path, "rb") as f:
+                stored_id, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self._spilled.pop(session_id, None)
+            return _MISSING
+        if stored_id != session_id:  # hash collision
+            return _MISSING
+        self._spilled.pop(session_id, None)
+        self._orphans.pop(path, None)
+        path.unlink(missing_ok=True)
+        self._counters["rehydrations"] += 1
+        return value
+
+    def _spill(self, session_id: str) -> None:
+        value, size, last_access = self._resident.pop(session_id)
+        self._resident_bytes -= size
+        # Write to a temp file first so a crash never leaves a torn spill file
+        path = self._path(session_id)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump((session_id, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_path.replace(path)
+        self._spilled[session_id] = last_access
+        self._counters["spills"] += 1
+        if self.on_evict:
+            self.on_evict(session_id, "spilled")
+
+    def _expire(self, session_id: str) -> None:
+        self._discard(session_id)
+        self._counters["expired"] += 1
+        if self.on_evict:
+            self.on_evict(session_id, "expired")
+
+    def _sweep(self, now: float) -> None:
+        if self.idle_ttl is not None:
+            cutoff = now - self.idle_ttl
+            # Resident sessions are ordered by last access, oldest first
+            while self._resident:
+                session_id, entry = next(iter(self._resident.items()))
+                if entry[2] > cutoff:
+                    break
+                self._expire(session_id)
+            while self._spilled:
+                session_id, last_access = next(iter(self._spilled.items()))
+                if last_access > cutoff:
+                    break
+                self._expire(session_id)
+            while self._orphans:
+                path, last_access = next(iter(self._orphans.items()))
+                if last_access > cutoff:
+                    break
+                self._orphans.pop(path)
+                path.unlink(missing_ok=True)
+                self._counters["expired"] += 1
+
+        while len(self._resident) > self.max_sessions:
+            self._spill(next(iter(self._resident)))
+
+        if self.max_resident_bytes is not None:
+            # Always keep the most recently used session resident
+            while self._resident_bytes > self.max_resident_bytes and len(self._resident) > 1:
+                self._spill(next(iter(self._resident)))
+
+
+class ThreadPartitionedDict(dict):
+    """`InMemorySaver.writes`/`.blobs` stand-in whose keys start with a thread id.
+
+    Entries are grouped per thread so one thread's data can be moved out and
+    back in without scanning every key.
+    """
+
+    def __init__(self, default_factory: Optional[Callable[[], Any]] = None):
+        super().__init__()
+        self.default_factory = default_factory
+        self.by_thread: Dict[str, dict] = defaultdict(dict)
+
+    def __missing__(self, key):
+        if self.default_factory is None:
+            raise KeyError(key)
+        self[key] = value = self.default_factory()
+        return value
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.by_thread[key[0]][key] = value
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        thread = self.by_thread.get(key[0])
+        if thread is not None:
+            thread.pop(key, None)
+
+    def detach(self, thread_id: str) -> dict:
+        entries = self.by_thread.pop(thread_id, {})
+        for key in entries:
+            super().__delitem__(key)
+        return entries
+
+    def attach(self, thread_id: str, entries: dict) -> None:
+        for key, value in entries.items():
+            self[key] = value
+
+
+class SessionStoreSaver(InMemorySaver):
+    """InMemorySaver that expires idle threads and spills cold ones to disk.
+
+    Each thread's checkpoints, pending writes and channel blobs are moved to
+    `spill_dir` together and loaded back the next time the thread is read or
+    written. Listing checkpoints without a thread id only covers resident
+    threads.
+    """
+
+    def __init__(
+        self,
+        spill_dir: str,
+        max_threads: int = 1000,
+        idle_ttl: Optional[float] = None,
+        max_resident_bytes: Optional[int] = None,
+        **kwargs: Any,
+    ):
+        super().__init__(**kwargs)
+        self.writes = ThreadPartitionedDict(dict)
+        self.blobs = ThreadPartitionedDict()
+        self.sessions = SessionStore(
+            spill_dir,
+            max_sessions=max_threads,
+            idle_ttl=idle_ttl,
+            max_resident_bytes=max_resident_bytes,
+            size_of=self._thread_size,
+            on_evict=self._detach_thread,
+        )
+
+    @staticmethod
+    def _thread_size(bundle: tuple) -> int:
+        # Everything in the saver is already serialized, so count those bytes
+        storage, writes, blobs = bundle
+        size = 0
+        for checkpoints in storage.values():
+            for checkpoint, metadata, _ in checkpoints.values():
+                size += len(checkpoint[1]) + len(metadata[1])
+        for task_writes in writes.values():
+            for write in task_writes.values():
+                size += len(write[2][1])
+        for blob in blobs.values():
+            size += len(blob[1])
+        return size
+
+    def _bundle(self, thread_id: str) -> tuple:
+        return (self.storage[thread_id], self.writes.by_thread[thread_id], self.blobs.by_thread[thread_id])
+
+    def _detach_thread(self, thread_id: str, reason: str) -> None:
+        self.storage.pop(thread_id, None)
+        self.writes.detach(thread_id)
+        self.blobs.detach(thread_id)
+
+    def _load_thread(self, config) -> Optional[str]:
+        """Touches the config's thread, rehydrating it if it was spilled."""
+        thread_id = ((config or {}).get("configurable") or {}).get("thread_id")
+        if thread_id is None:
+            return None
+        thread_id = str(thread_id)
+        if thread_id in self.storage or thread_id in self.writes.by_thread:
+            self.sessions.get(thread_id)
+            return thread_id
+        bundle = self.sessions.get(thread_id)
+        if bundle is not None:
+            storage, writes, blobs = bundle
+            self.storage[thread_id] = storage
+            self.writes.attach(thread_id, writes)
+            self.blobs.attach(thread_id, blobs)
+            # Track the live dicts rather than the unpickled copies (measured
+            # once here; writes then add their own bytes)
+            self.sessions.put(thread_id, self._bundle(thread_id))
+        return thread_id
+
+    def _track_thread(self, thread_id: str, added: int) -> None:
+        """Adds a write's bytes to its thread's size and applies the limits."""
+        if not self.sessions.grow(thread_id, added):
+            # A new thread: its first write is all there is to measure
+            self.sessions.put(thread_id, self._bundle(thread_id))
+
+    def _checkpoint_bytes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str, new_versions) -> int:
+        size = 0
+        saved = self.storage.get(thread_id, {}).get(checkpoint_ns, {}).get(checkpoint_id)
+        if saved is not None:
+            size += len(saved[0][1]) + len(saved[1][1])
+        for channel, version in new_versions.items():
+            blob = self.blobs.get((thread_id, checkpoint_ns, channel, version))
+            if blob is not None:
+                size += len(blob[1])
+        return size
+
+    def _writes_bytes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> int:
+        task_writes = self.writes.get((thread_id, checkpoint_ns, checkpoint_id)) or {}
+        return sum(len(write[2][1]) for write in task_writes.values())
+
+    def get_tuple(self, config):
+        with self.sessions.lock:
+            self._load_thread(config)
+            return super().get_tuple(config)
+
+    def list(self, config, **kwargs):
+        with self.sessions.lock:
+            self._load_thread(config)
+            # Materialized so the lock is not held while the caller iterates
+            return iter(list(super().list(config, **kwargs)))
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        with self.sessions.lock:
+            thread_id = self._load_thread(config)
+            key = (thread_id, config["configurable"].get("checkpoint_ns", ""), checkpoint["id"], new_versions)
+            # Measure only what this write replaces and adds
+            before = self._checkpoint_bytes(*key)
+            next_config = super().put(config, checkpoint, metadata, new_versions)
+            self._track_thread(thread_id, self._checkpoint_bytes(*key) - before)
+            return next_config
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        with self.sessions.lock:
+            thread_id = self._load_thread(config)
+            configurable = config["configurable"]
+            key = (thread_id, configurable.get("checkpoint_ns", ""), configurable["checkpoint_id"])
+            before = self._writes_bytes(*key)
+            super().put_writes(config, writes, task_id, task_path)
+            self._track_thread(thread_id, self._writes_bytes(*key) - before)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self.sessions.lock:
+            self._detach_thread(str(thread_id), "deleted")
+            self.sessions.delete(str(thread_id))
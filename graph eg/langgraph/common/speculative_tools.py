@@ -0,0 +1,169 @@
+"""
+Speculative tool execution for ReAct agents.
+
+`create_speculative_react_agent` builds the same agent <-> tools loop as
+`create_react_agent`, but the agent node streams the model response and
+starts each tool call on a thread pool as soon as its arguments are complete
+JSON, while the rest of the message is still being generated:
+1. Independent tool calls in one message run in parallel
+2. When the message is finished, speculative runs that do not match a final
+   tool call (same id, name and arguments) are discarded; the rest are kept
+   under the id of that message, so concurrent runs never share them
+3. The tools node reuses matching speculative results and runs any remaining
+   calls itself. Both go through a `ToolNode`, so results and errors are
+   the same ToolMessages `create_react_agent` produces
+
+Only tools without side effects should be speculated; pass `speculate=` to
+restrict the set.
+"""
+
+import json
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, SystemMessage, ToolMessage, message_chunk_to_message
+from langchain_core.runnables import RunnableConfig
+from langgraph.graph import END, START, MessagesState, StateGraph
+from langgraph.prebuilt import ToolNode, tools_condition
+
+from common.graph_compile import compile_graph
+
+
+def _call_key(call: dict) -> Tuple[str, str, str]:
+    return call["id"], call["name"], json.dumps(call["args"], sort_keys=True)
+
+
+class SpeculativeToolRunner:
+    """Runs tool calls on a thread pool and hands out results by model message and tool call id."""
+
+    def __init__(
+        self,
+        tools: Sequence[Any],
+        max_workers: int = 8,
+        speculate: Optional[Iterable[str]] = None,
+        max_pending: int = 1024,
+    ):
+        self.tool_node = ToolNode(tools)
+        self.tools_by_name = self.tool_node.tools_by_name
+        self.speculate = set(speculate) if speculate is not None else set(self.tools_by_name)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+        # Matching speculative runs per finished model message, oldest first.
+        # Messages whose tools node never runs (an interrupt, a crash) are
+        # dropped once more than max_pending are waiting
+        self.pending: "OrderedDict[str, Dict[str, Future]]" = OrderedDict()
+        self.max_pending = max_pending
+        self.stats = {"speculated": 0, "reused": 0, "discarded": 0}
+        self._lock = threading.Lock()
+
+    def _run(self, call: dict, config: Optional[RunnableConfig]) -> Optional[ToolMessage]:
+        output = self.tool_node.invoke([{**call, "type": "tool_call"}], config)
+        # Tools that return a Command are run again by the tools node
+        return output["messages"][0] if isinstance(output, dict) else None
+
+    def _discard(self, futures: Iterable[Future]) -> None:
+        for future in futures:
+            future.cancel()
+            self.stats["discarded"] += 1
+
+    def start(self, call: dict, config: Optional[RunnableConfig] = None) -> Optional[Future]:
+        """Starts a tool call speculatively, before the model message is finished."""
+        if call["name"] not in self.speculate or call["name"] not in self.tools_by_name:
+            return None
+        with self._lock:
+            self.stats["speculated"] += 1
+        return self.executor.submit(self._run, call, config)
+
+    def reconcile(self, message_id: str, started: Dict[Tuple[str, str, str], Future], tool_calls: List[dict]) -> None:
+        """Keeps the speculative runs the finished message asked for and discards the rest."""
+        wanted = {_call_key(call) for call in tool_calls}
+        kept = {key[0]: future for key, future in started.items() if key in wanted}
+        with self._lock:
+            self._discard(future for key, future in started.items() if key not in wanted)
+            if kept:
+                self.pending[message_id] = kept
+            while len(self.pending) > self.max_pending:
+                self._discard(self.pending.popitem(last=False)[1].values())
+
+    def collect(self, message: AIMessage, config: Optional[RunnableConfig] = None) -> Any:
+        """Returns the tools node update, reusing speculative results where possible."""
+        with self._lock:
+            speculated = self.pending.pop(message.id, {})
+        results: Dict[str, ToolMessage] = {}
+        for call_id, future in speculated.items():
+            result = future.result()
+            if result is not None:
+                results[call_id] = result
+        with self._lock:
+            self.stats["reused"] += len(results)
+        remaining = [{**call, "type": "tool_call"} for call in message.tool_calls if call["id"] not in results]
+        if not remaining:
+            return {"messages": [results[call["id"]] for call in message.tool_calls]}
+        output = self.tool_node.invoke(remaining, config)
+        if not isinstance(output, dict):
+            # Some tools returned a Command; pass those through as they are
+            return [{"messages": list(results.values())}] + output
+        results.update((result.tool_call_id, result) for result in output["messages"])
+        return {"messages": [results[call["id"]] for call in message.tool_calls]}
+
+
+def create_speculative_react_agent(
+    model,
+    tools: Sequence[Any],
+    prompt: Optional[str] = None,
+    speculate: Optional[Iterable[str]] = None,
+    max_workers: int = 8,
+):
+    """Builds a ReAct graph that pre-executes tool calls while the model is still streaming."""
+    runner = SpeculativeToolRunner(tools, max_workers=max_workers, speculate=speculate)
+    model_with_tools = model.bind_tools(tools)
+    system_message = SystemMessage(content=prompt) if prompt else None
+
+    def agent(state: MessagesState, config: RunnableConfig):
+        messages = ([system_message] if system_message else []) + state["messages"]
+        message = None
+        indexes = set()
+        # Speculative runs of this model call only, keyed by (id, name, args)
+        started: Dict[Tuple[str, str, str], Future] = {}
+        try:
+            for chunk in model_with_tools.stream(messages, config):
+                message = chunk if message is None else message + chunk
+                for call in message.tool_call_chunks:
+                    index = call.get("index")
+                    if index in indexes or not call.get("name") or not call.get("id"):
+                        continue
+                    try:
+                        args = json.loads(call.get("args") or "")
+                    except ValueError:
+                        continue  # arguments still streaming
+                    if isinstance(args, dict):
+                        indexes.add(index)
+                        call = {"id": call["id"], "name": call["name"], "args": args}
+                        future = runner.start(call, config)
+                        if future is not None:
+                            started[_call_key(call)] = future
+            if message is None:
+                raise ValueError("The model returned an empty stream")
+        except BaseException:
+            runner.reconcile("", started, [])
+            raise
+        final = message_chunk_to_message(message)
+        if final.id is None:
+            final.id = str(uuid.uuid4())
+        runner.reconcile(final.id, started, final.tool_calls)
+        return {"messages": [final]}
+
+    def run_tools(state: MessagesState, config: RunnableConfig):
+        return runner.collect(state["messages"][-1], config)
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("agent", agent)
+    builder.add_node("tools", run_tools)
+    builder.add_edge(START, "agent")
+    builder.add_conditional_edges("agent", tools_condition, {"tools": "tools", END: END})
+    builder.add_edge("tools", "agent")
+    graph = compile_graph(builder)
+    graph.tool_runner = runner
+    return graph
@@ -0,0 +1,152 @@
+"""
+Durable checkpointer backed by a local SQLite file.
+
+`SqliteCheckpointSaver` is an `InMemorySaver` that writes every checkpoint,
+pending write and channel blob through to SQLite as it is saved. A thread
+is loaded from disk the first time it is read or written in a process, so a
+run interrupted by a crash or a restart can be resumed from its last
+finished superstep by a new process: invoke the graph again with the same
+`thread_id` and `None` as input.
+
+Threads stay in memory after they are used; `release(thread_id)` drops a
+thread that is finished or waiting (it is loaded again on the next access),
+so idle threads cost disk space only. Listing checkpoints without a thread
+id only covers threads loaded in this process.
+"""
+
+import sqlite3
+import threading
+from typing import Any, List, Optional
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+from common.session_store import ThreadPartitionedDict
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS checkpoints ("
+    "thread_id TEXT, ns TEXT, checkpoint_id TEXT, checkpoint_type TEXT, checkpoint BLOB, "
+    "metadata_type TEXT, metadata BLOB, parent_id TEXT, PRIMARY KEY (thread_id, ns, checkpoint_id))",
+    "CREATE TABLE IF NOT EXISTS writes ("
+    "thread_id TEXT, ns TEXT, checkpoint_id TEXT, task_id TEXT, idx INTEGER, channel TEXT, "
+    "value_type TEXT, value BLOB, task_path TEXT, PRIMARY KEY (thread_id, ns, checkpoint_id, task_id, idx))",
+    "CREATE TABLE IF NOT EXISTS blobs ("
+    "thread_id TEXT, ns TEXT, channel TEXT, version TEXT, value_type TEXT, value BLOB, "
+    "PRIMARY KEY (thread_id, ns, channel, version))",
+]
+
+
+class SqliteCheckpointSaver(InMemorySaver):
+    """InMemorySaver with write-through persistence to SQLite."""
+
+    def __init__(self, path: str = "checkpoints.sqlite", **kwargs: Any):
+        super().__init__(**kwargs)
+        self.writes = ThreadPartitionedDict(dict)
+        self.blobs = ThreadPartitionedDict()
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+        self._lock = threading.RLock()
+        self._loaded = set()
+
+    def _load_thread(self, config) -> Optional[str]:
+        """Loads the config's thread from disk unless it is already in memory."""
+        thread_id = ((config or {}).get("configurable") or {}).get("thread_id")
+        if thread_id is None:
+            return None
+        thread_id = str(thread_id)
+        if thread_id in self._loaded:
+            return thread_id
+        self._loaded.add(thread_id)
+        for ns, cid, ctype, ckpt, mtype, meta, parent in self._conn.execute(
+            "SELECT ns, checkpoint_id, checkpoint_type, checkpoint, metadata_type, metadata, parent_id "
+            "FROM checkpoints WHERE thread_id = ?", (thread_id,)
+        ):
+            self.storage[thread_id][ns][cid] = ((ctype, ckpt), (mtype, meta), parent)
+        for ns, cid, task_id, idx, channel, vtype, value, task_path in self._conn.execute(
+            "SELECT ns, checkpoint_id, task_id, idx, channel, value_type, value, task_path "
+            "FROM writes WHERE thread_id = ?", (thread_id,)
+        ):
+            self.writes[(thread_id, ns, cid)][(task_id, idx)] = (task_id, channel, (vtype, value), task_path)
+        for ns, channel, version, vtype, value in self._conn.execute(
+            "SELECT ns, channel, version, value_type, value FROM blobs WHERE thread_id = ?", (thread_id,)
+        ):
+            self.blobs[(thread_id, ns, channel, _version(version))] = (vtype, value)
+        return thread_id
+
+    def get_tuple(self, config):
+        with self._lock:
+            self._load_thread(config)
+            return super().get_tuple(config)
+
+    def list(self, config, **kwargs):
+        with self._lock:
+            self._load_thread(config)
+            # Materialized so the lock is not held while the caller iterates
+            return iter(list(super().list(config, **kwargs)))
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        with self._lock:
+            thread_id = self._load_thread(config)
+            next_config = super().put(config, checkpoint, metadata, new_versions)
+            ns = config["configurable"]["checkpoint_ns"]
+            cid = checkpoint["id"]
+            (ctype, ckpt), (mtype, meta), parent = self.storage[thread_id][ns][cid]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, ns, cid, ctype, ckpt, mtype, meta, parent),
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (thread_id, ns, channel, str(version), *self.blobs[(thread_id, ns, channel, version)])
+                    for channel, version in new_versions.items()
+                ],
+            )
+            self._conn.commit()
+            return next_config
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        with self._lock:
+            thread_id = self._load_thread(config)
+            super().put_writes(config, writes, task_id, task_path)
+            ns = config["configurable"]["checkpoint_ns"]
+            cid = config["configurable"]["checkpoint_id"]
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (thread_id, ns, cid, task, idx, channel, value[0], value[1], path)
+                    for (task, idx), (_, channel, value, path) in self.writes[(thread_id, ns, cid)].items()
+                    if task == task_id
+                ],
+            )
+            self._conn.commit()
+
+    def release(self, thread_id: str) -> None:
+        """Drops a thread from memory; its checkpoints stay on disk."""
+        thread_id = str(thread_id)
+        with self._lock:
+            self.storage.pop(thread_id, None)
+            self.writes.detach(thread_id)
+            self.blobs.detach(thread_id)
+            self._loaded.discard(thread_id)
+
+    def delete_thread(self, thread_id: str) -> None:
+        thread_id = str(thread_id)
+        with self._lock:
+            self.release(thread_id)
+            for table in ("checkpoints", "writes", "blobs"):
+                self._conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+            self._conn.commit()
+
+    def thread_ids(self) -> List[str]:
+        """Every thread with a checkpoint on disk."""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT thread_id FROM checkpoints")]
+
+
+def _version(text: str):
+    # Channel versions are ints or strings, depending on the saver's get_next_version
+    return int(text) if text.lstrip("-").isdigit() else text
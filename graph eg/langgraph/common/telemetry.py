@@ -0,0 +1,509 @@
+"""
+OpenTelemetry-compatible tracing and metrics for compiled graphs.
+
+`instrument_graph(graph)` attaches a LangChain callback handler to a compiled
+graph (and hooks its checkpointer, if any), so every run emits:
+- spans: the graph run, each node, each LLM call, each tool call and each
+  checkpoint write, linked parent to child within one trace; nodes served
+  from the graph's node cache get a span with `langgraph.cache_hit`
+- counters: LLM calls and tokens (input/output), provider prompt-cache hits,
+  tool calls and retries (retried node tasks and `with_retry` attempts),
+  node cache hits/misses, plus hit/miss counters of any cache registered
+  with `observe_cache`
+
+Spans and counters are buffered and exported in the OTLP JSON format:
+1. To an OTLP/HTTP collector when `OTEL_EXPORTER_OTLP_ENDPOINT` is set
+   (e.g. a local collector on http://localhost:4318)
+2. Otherwise, or when the collector cannot be reached, to the JSON-lines
+   file `TELEMETRY_FILE` (default `telemetry.jsonl`); `TELEMETRY_FILE=-`
+   prints a short line per span to the console instead
+
+`OTEL_SDK_DISABLED=true` turns all of it off: `instrument_graph` leaves the
+graph as it is, and no export thread is started and no file is written.
+
+Each run's root span is kept in a context variable, so checkpoint writes
+and node cache hits are attached to the run they belong to, also when
+several runs execute at once (LangGraph runs tasks in copies of the
+caller's context).
+
+Only the standard library is used, so this works offline and without the
+OpenTelemetry SDK installed.
+"""
+
+import atexit
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+import urllib.request
+from json.encoder import encode_basestring_ascii as _quote
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables.config import merge_configs
+
+# Root span of the graph run executing in the current context
+_current_root: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("telemetry_root", default=None)
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_CLIENT = 3
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+
+class Span:
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "status", "message")
+
+    def __init__(self, name: str, kind: int, trace_id: int, parent_id: Optional[int], attributes: Dict[str, Any]):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = random.getrandbits(64)  # ids are hex-encoded on export
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.status = STATUS_OK
+        self.message = ""
+
+
+def _attributes(attributes: Dict[str, Any]) -> List[dict]:
+    """OTLP key/value list for a flat attribute dict."""
+    encoded = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            encoded.append({"key": key, "value": {"boolValue": value}})
+        elif isinstance(value, int):
+            encoded.append({"key": key, "value": {"intValue": str(value)}})
+        elif isinstance(value, float):
+            encoded.append({"key": key, "value": {"doubleValue": value}})
+        else:
+            encoded.append({"key": key, "value": {"stringValue": str(value)}})
+    return encoded
+
+
+# JSON text of (key, str value) attributes. Node names, models and thread ids
+# repeat in every run; other values (steps, token counts) are not kept
+_string_attributes: Dict[Tuple[str, str], str] = {}
+_STRING_ATTRIBUTES_MAX = 4096
+
+
+def _attribute_json(key: str, value: Any) -> str:
+    """One OTLP key/value pair as JSON text, as `_attributes` encodes it."""
+    if isinstance(value, str):
+        text = _string_attributes.get((key, value))
+        if text is None:
+            text = f'{{"key":{_quote(key)},"value":{{"stringValue":{_quote(value)}}}}}'
+            if len(_string_attributes) < _STRING_ATTRIBUTES_MAX:
+                _string_attributes[(key, value)] = text
+        return text
+    if isinstance(value, bool):
+        return f'{{"key":{_quote(key)},"value":{{"boolValue":{"true" if value else "false"}}}}}'
+    if isinstance(value, int):
+        return f'{{"key":{_quote(key)},"value":{{"intValue":{_quote(str(value))}}}}}'
+    if isinstance(value, float):
+        return f'{{"key":{_quote(key)},"value":{{"doubleValue":{json.dumps(value)}}}}}'
+    return _attribute_json(key, str(value))
+
+
+def _span_json(span: Span) -> str:
+    # Written out by hand: building dicts for json.dumps costs over twice as much
+    parent = f"{span.parent_id:016x}" if span.parent_id else ""
+    attributes = ",".join([_attribute_json(key, value) for key, value in span.attributes.items()])
+    return (
+        f'{{"traceId":"{span.trace_id:032x}","spanId":"{span.span_id:016x}","parentSpanId":"{parent}",'
+        f'"name":{_quote(span.name)},"kind":{span.kind},'
+        f'"startTimeUnixNano":"{span.start_ns}","endTimeUnixNano":"{span.end_ns}","attributes":[{attributes}],'
+        f'"status":{{"code":{span.status},"message":{_quote(span.message)}}}}}'
+    )
+
+
+def _dumps(body: dict) -> str:
+    return json.dumps(body, separators=(",", ":"))
+
+
+def otlp_payloads(service_name: str, spans: List[Span], counters: Dict[Tuple, int], start_ns: int) -> Tuple[str, str]:
+    """Builds the OTLP JSON bodies for /v1/traces and /v1/metrics."""
+    resource = {"attributes": _attributes({"service.name": service_name})}
+    scope = {"name": "common.telemetry"}
+    traces = (
+        f'{{"resourceSpans":[{{"resource":{_dumps(resource)},"scopeSpans":[{{"scope":{_dumps(scope)},'
+        f'"spans":[{",".join([_span_json(span) for span in spans])}]}}]}}]}}'
+    )
+
+    now = str(time.time_ns())
+    points: Dict[str, list] = {}
+    for (name, attrs), value in counters.items():
+        points.setdefault(name, []).append({
+            "asInt": str(value),
+            "attributes": _attributes(dict(attrs)),
+            "startTimeUnixNano": str(start_ns),
+            "timeUnixNano": now,
+        })
+    metrics = {"resourceMetrics": [{"resource": resource, "scopeMetrics": [{"scope": scope, "metrics": [
+        # Cumulative temporality: every export carries the running totals
+        {"name": name, "sum": {"dataPoints": data, "aggregationTemporality": 2, "isMonotonic": True}}
+        for name, data in points.items()
+    ]}]}]}
+    return traces, _dumps(metrics)
+
+
+class FileExporter:
+    """Appends OTLP JSON payloads, one per line, to a local file."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, traces: str, metrics: str, spans: List[Span]) -> None:
+        with open(self.path, "a") as f:
+            if spans:
+                f.write(traces + "\n")
+            f.write(metrics + "\n")
+
+
+class ConsoleExporter:
+    """Prints one line per span and the counters."""
+
+    def export(self, traces: str, metrics: str, spans: List[Span]) -> None:
+        for span in spans:
+            status = "" if span.status == STATUS_OK else f" ERROR {span.message}"
+            print(f"[TRACE] {span.name} {(span.end_ns - span.start_ns) / 1e6:.1f} ms{status}")
+        totals = {}
+        for metric in json.loads(metrics)["resourceMetrics"][0]["scopeMetrics"][0]["metrics"]:
+            totals[metric["name"]] = sum(int(p["asInt"]) for p in metric["sum"]["dataPoints"])
+        print(f"[METRICS] {json.dumps(totals)}")
+
+
+class OTLPHttpExporter:
+    """Posts OTLP JSON to a collector, falling back to another exporter on failure."""
+
+    def __init__(self, endpoint: str, fallback, timeout: float = 2.0):
+        self.endpoint = endpoint.rstrip("/")
+        self.fallback = fallback
+        self.timeout = timeout
+
+    def _post(self, path: str, body: str) -> None:
+        request = urllib.request.Request(
+            self.endpoint + path,
+            data=body.encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+    def export(self, traces: str, metrics: str, spans: List[Span]) -> None:
+        try:
+            if spans:
+                self._post("/v1/traces", traces)
+            self._post("/v1/metrics", metrics)
+        except OSError as e:
+            print(f"[TELEMETRY] OTLP export to {self.endpoint} failed ({e}); writing locally")
+            self.fallback.export(traces, metrics, spans)
+
+
+def telemetry_disabled() -> bool:
+    return os.getenv("OTEL_SDK_DISABLED", "").strip().lower() == "true"
+
+
+def exporter_from_env():
+    path = os.getenv("TELEMETRY_FILE", "telemetry.jsonl")
+    local = ConsoleExporter() if path == "-" else FileExporter(path)
+    endpoint = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+    return OTLPHttpExporter(endpoint, fallback=local) if endpoint else local
+
+
+class Telemetry:
+    """Span and counter buffer, exported in batches by a background thread.
+
+    A disabled instance starts no thread and exports nothing.
+    """
+
+    def __init__(
+        self,
+        service_name: str = "langgraph-eg",
+        exporter=None,
+        batch_size: int = 512,
+        flush_interval: float = 5.0,
+        enabled: bool = True,
+    ):
+        self.service_name = service_name
+        self.enabled = enabled
+        self.exporter = exporter if exporter is not None or not enabled else exporter_from_env()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.start_ns = time.time_ns()
+        self.counters: Dict[Tuple, int] = {}
+        self._spans: List[Span] = []
+        self._caches: Dict[str, Callable[[], Dict[str, int]]] = {}
+        self._exported: Dict[Tuple, int] = {}
+        self._lock = threading.Lock()
+        self._export_lock = threading.Lock()
+        self._wake = threading.Event()
+        if enabled:
+            threading.Thread(target=self._export_loop, name="telemetry-export", daemon=True).start()
+            atexit.register(self.flush)
+
+    def _export_loop(self) -> None:
+        # Exporting (JSON encoding, file or network I/O) stays off the graph's threads
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def start_span(
+        self, name: str, parent: Optional[Span] = None, kind: int = SPAN_KIND_INTERNAL, attributes: Optional[Dict[str, Any]] = None
+    ) -> Span:
+        if parent is None:
+            return Span(name, kind, random.getrandbits(128), None, attributes or {})
+        return Span(name, kind, parent.trace_id, parent.span_id, attributes or {})
+
+    def end_span(self, span: Span, error: Optional[BaseException] = None) -> None:
+        span.end_ns = time.time_ns()
+        if error is not None:
+            span.status = STATUS_ERROR
+            span.message = repr(error)
+        with self._lock:
+            self._spans.append(span)
+            full = len(self._spans) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def count(self, name: str, value: int = 1, **attributes: Any) -> None:
+        # Call sites pass attributes in a fixed order, so no sorting is needed
+        key = (name, tuple(attributes.items()))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe_cache(self, name: str, info: Callable[[], Dict[str, int]]) -> None:
+        """Exports `info()["hits"]`/`["misses"]` as cache.hits/cache.misses{cache=name}."""
+        self._caches[name] = info
+
+    def flush(self) -> None:
+        """Exports buffered spans and the current counters now."""
+        if not self.enabled:
+            return
+        with self._export_lock:
+            with self._lock:
+                spans, self._spans = self._spans, []
+                counters = dict(self.counters)
+            for name, info in self._caches.items():
+                stats = info()
+                for field in ("hits", "misses"):
+                    counters[(f"cache.{field}", (("cache", name),))] = stats.get(field, 0)
+            if not spans and counters == self._exported:
+                return  # nothing new since the last export
+            self._exported = counters
+            traces, metrics = otlp_payloads(self.service_name, spans, counters, self.start_ns)
+            self.exporter.export(traces, metrics, spans)
+
+
+class TelemetryCallbackHandler(BaseCallbackHandler):
+    """Turns LangChain/LangGraph callback events into spans and counters."""
+
+    run_inline = True
+
+    def __init__(self, telemetry: Telemetry):
+        self.telemetry = telemetry
+        # run_id.int -> (span, owned); runs that are not traced map to their
+        # parent's span. UUIDs hash in Python code, their int does not
+        self._runs: Dict[int, Tuple[Optional[Span], bool]] = {}
+        self._tasks_seen: Dict[int, set] = {}
+        # trace_id -> root span that was current before this run started
+        self._outer_roots: Dict[int, Optional[Span]] = {}
+
+    @staticmethod
+    def current_root() -> Optional[Span]:
+        """Root span of the run executing in the caller's context."""
+        return _current_root.get()
+
+    def _parent(self, parent_run_id) -> Optional[Span]:
+        entry = self._runs.get(parent_run_id.int) if parent_run_id is not None else None
+        return entry[0] if entry else None
+
+    def _end(self, run_id, error: Optional[BaseException] = None) -> Optional[Span]:
+        span, owned = self._runs.pop(run_id.int, (None, False))
+        if owned:
+            self.telemetry.end_span(span, error)
+            return span
+        return None
+
+    # Graph and node runs
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name") or "graph"
+        if parent_run_id is None:
+            span = self.telemetry.start_span(f"graph {name}")
+            # run_inline: this runs in the caller's thread and context
+            self._outer_roots[span.trace_id] = _current_root.get()
+            _current_root.set(span)
+            self._tasks_seen[span.trace_id] = set()
+            self._runs[run_id.int] = (span, True)
+            return
+        parent = self._parent(parent_run_id)
+        if metadata and metadata.get("langgraph_node") == name and tags and any(t.startswith("graph:step:") for t in tags):
+            span = self.telemetry.start_span(
+                f"node {name}", parent, attributes={"langgraph.node": name, "langgraph.step": metadata.get("langgraph_step", -1)}
+            )
+            # A task id seen twice in one run is a retry of that node
+            task = metadata.get("langgraph_checkpoint_ns")
+            seen = self._tasks_seen.get(span.trace_id)
+            if seen is not None and task:
+                if task in seen:
+                    self.telemetry.count("retries", kind="node", node=name)
+                seen.add(task)
+            self._runs[run_id.int] = (span, True)
+        else:
+            self._runs[run_id.int] = (parent, False)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        span = self._end(run_id)
+        if span is not None and span.parent_id is None:
+            self._close_root(span)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        span = self._end(run_id, error)
+        if span is not None and span.parent_id is None:
+            self._close_root(span)
+
+    def _close_root(self, span: Span) -> None:
+        outer = self._outer_roots.pop(span.trace_id, None)
+        if _current_root.get() is span:
+            _current_root.set(outer)
+        self._tasks_seen.pop(span.trace_id, None)
+
+    # LLM calls
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        self._start_llm(serialized, run_id, parent_run_id, metadata)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        self._start_llm(serialized, run_id, parent_run_id, metadata)
+
+    def _start_llm(self, serialized, run_id, parent_run_id, metadata) -> None:
+        metadata = metadata or {}
+        model = metadata.get("ls_model_name") or (serialized or {}).get("name", "llm")
+        span = self.telemetry.start_span(
+            f"llm {model}", self._parent(parent_run_id), SPAN_KIND_CLIENT,
+            {"gen_ai.system": metadata.get("ls_provider", ""), "gen_ai.request.model": model},
+        )
+        self._runs[run_id.int] = (span, True)
+        self.telemetry.count("llm.calls", model=model)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        span, _ = self._runs.get(run_id.int, (None, False))
+        if span is not None:
+            input_tokens = output_tokens = cache_read = 0
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    input_tokens += usage.get("input_tokens", 0)
+                    output_tokens += usage.get("output_tokens", 0)
+                    cache_read += (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+            model = span.attributes["gen_ai.request.model"]
+            span.attributes["gen_ai.usage.input_tokens"] = input_tokens
+            span.attributes["gen_ai.usage.output_tokens"] = output_tokens
+            self.telemetry.count("llm.tokens", input_tokens, model=model, type="input")
+            self.telemetry.count("llm.tokens", output_tokens, model=model, type="output")
+            if cache_read:
+                self.telemetry.count("cache.hits", cache="llm_prompt", model=model)
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    # Tool calls
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name", "tool")
+        span = self.telemetry.start_span(f"tool {name}", self._parent(parent_run_id), attributes={"tool.name": name})
+        self._runs[run_id.int] = (span, True)
+        self.telemetry.count("tool.calls", tool=name)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    def on_retry(self, retry_state, *, run_id, **kwargs):
+        self.telemetry.count("retries", kind="runnable")
+
+
+def _instrument_checkpointer(checkpointer, telemetry: Telemetry, handler: TelemetryCallbackHandler) -> None:
+    """Wraps a checkpointer's put/put_writes so each write becomes a span."""
+    if getattr(checkpointer, "_telemetry_instrumented", False):
+        return
+    for method in ("put", "put_writes"):
+        original = getattr(checkpointer, method)
+
+        def traced(config, *args, _original=original, _name=f"checkpoint.{method}", **kwargs):
+            thread_id = str((config.get("configurable") or {}).get("thread_id", ""))
+            span = telemetry.start_span(_name, handler.current_root(), attributes={"langgraph.thread_id": thread_id})
+            try:
+                result = _original(config, *args, **kwargs)
+            except BaseException as e:
+                telemetry.end_span(span, e)
+                raise
+            telemetry.end_span(span)
+            return result
+
+        setattr(checkpointer, method, traced)
+    checkpointer._telemetry_instrumented = True
+
+
+def _instrument_cache(cache, telemetry: Telemetry, handler: TelemetryCallbackHandler) -> None:
+    """Wraps a node cache's get so each hit becomes a span for the skipped node.
+
+    Caches whose `aget` calls `get` (the ones in LangGraph and common.node_cache)
+    are covered for async runs too.
+    """
+    if getattr(cache, "_telemetry_instrumented", False):
+        return
+    original = cache.get
+
+    def traced_get(keys):
+        found = original(keys)
+        parent = handler.current_root()
+        for ns, key in keys:
+            node = ns[-1]  # (writes marker, function, node name)
+            if (ns, key) in found:
+                span = telemetry.start_span(
+                    f"node {node}", parent, attributes={"langgraph.node": node, "langgraph.cache_hit": True}
+                )
+                telemetry.end_span(span)
+                telemetry.count("cache.hits", cache="node", node=node)
+            else:
+                telemetry.count("cache.misses", cache="node", node=node)
+        return found
+
+    cache.get = traced_get
+    cache._telemetry_instrumented = True
+
+
+_default_telemetry: Optional[Telemetry] = None
+
+
+def get_telemetry() -> Telemetry:
+    """Process-wide Telemetry configured from the environment."""
+    global _default_telemetry
+    if _default_telemetry is None:
+        _default_telemetry = Telemetry(enabled=not telemetry_disabled())
+    return _default_telemetry
+
+
+def instrument_graph(graph, telemetry: Optional[Telemetry] = None):
+    """Adds tracing to a compiled graph in place and returns it."""
+    telemetry = telemetry or get_telemetry()
+    graph.telemetry = telemetry  # observe_cache works on a disabled one too
+    if not telemetry.enabled:
+        return graph
+    handler = TelemetryCallbackHandler(telemetry)
+    graph.config = merge_configs(graph.config, {"callbacks": [handler]})
+    if graph.checkpointer not in (None, True, False):
+        _instrument_checkpointer(graph.checkpointer, telemetry, handler)
+    if graph.cache is not None:
+        _instrument_cache(graph.cache, telemetry, handler)
+    return graph
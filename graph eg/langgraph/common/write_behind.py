@@ -0,0 +1,222 @@
+"""
+Write-behind buffering for vector store inserts.
+
+`WriteBehindVectorStore` wraps a LangChain vector store so `add_texts`
+returns without waiting for the remote write:
+1. New texts are appended to a local write-ahead log (JSON lines) and kept in
+   an in-memory buffer
+2. A background thread flushes the buffer in one bulk `add_texts` call when
+   it reaches `max_batch` items or `flush_interval` seconds have passed
+3. Searches merge the remote results with the still-buffered texts, so a
+   memory is retrievable as soon as it is added
+4. `close()` (also registered with atexit) flushes whatever is left; texts
+   that could not be written stay in the log and are replayed on next start
+"""
+
+import atexit
+import json
+import math
+import os
+import threading
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+
+def _wal_line(record: Dict[str, Any]) -> str:
+    return json.dumps({key: record[key] for key in ("id", "text", "metadata")}) + "\n"
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class WriteBehindVectorStore:
+    """Buffers inserts to `store` and flushes them in batches from a background thread."""
+
+    def __init__(
+        self,
+        store,
+        wal_path: str = "memory_wal.jsonl",
+        max_batch: int = 32,
+        flush_interval: float = 2.0,
+        normalize_scores: bool = True,
+    ):
+        self.store = store
+        self.wal_path = wal_path
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        # AstraDB reports cosine similarity mapped to [0, 1]; buffered texts
+        # are scored the same way so one cutoff works for both
+        self.normalize_scores = normalize_scores
+        self.pending: List[Dict[str, Any]] = []
+        # Embeddings of buffered texts by id, computed once for overlay search
+        self._vectors: Dict[str, List[float]] = {}
+        self.flushed_count = 0
+        self.flush_errors = 0
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+
+        self._replay_wal()
+        self._wal = open(self.wal_path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # ----- Writes -----
+
+    def add_texts(self, texts: List[str], metadatas: Optional[List[dict]] = None, **kwargs) -> List[str]:
+        """Logs and buffers texts; returns their ids without waiting for the store."""
+        metadatas = metadatas or [{} for _ in texts]
+        ids = kwargs.get("ids") or [str(uuid.uuid4()) for _ in texts]
+        records = [
+            {"id": doc_id, "text": text, "metadata": metadata}
+            for doc_id, text, metadata in zip(ids, texts, metadatas)
+        ]
+        with self._lock:
+            for record in records:
+                self._wal.write(_wal_line(record))
+            self._wal.flush()
+            os.fsync(self._wal.fileno())
+            self.pending.extend(records)
+            if len(self.pending) >= self.max_batch:
+                self._wake.set()
+        return [record["id"] for record in records]
+
+    def flush(self) -> int:
+        """Writes every buffered text to the store in one batch and returns how many were written."""
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self.pending)
+            if not batch:
+                return 0
+            try:
+                self.store.add_texts(
+                    [record["text"] for record in batch],
+                    metadatas=[record["metadata"] for record in batch],
+                    ids=[record["id"] for record in batch],
+                )
+            except Exception as e:
+                self.flush_errors += 1
+                print(f"Write-behind flush failed, keeping {len(batch)} memories buffered: {e}")
+                return 0
+            with self._lock:
+                del self.pending[:len(batch)]
+                for record in batch:
+                    self._vectors.pop(record["id"], None)
+                self._rewrite_wal()
+            self.flushed_count += len(batch)
+            return len(batch)
+
+    def close(self) -> None:
+        """Stops the flusher and writes out anything still buffered."""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+        self._wal.close()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if not self._stopped.is_set():
+                self.flush()
+
+    # ----- Write-ahead log -----
+
+    def _replay_wal(self) -> None:
+        """Loads texts logged by a previous process that never reached the store."""
+        if not os.path.exists(self.wal_path):
+            return
+        torn = False
+        with open(self.wal_path, encoding="utf-8") as wal:
+            for line in wal:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    self.pending.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-write
+                    torn = True
+                    break
+        if torn:
+            # Cut the log back to its valid prefix, or new records would be
+            # appended after the fragment and lost on the next replay
+            self._write_wal_file()
+        if self.pending:
+            print(f"Replaying {len(self.pending)} buffered memories from {self.wal_path}")
+
+    def _write_wal_file(self) -> None:
+        """Atomically replaces the log with the pending records."""
+        tmp_path = self.wal_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as tmp:
+            for record in self.pending:
+                tmp.write(_wal_line(record))
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        os.replace(tmp_path, self.wal_path)
+
+    def _rewrite_wal(self) -> None:
+        """Compacts the log down to the still-pending records. Caller holds the lock."""
+        self._wal.close()
+        self._write_wal_file()
+        self._wal = open(self.wal_path, "a", encoding="utf-8")
+
+    # ----- Reads -----
+
+    @property
+    def embeddings(self):
+        return self.store.embeddings
+
+    def _overlay_with_score(self, query: str, k: int) -> List[Tuple[Document, float]]:
+        """Scores buffered texts against the query with the store's embedding model."""
+        with self._lock:
+            batch = list(self.pending)
+            vectors = {record["id"]: self._vectors.get(record["id"]) for record in batch}
+        if not batch:
+            return []
+        embeddings = self.store.embeddings
+        query_vector = embeddings.embed_query(query)
+        missing = [record for record in batch if vectors[record["id"]] is None]
+        if missing:
+            # Embedded outside the lock so writers aren't blocked by the model
+            for record, vector in zip(missing, embeddings.embed_documents([r["text"] for r in missing])):
+                vectors[record["id"]] = vector
+            with self._lock:
+                # Only cache texts that weren't flushed in the meantime
+                pending_ids = {r["id"] for r in self.pending}
+                for record in missing:
+                    if record["id"] in pending_ids:
+                        self._vectors.setdefault(record["id"], vectors[record["id"]])
+        scored = []
+        for record in batch:
+            score = _cosine(query_vector, vectors[record["id"]])
+            if self.normalize_scores:
+                score = (score + 1) / 2
+            doc = Document(page_content=record["text"], metadata=record["metadata"], id=record["id"])
+            scored.append((doc, score))
+        return sorted(scored, key=lambda item: item[1], reverse=True)[:k]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs) -> List[Tuple[Document, float]]:
+        """Merges remote results with buffered texts, best similarity first."""
+        # Buffered texts are read first: one flushed in between is then found
+        # by the remote search instead of by neither
+        overlay = self._overlay_with_score(query, k)
+        merged: Dict[str, Tuple[Document, float]] = {}
+        for doc, score in self.store.similarity_search_with_score(query, k=k, **kwargs) + overlay:
+            if doc.page_content not in merged or merged[doc.page_content][1] < score:
+                merged[doc.page_content] = (doc, score)
+        return sorted(merged.values(), key=lambda item: item[1], reverse=True)[:k]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, **kwargs)]